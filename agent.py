@@ -0,0 +1,357 @@
+# -*- coding: utf-8 -*-
+
+# Удаленный агент проверок и его прием на стороне центрального бота. Агент запускается на узле
+# в другом сегменте сети, подключается к боту по TCP, проходит аутентификацию общим секретом и
+# проверяет цели, в поле "vantage" которых указано его имя; результаты уходят боту пачками в том же
+# формате, что и у воркеров shard.py. Статус цели с несколькими точками проверки решает кворум —
+# так авария у цели отличается от аварии канала одной из точек.
+#
+# Запуск агента:
+#     NETMON_AGENT_TOKEN=... python agent.py --connect bot.example.org:8765 --name fra
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import socket
+import time
+
+from shard import JSON_FRAME, RESULTS_FRAME, ProbeWorker, decode_results, json_frame, read_frame
+
+# Имя точки проверки самого бота
+LOCAL_VANTAGE = "local"
+
+# Переменная окружения с общим секретом агентов
+AGENT_TOKEN_ENV = "NETMON_AGENT_TOKEN"
+
+# До аутентификации: максимальный размер кадра (байты) и сколько ждать приветствия (секунды)
+AUTH_FRAME_LIMIT = 4096
+HELLO_TIMEOUT = 10
+
+# Пауза перед повторным подключением агента: начальная и максимальная (секунды)
+RECONNECT_DELAY = 1
+MAX_RECONNECT_DELAY = 30
+
+# Точка проверки считается молчащей, если от нее нет результатов по цели дольше стольких интервалов проверки
+SILENT_INTERVALS = 3
+
+# Сколько целей перечислять в уведомлении о точке проверки (остальные — числом)
+ALERT_NAMES = 20
+
+
+def vantage_points(target):
+    """Точки проверки цели (поле "vantage"), по умолчанию — только сам бот."""
+    points = target.get("vantage") or [LOCAL_VANTAGE]
+    return [points] if isinstance(points, str) else list(points)
+
+
+def quorum_size(target):
+    """Сколько точек должны не видеть цель, чтобы она считалась недоступной (поле "quorum", по умолчанию — большинство)."""
+    return int(target.get("quorum") or len(vantage_points(target)) // 2 + 1)
+
+
+def vantage_alert(point, names, restored=False):
+    """Уведомление о том, что точка проверки point перестала (или снова начала) присылать результаты по целям names."""
+    listed = ", ".join(names[:ALERT_NAMES])
+    if len(names) > ALERT_NAMES:
+        listed += f" и еще {len(names) - ALERT_NAMES}"
+    if restored:
+        return f"📡 Точка проверки {point} снова присылает результаты: {listed}"
+    return (f"📡 Нет результатов из точки проверки {point} дольше {SILENT_INTERVALS} интервалов проверки: {listed}\n\n"
+            f"Пока она молчит, недоступность этих целей может не определяться.")
+
+
+def sign(token, nonce, name):
+    """Ответ агента на вызов сервера: HMAC-SHA256 от nonce и имени агента."""
+    return hmac.new(token.encode(), f"{nonce}:{name}".encode(), hashlib.sha256).hexdigest()
+
+
+class Quorum:
+    """
+    Решение о статусе цели по голосам точек проверки. Голоса копятся по раундам: раунд
+    завершается, когда проголосовали все точки цели или одна из них прислала следующий
+    результат (остальные опоздали или отключены). Недоступна — если ее не видят не меньше
+    quorum_size() точек, доступна — если видит столько, что кворум «недоступна» уже не набрать.
+    Если голосов не хватает ни на то, ни на другое, остается прежнее решение: сбой одной
+    точки при отключенных остальных не превращается в уведомление о недоступности. Чтобы такое
+    «застывшее» решение не оставалось незамеченным, silent() сообщает, какие точки давно молчат.
+    """
+
+    def __init__(self):
+        self.rounds = {}  # id -> {точка: результат}
+        self.decided = {}  # id -> последнее решение (True — доступна)
+        self.seen = {}  # id -> {точка: время последнего голоса (или начала наблюдения)}
+
+    def report(self, target, vantage, result):
+        """Голос точки vantage. Возвращает список решений (результатов для process_result), обычно пустой или из одного."""
+        points = vantage_points(target)
+        if vantage not in points:
+            return []  # Цель перенастроили, а точка еще не получила изменения
+        self.seen.setdefault(target.id, {})[vantage] = time.time()
+        decisions = []
+        votes = self.rounds.setdefault(target.id, {})
+        if vantage in votes:
+            decisions.append(self._decide(target, points, votes))
+            votes = self.rounds[target.id] = {}
+        votes[vantage] = result
+        if len(votes) == len(points):
+            decisions.append(self._decide(target, points, votes))
+            self.rounds[target.id] = {}
+        return decisions
+
+    def _decide(self, target, points, votes):
+        down = [point for point in points if point in votes and not votes[point]["status"]]
+        up = len(votes) - len(down)
+        quorum = quorum_size(target)
+        if len(down) >= quorum:
+            status = False
+        elif up > len(points) - quorum:
+            status = True
+        else:
+            status = self.decided.get(target.id, True)
+        self.decided[target.id] = status
+        response_times = [result["response_time"] for result in votes.values() if result["response_time"] is not None]
+        if status:
+            error = None
+        else:
+            error = "dns" if down and all(votes[point]["error"] == "dns" for point in down) else "probe"
+        return {
+            "id": target.id,
+            "status": status,
+            "response_time": min(response_times) if status and response_times else None,
+            "error": error,
+            "timestamp": max(result["timestamp"] for result in votes.values()),
+            "vantage": {point: votes[point]["status"] for point in points if point in votes},
+        }
+
+    def silent(self, target, now):
+        """
+        Точки цели, от которых нет голосов дольше SILENT_INTERVALS интервалов проверки.
+        Точка, не голосовавшая ни разу, отсчитывается от первого вызова silent() для цели.
+        """
+        seen = self.seen.setdefault(target.id, {})
+        oldest = now - SILENT_INTERVALS * target.interval
+        return [point for point in vantage_points(target) if seen.setdefault(point, now) < oldest]
+
+    def forget(self, target_id):
+        self.rounds.pop(target_id, None)
+        self.decided.pop(target_id, None)
+        self.seen.pop(target_id, None)
+
+
+class _Agent:
+    """Подключенный агент на стороне бота."""
+
+    def __init__(self, name, writer, address):
+        self.name = name
+        self.writer = writer
+        self.address = address
+        self.connected = time.time()
+        self.received = 0  # Принято результатов
+        self.active = 0
+        self.peak = 0
+        self.stats = {}  # Последний отчет агента (op "stats")
+
+
+class AgentServer:
+    """
+    Прием агентов на стороне бота. Подключение: сервер присылает {"op": "challenge", "nonce"},
+    агент отвечает {"op": "hello", "agent": имя, "mac": sign(token, nonce, имя)}. Дальше — протокол
+    воркеров shard.py: агенту передаются цели, в "vantage" которых есть его имя, он присылает пачки
+    результатов, которые уходят в on_results(имя агента, результаты). on_agent(имя, подключен ли)
+    вызывается при подключении и отключении агента.
+
+    Канал не шифруется: между сегментами сети агентов стоит подключать через VPN или SSH-туннель.
+    """
+
+    def __init__(self, token, on_results=None, on_agent=None):
+        if not token:
+            raise ValueError("не задан общий секрет агентов")
+        self.token = token
+        self.on_results = on_results
+        self.on_agent = on_agent
+        self.agents = {}  # имя -> _Agent
+        self.targets = {}  # id -> Target (только цели с удаленными точками проверки)
+        self.slots = {}  # id -> слот
+        self.slot_ids = {}  # слот -> id
+        self.budget = None
+        self.rejected = 0  # Подключений без аутентификации
+        self._next_slot = 0
+        self._server = None
+
+    async def start(self, host, port):
+        self._server = await asyncio.start_server(self._serve, host, port)
+
+    async def _serve(self, reader, writer):
+        address = writer.get_extra_info("peername")
+        nonce = secrets.token_hex(16)
+        writer.write(json_frame({"op": "challenge", "nonce": nonce}))
+        try:
+            kind, payload = await asyncio.wait_for(read_frame(reader, AUTH_FRAME_LIMIT), HELLO_TIMEOUT)
+            hello = json.loads(payload) if kind == JSON_FRAME else {}
+        except (asyncio.TimeoutError, ValueError):
+            hello = {}
+        if not isinstance(hello, dict):
+            hello = {}
+        name = hello.get("agent")
+        # Байты, а не str: compare_digest не принимает строки с не-ASCII символами
+        if not isinstance(name, str) or not hmac.compare_digest(str(hello.get("mac")).encode(), sign(self.token, nonce, name).encode()):
+            self.rejected += 1
+            logging.warning(f"Подключение агента с {address} отклонено: аутентификация не пройдена")
+            writer.close()
+            return
+
+        previous = self.agents.get(name)
+        if previous is not None:
+            logging.warning(f"Агент {name} переподключился с {address}, старое соединение закрыто")
+            previous.writer.close()
+        agent = self.agents[name] = _Agent(name, writer, address)
+        self._send_state(agent)
+        logging.info(f"Агент {name} подключен с {address}, целей: {len(self._targets_of(name))}")
+        if previous is None:
+            self._notify(name, True)
+
+        try:
+            while True:
+                kind, payload = await read_frame(reader)
+                if kind is None:
+                    break
+                if kind == RESULTS_FRAME:
+                    self._receive(agent, payload)
+                elif kind == JSON_FRAME:
+                    agent.stats = json.loads(payload)
+                    if agent.stats.get("denied"):
+                        logging.info(f"Агент {name}: запас повторных попыток исчерпан, не выполнено повторов: {agent.stats['denied']}")
+        finally:
+            writer.close()
+            if self.agents.get(name) is agent:
+                del self.agents[name]
+                logging.warning(f"Агент {name} отключился")
+                self._notify(name, False)
+
+    def _notify(self, name, connected):
+        if self.on_agent is not None:
+            try:
+                self.on_agent(name, connected)
+            except Exception as e:
+                logging.error(f"Ошибка при обработке подключения агента {name}: {e}")
+
+    def _receive(self, agent, payload):
+        agent.active, agent.peak, results = decode_results(payload, self.slot_ids)
+        agent.received += len(results)
+        if results and self.on_results is not None:
+            try:
+                self.on_results(agent.name, results)
+            except Exception as e:
+                logging.error(f"Ошибка при обработке результатов агента {agent.name}: {e}")
+
+    def _send(self, agent, message):
+        if not agent.writer.is_closing():
+            agent.writer.write(json_frame(message))
+
+    def _targets_of(self, name):
+        return [target for target in self.targets.values() if name in vantage_points(target)]
+
+    def _send_state(self, agent):
+        if self.budget is not None:
+            self._send(agent, {"op": "budget", "per_cycle": self.budget})
+        self._send(agent, {"op": "assign", "targets": [[self.slots[target.id], target.spec] for target in self._targets_of(agent.name)]})
+
+    def assign(self, target):
+        """Передает цель агентам из ее "vantage" (и снимает с остальных); цели только с LOCAL_VANTAGE не передаются."""
+        if vantage_points(target) == [LOCAL_VANTAGE]:
+            self.remove(target.id)
+            return
+        slot = self.slots.get(target.id)
+        if slot is None:
+            slot = self.slots[target.id] = self._next_slot
+            self.slot_ids[slot] = target.id
+            self._next_slot += 1
+        self.targets[target.id] = target
+        points = vantage_points(target)
+        for agent in self.agents.values():
+            if agent.name in points:
+                self._send(agent, {"op": "assign", "targets": [[slot, target.spec]]})
+            else:
+                self._send(agent, {"op": "remove", "slots": [slot]})
+
+    def remove(self, target_id):
+        slot = self.slots.pop(target_id, None)
+        if slot is None:
+            return
+        del self.slot_ids[slot]
+        self.targets.pop(target_id, None)
+        for agent in self.agents.values():
+            self._send(agent, {"op": "remove", "slots": [slot]})
+
+    def set_budget(self, per_cycle):
+        """Запас повторов на цикл для каждого агента."""
+        if per_cycle == self.budget:
+            return
+        self.budget = per_cycle
+        for agent in self.agents.values():
+            self._send(agent, {"op": "budget", "per_cycle": per_cycle})
+
+    def refill(self):
+        for agent in self.agents.values():
+            self._send(agent, {"op": "refill"})
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+        for agent in list(self.agents.values()):
+            agent.writer.close()
+
+
+async def run_agent(host, port, name, token, concurrency=100, retries=3):
+    """Агент: подключается к боту и выполняет его команды; при обрыве переподключается с растущей паузой."""
+    delay = RECONNECT_DELAY
+    while True:
+        started = time.monotonic()
+        writer = None
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            kind, payload = await read_frame(reader, AUTH_FRAME_LIMIT)
+            if kind == JSON_FRAME:
+                challenge = json.loads(payload)
+                writer.write(json_frame({"op": "hello", "agent": name, "mac": sign(token, challenge.get("nonce", ""), name)}))
+                logging.info(f"Подключен к боту {host}:{port} как {name}")
+                await ProbeWorker(concurrency, retries).run(reader, writer)
+            logging.warning(f"Соединение с ботом {host}:{port} закрыто")
+        except (OSError, asyncio.IncompleteReadError, ValueError, AttributeError) as e:
+            # Обрыв в любой момент сессии (подключение, вызов, работа) — переподключаемся
+            logging.warning(f"Соединение с ботом {host}:{port} прервано: {e or e.__class__.__name__}")
+        finally:
+            if writer is not None:
+                writer.close()
+        if time.monotonic() - started > MAX_RECONNECT_DELAY:
+            delay = RECONNECT_DELAY  # Соединение работало — это не серия неудачных попыток
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Агент проверок: проверяет цели по заданию центрального бота")
+    parser.add_argument("--connect", required=True, metavar="HOST:PORT", help="адрес приема агентов у бота")
+    parser.add_argument("--name", default=socket.gethostname(), help="имя точки проверки (как в поле \"vantage\" целей)")
+    parser.add_argument("--token", default=os.environ.get(AGENT_TOKEN_ENV), help=f"общий секрет (по умолчанию из {AGENT_TOKEN_ENV})")
+    parser.add_argument("--concurrency", type=int, default=100, help="одновременных подключений при проверке")
+    parser.add_argument("--retries", type=int, default=3, help="попыток на проверку")
+    args = parser.parse_args()
+    if not args.token:
+        parser.error(f"не задан общий секрет: --token или {AGENT_TOKEN_ENV}")
+    host, _, port = args.connect.rpartition(":")
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        asyncio.run(run_agent(host.strip("[]"), int(port), args.name, args.token, args.concurrency, args.retries))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,523 @@
+# -*- coding: utf-8 -*-
+
+# Воспроизводимый бенчмарк бота: локальная заглушка Telegram Bot API, ферма TCP-слушателей на
+# loopback (задержка accept, сброс соединений, «черная дыра») и настоящие цикл проверок и
+# обработчики команд bot_port.py на 10/100/1 000/10 000 целей.
+# Результат — по строке JSON на размер (cycle time, CPU, RSS, байты записи, задержка команд).
+#
+#   python bench.py                      # все размеры, JSON в stdout
+#   python bench.py --sizes 100,1000 --cycles 5 --output bench.jsonl
+#
+# Каждый размер запускается в отдельном процессе во временном каталоге: пиковый RSS не
+# смешивается между размерами, файлы целей, журнала и логов рабочего каталога не трогаются.
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import socket
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import types as pytypes
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+
+# Условный пользователь бенчмарка: ему разрешены команды, ему же уходят уведомления
+BENCH_CHAT_ID = 1000
+BENCH_TOKEN = "123456:BENCHMARK"
+BENCH_WEBHOOK_SECRET = "bench-secret"
+
+# Команды и кнопки, задержка которых измеряется: (имя, текст команды или callback_data)
+COMMANDS = [
+    ("/status", "/status"),
+    ("/stats", "/stats"),
+    ("/stats 6h", "/stats 6h"),
+    ("/stats 30d", "/stats 30d"),
+    ("/perf", "/perf"),
+    ("/log tail", "callback:mode_tail_main.log"),
+    ("/graph 1h", "callback:graph_1h"),
+    ("/graph latency", "callback:latency_24h"),
+    ("/graph 7d", "callback:graph_7d"),
+]
+
+
+class FakeTelegramApi:
+    """
+    Заглушка Telegram Bot API на aiohttp: на любой метод отвечает успехом, на sendMessage/sendPhoto —
+    правдоподобным сообщением. Считает запросы по методам и принятые байты.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.requests = {}
+        self.bytes_received = 0
+        self._message_id = 0
+        self._runner = None
+
+    async def start(self):
+        from aiohttp import web
+        app = web.Application(client_max_size=50 * 2 ** 20)  # Как лимит Bot API на загрузку файлов
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    async def handle(self, request):
+        from aiohttp import web
+        method = request.match_info["method"]
+        form = await request.post()  # multipart (sendPhoto) читается из потока — только один раз
+        self.requests[method] = self.requests.get(method, 0) + 1
+        self.bytes_received += request.content_length or 0
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        result = True
+        if method in ("sendMessage", "sendPhoto"):
+            self._message_id += 1
+            result = {
+                "message_id": self._message_id,
+                "date": int(time.time()),
+                "chat": {"id": int(form.get("chat_id", BENCH_CHAT_ID)), "type": "private"},
+            }
+            if method == "sendPhoto":
+                file_id = f"photo{self._message_id}"
+                result["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 640, "height": 480}]
+            else:
+                result["text"] = str(form.get("text", ""))
+        return web.json_response({"ok": True, "result": result})
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+class Listener:
+    """
+    TCP-слушатель на 127.0.0.1 со своим циклом accept:
+    - accept_delay — пауза после каждого accept (медленный сервер: очередь accept переполняется,
+      SYN теряются, подключение растягивается на повторы SYN);
+    - drop_rate — доля соединений, сбрасываемых RST сразу после accept;
+    - http — отвечать на запрос «HTTP/1.1 200», иначе просто закрыть соединение.
+    """
+
+    def __init__(self, accept_delay=0.0, drop_rate=0.0, http=False, backlog=1024, rng=None):
+        self.accept_delay = accept_delay
+        self.drop_rate = drop_rate
+        self.http = http
+        self.rng = rng or random.Random()
+        self.accepted = 0
+        self.dropped = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(backlog)
+        self.sock.setblocking(False)
+        self.port = self.sock.getsockname()[1]
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.ensure_future(self._accept_loop())
+
+    async def _accept_loop(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            conn, _ = await loop.sock_accept(self.sock)
+            self.accepted += 1
+            asyncio.ensure_future(self._serve(conn))
+            if self.accept_delay:
+                await asyncio.sleep(self.accept_delay)
+
+    async def _serve(self, conn):
+        loop = asyncio.get_event_loop()
+        try:
+            if self.drop_rate and self.rng.random() < self.drop_rate:
+                self.dropped += 1
+                conn.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))  # Закрытие с RST
+                return
+            if self.http:
+                request = b""
+                while b"\r\n\r\n" not in request:
+                    data = await loop.sock_recv(conn, 4096)
+                    if not data:
+                        return
+                    request += data
+                await loop.sock_sendall(conn, b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        self.sock.close()
+
+
+class TargetFarm:
+    """
+    Набор локальных целей: быстрый и медленный слушатели, «черная дыра» (слушатель без accept:
+    после заполнения очереди подключения висят до таймаута) и закрытый порт (connection refused).
+    """
+
+    def __init__(self, args):
+        rng = random.Random(args.seed)
+        http = args.probe in ("http",)
+        self.fast = Listener(drop_rate=args.drop_rate, http=http, rng=rng)
+        self.slow = Listener(accept_delay=args.accept_delay, drop_rate=args.drop_rate, http=http, backlog=8, rng=rng)
+        self.blackhole = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.blackhole.bind(("127.0.0.1", 0))
+        self.blackhole.listen(0)
+        closed = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        closed.bind(("127.0.0.1", 0))
+        self.refused_port = closed.getsockname()[1]
+        closed.close()
+
+    def start(self):
+        self.fast.start()
+        self.slow.start()
+
+    def targets(self, args, size):
+        """Список целей для targets.json: доли профилей задаются аргументами, раскладка воспроизводима по seed."""
+        rng = random.Random(args.seed)
+        shares = [
+            ("icmp", args.icmp_share),
+            ("blackhole", args.blackhole_share),
+            ("refused", args.refused_share),
+            ("slow", args.slow_share),
+        ]
+        targets = []
+        for i in range(size):
+            roll, profile = rng.random(), "fast"
+            for name, share in shares:
+                if roll < share:
+                    profile = name
+                    break
+                roll -= share
+            spec = {"id": f"{profile}-{i}", "name": f"{profile}-{i}", "host": "127.0.0.1", "probe": args.probe}
+            if profile == "icmp":
+                spec["probe"] = "icmp"
+            elif profile == "blackhole":
+                spec["port"] = self.blackhole.getsockname()[1]
+            elif profile == "refused":
+                spec["port"] = self.refused_port
+            else:
+                spec["port"] = (self.slow if profile == "slow" else self.fast).port
+            targets.append(spec)
+        return targets
+
+    def close(self):
+        self.fast.close()
+        self.slow.close()
+        self.blackhole.close()
+
+
+def rss_mb():
+    """Текущий RSS процесса в МБ (Linux: /proc/self/statm; иначе пиковый)."""
+    try:
+        with open("/proc/self/statm") as file:
+            return round(int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def file_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None, 0
+    return stat.st_mtime_ns, stat.st_size
+
+
+def bytes_written(before, after):
+    """Сколько байт записано в файл между двумя file_state: рост либо весь файл, если он переписан."""
+    (mtime_before, size_before), (mtime_after, size_after) = before, after
+    if mtime_after == mtime_before:
+        return 0
+    return size_after - size_before if size_after >= size_before else size_after
+
+
+def make_update(update_id, text):
+    """Update с командой или нажатием кнопки (text = "callback:<data>") от BENCH_CHAT_ID."""
+    user = {"id": BENCH_CHAT_ID, "is_bot": False, "first_name": "bench"}
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": BENCH_CHAT_ID, "type": "private"},
+        "from": user,
+        "text": text,
+    }
+    if text.startswith("callback:"):
+        message["text"] = "bench"
+        return {
+            "update_id": update_id,
+            "callback_query": {"id": str(update_id), "from": user, "chat_instance": "bench",
+                               "message": message, "data": text[len("callback:"):]},
+        }
+    command = text.split()[0]
+    message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(command)}]
+    return {"update_id": update_id, "message": message}
+
+
+def prefill_history(bot_port, checks, interval, rng):
+    """Синтетическая история: checks проверок на цель с шагом interval (как после долгой работы бота)."""
+    now = time.time()
+    for target in bot_port.inventory:
+        stats = bot_port.server_stats[target.id]
+        for k in range(checks, 0, -1):
+            timestamp = now - k * interval
+            status = rng.random() > 0.01
+            response_time = round(rng.uniform(0.2, 5), 1) if status else None
+            stats.append(timestamp, status, response_time)
+            bot_port.record_aggregates(target.id, timestamp, status, response_time)
+
+
+async def run_size(args, size):
+    """Один размер: ферма целей и заглушка API, настоящие reload/check/housekeeping/обработчики бота."""
+    rng = random.Random(args.seed)
+    farm = TargetFarm(args)
+    farm.start()
+    api = FakeTelegramApi(latency=args.api_latency)
+    api_url = await api.start()
+
+    with open("targets.json", "w", encoding="utf-8") as file:
+        json.dump({"defaults": {"interval": args.interval}, "targets": farm.targets(args, size)}, file)
+
+    # Настройки бота для бенчмарка вместо config.py рабочего каталога
+    config = pytypes.ModuleType("config")
+    config.API_TOKEN = BENCH_TOKEN
+    config.users = [BENCH_CHAT_ID]
+    config.CHAT_ID = BENCH_CHAT_ID
+    sys.modules["config"] = config
+
+    from aiogram import Bot, Dispatcher, types
+    from aiogram.bot.api import TelegramAPIServer
+    import bot_port
+    import outbox
+
+    if not args.keep_rate_limits:
+        # Измеряем код бота, а не лимиты Telegram: без пауз между сообщениями в чат
+        outbox.PER_CHAT_INTERVAL = outbox.GROUP_CHAT_INTERVAL = outbox.GLOBAL_INTERVAL = 0
+    bot_port.bot.server = TelegramAPIServer.from_base(api_url)
+    Bot.set_current(bot_port.bot)
+    Dispatcher.set_current(bot_port.dp)
+    bot_port.setup_logging(bot_port.MAIN_LOG, channels=bot_port.LOG_CHANNELS, console=False)
+
+    result = {"size": size, "delivery": "webhook" if args.webhook else "direct"}
+    start = time.perf_counter()
+    bot_port.reload_inventory()
+    bot_port.load_status()
+    prefill_history(bot_port, args.history, args.interval, rng)
+    bot_port.refresh_probe_timeouts()
+    result["startup_seconds"] = round(time.perf_counter() - start, 4)
+    bot_port.perf.start_loop_monitor()
+
+    # Циклы проверок: все цели разом (как за один интервал планировщика), затем обслуживание
+    cycles = []
+    for cycle in range(args.cycles):
+        if cycle == args.cycles - 1:
+            bot_port.last_snapshot_time = 0  # Последний цикл сворачивает журнал в снимок
+        files_before = [file_state(bot_port.JOURNAL_FILE), file_state(bot_port.SNAPSHOT_FILE)]
+        wall, cpu = time.perf_counter(), time.process_time()
+        await asyncio.gather(*(bot_port.check_and_process(target.id) for target in bot_port.inventory))
+        probe_seconds = time.perf_counter() - wall
+        bot_port.housekeeping()
+        if bot_port.snapshot_task is not None:
+            await bot_port.snapshot_task  # Снимок пишется в пуле потоков
+        files_after = [file_state(bot_port.JOURNAL_FILE), file_state(bot_port.SNAPSHOT_FILE)]
+        cycles.append({
+            "cycle_seconds": round(time.perf_counter() - wall, 4),
+            "probe_seconds": round(probe_seconds, 4),
+            "housekeeping_seconds": round(bot_port.perf.stats["housekeeping"].last, 4),
+            "cpu_seconds": round(time.process_time() - cpu, 4),
+            "journal_bytes": bytes_written(files_before[0], files_after[0]),
+            "snapshot_bytes": bytes_written(files_before[1], files_after[1]),
+            "down": sum(1 for state in bot_port.server_status.values() if not state["status"]),
+        })
+    result["cycles"] = cycles
+    result["cycle_seconds"] = round(statistics.median(c["cycle_seconds"] for c in cycles), 4)
+    result["cpu_seconds_per_cycle"] = round(statistics.median(c["cpu_seconds"] for c in cycles), 4)
+    result["persistence_bytes"] = sum(c["journal_bytes"] + c["snapshot_bytes"] for c in cycles)
+
+    # Задержка команд: первый вызов (холодный кэш графиков) и медиана остальных.
+    # С --webhook обновления POST-запросами идут через WebhookServer, время — до конца обработки
+    if args.webhook:
+        import aiohttp
+        from webhook import SECRET_HEADER, WebhookServer
+        webhook = WebhookServer(bot_port.dp, secret=BENCH_WEBHOOK_SECRET, queue_size=args.webhook_queue)
+        await webhook.start("127.0.0.1", 0)
+        webhook_url = f"http://127.0.0.1:{webhook.port}{webhook.path}"
+        session = aiohttp.ClientSession(headers={SECRET_HEADER: BENCH_WEBHOOK_SECRET})
+
+    async def deliver(update):
+        if not args.webhook:
+            await bot_port.dp.process_update(types.Update(**update))
+            return
+        async with session.post(webhook_url, json=update) as response:
+            response.raise_for_status()
+        await webhook.queue.join()
+
+    commands = {}
+    update_id = 0
+    for name, text in COMMANDS:
+        timings = []
+        for _ in range(args.repeat):
+            update_id += 1
+            begin = time.perf_counter()
+            await deliver(make_update(update_id, text))
+            timings.append(time.perf_counter() - begin)
+        commands[name] = {
+            "first_ms": round(timings[0] * 1000, 2),
+            "median_ms": round(statistics.median(timings[1:] or timings) * 1000, 2),
+            "max_ms": round(max(timings) * 1000, 2),
+        }
+    result["commands"] = commands
+
+    if args.webhook:
+        # Всплеск обновлений: сколько принято и сколько отклонено по переполнению очереди (429)
+        async def post(update):
+            async with session.post(webhook_url, json=update) as response:
+                return response.status
+
+        begin = time.perf_counter()
+        statuses = await asyncio.gather(*(post(make_update(update_id + k + 1, "/help")) for k in range(args.webhook_burst)))
+        await webhook.queue.join()
+        result["webhook"] = {
+            "burst": args.webhook_burst,
+            "accepted": statuses.count(200),
+            "rejected": statuses.count(429),
+            "burst_seconds": round(time.perf_counter() - begin, 4),
+        }
+        await session.close()
+        await webhook.close()
+
+    loop_lag = bot_port.perf.stats["loop_lag"]
+    result["loop_lag_max_ms"] = round(loop_lag.max * 1000, 2) if loop_lag.count else None
+    result["rss_mb"] = rss_mb()
+    result["peak_rss_mb"] = peak_rss_mb()
+    result["probe_peak_in_flight"] = bot_port.probe_runner.peak
+
+    await bot_port.outbox.close(timeout=args.drain_timeout)
+    result["telegram"] = {
+        "requests": api.requests,
+        "bytes": api.bytes_received,
+        "sent": bot_port.outbox.sent,
+        "merged": bot_port.outbox.merged,
+        "unsent": bot_port.outbox.pending(),
+    }
+    result["farm"] = {"accepted": farm.fast.accepted + farm.slow.accepted, "dropped": farm.fast.dropped + farm.slow.dropped}
+
+    bot_port.graph_renderer.shutdown()
+    await (await bot_port.bot.get_session()).close()
+    await api.stop()
+    farm.close()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_child(args):
+    """Режим дочернего процесса: один размер во временном каталоге, результат — строка JSON в stdout."""
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, package_dir)
+    workdir = tempfile.mkdtemp(prefix="netmon-bench-")
+    os.chdir(workdir)
+    try:
+        result = asyncio.get_event_loop().run_until_complete(run_size(args, args.child))
+    finally:
+        os.chdir(package_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.stdout.write(json.dumps(result) + "\n")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк бота мониторинга на локальных целях и заглушке Telegram API")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="число целей, через запятую")
+    parser.add_argument("--cycles", type=int, default=3, help="циклов проверок на размер")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов каждой команды")
+    parser.add_argument("--history", type=int, default=100, help="синтетических проверок на цель до старта")
+    parser.add_argument("--interval", type=float, default=60, help="интервал проверки целей (для истории), с")
+    parser.add_argument("--probe", choices=("tcp", "http"), default="tcp", help="тип проверки TCP-целей")
+    parser.add_argument("--accept-delay", type=float, default=0.005, help="пауза после accept у медленного слушателя, с")
+    parser.add_argument("--drop-rate", type=float, default=0.0,
+                        help="доля соединений, сбрасываемых RST (для tcp-проверок подключение уже состоялось — заметно только с --probe http)")
+    parser.add_argument("--slow-share", type=float, default=0.05, help="доля целей на медленном слушателе")
+    parser.add_argument("--blackhole-share", type=float, default=0.01, help="доля целей в «черной дыре» (таймаут)")
+    parser.add_argument("--refused-share", type=float, default=0.01, help="доля целей на закрытом порту")
+    parser.add_argument("--icmp-share", type=float, default=0.05, help="доля ICMP-целей (127.0.0.1)")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа заглушки Telegram API, с")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="не отключать лимиты outbox на отправку в чат")
+    parser.add_argument("--drain-timeout", type=float, default=10, help="сколько ждать отправки уведомлений в конце, с")
+    parser.add_argument("--webhook", action="store_true", help="доставлять команды POST-запросами через WebhookServer")
+    parser.add_argument("--webhook-queue", type=int, default=100, help="размер очереди обновлений webhook")
+    parser.add_argument("--webhook-burst", type=int, default=500, help="обновлений во всплеске для проверки обратного давления")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="дописать результаты (JSON Lines) в файл")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    args = parse_args(argv)
+    if args.child is not None:
+        run_child(args)
+        return
+
+    # Каждый размер — в отдельном процессе с теми же аргументами (--output дочерний процесс не использует)
+    meta = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": int(time.time()),
+    }
+    for size in (int(size) for size in args.sizes.split(",") if size.strip()):
+        child = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *argv, "--child", str(size)],
+            capture_output=True, text=True,
+        )
+        if child.returncode != 0:
+            sys.stderr.write(child.stderr)
+            result = {"size": size, "error": f"exit code {child.returncode}"}
+        else:
+            result = json.loads(child.stdout.strip().splitlines()[-1])
+        result.update(meta)
+        line = json.dumps(result)
+        print(line, flush=True)
+        if args.output:
+            with open(args.output, "a", encoding="utf-8") as file:
+                file.write(line + "\n")
+        if "error" not in result:
+            sys.stderr.write(
+                f"{size:>6} целей: цикл {result['cycle_seconds']} с, CPU {result['cpu_seconds_per_cycle']} с, "
+                f"RSS {result['peak_rss_mb']} МБ, запись {result['persistence_bytes']} Б, "
+                f"/status {result['commands']['/status']['median_ms']} мс\n"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,265 +1,764 @@
 # -*- coding: utf-8 -*-
 
 import asyncio
-import socket
 import json
 from aiogram import Bot, Dispatcher, types
 from aiogram.utils import executor
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ParseMode
 import logging
 import os
+import sys
 import time
+import io
 from collections import deque
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib.dates import MinuteLocator, DateFormatter
-from datetime import datetime
-from itertools import islice
 
+from log_setup import setup_logging
+from tcp_probe import RetryBudget
+from probes import PROBES, ProbeRunner
+from dns_cache import DnsCache
+from shard import ShardPool
+from agent import AgentServer, Quorum, LOCAL_VANTAGE, vantage_points, vantage_alert
+from journal import StatusJournal
+from ringbuffer import SampleRing
+from history_query import parse_window, format_duration, query_window, samples_since
+from graph_render import GraphRenderer, render_availability_graph, render_latency_graph
+from graph_cache import GraphCache
+from downsample import downsample_status, lttb
+from rollup import RollupStore, summarize
+from latency_hist import LatencyHistogram, LatencyWindows, adaptive_timeout, format_percentiles, format_ms
+from scheduler import Scheduler
+import log_reader
+from outbox import Outbox
+from perf import Perf
+from webhook import WebhookServer
+from inventory import Inventory, TARGETS_FILE
+from flap import FlapPolicy, FLAP_END, alert_text, state_label
 
 from config import *
 
-#Настройка общего логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('log/main.log', mode='w'),  # Запись в файл
-        logging.StreamHandler()              # Вывод в консоль
-    ]
-)
+# Файлы логов: общий и отдельные каналы
+MAIN_LOG = 'log/main.log'
+LOG_CHANNELS = {
+    'bot': 'log/bot.log',  # Проверки серверов, загрузка/сохранение статусов
+    'clean': 'log/CleanOldStats.log',  # Очистка старых данных
+}
 
-#Для логирования в разные файлы (указывается в функциях)
-def setup_function_logger(logfile):
-    logger = logging.getLogger(logfile)
-    logger.setLevel(logging.INFO)
+# Логгеры каналов
+bot_logger = logging.getLogger('bot')
+clean_logger = logging.getLogger('clean')
 
-    # Отключаем передачу логов в родительский (глобальный) логгер
-    logger.propagate = False
+#Инициализация бота, диспетчера
+bot = Bot(token=API_TOKEN)
+dp = Dispatcher(bot)
 
-    # Удаляем ранее добавленные обработчики, если они уже существуют
-    if logger.handlers:
-        logger.handlers.clear()
+# Самоизмерение: длительности фаз, задержка event loop, очереди (/perf, экспорт в Prometheus)
+perf = Perf()
+for name, help in [
+    ("probe", "проверка цели (все попытки)"),
+    ("process_result", "обработка результата проверки"),
+    ("housekeeping", "цикл обслуживания целиком"),
+    ("clean_old_stats", "очистка старых данных"),
+    ("refresh_probe_timeouts", "пересчет таймаутов проверок"),
+    ("save_status", "запись журнала"),
+    ("snapshot", "снимок состояния"),
+    ("graph_render", "рендер графика"),
+    ("telegram_send", "запрос к Telegram API"),
+    ("handler_status", "команда /status"),
+    ("handler_stats", "команда /stats"),
+    ("handler_graph", "команда /graph"),
+    ("handler_log", "команда /log"),
+    ("update_queue_wait", "ожидание обновления в очереди webhook"),
+]:
+    perf.define(name, help)
+
+# Экспорт метрик в формате Prometheus (GET /metrics): порт или None — не экспортировать.
+# Слушается только локальный адрес, аутентификации нет
+PERF_EXPORT_HOST = "127.0.0.1"
+PERF_EXPORT_PORT = None
+
+# Получение обновлений Telegram: "polling" — long polling, "webhook" — встроенный HTTP-сервер.
+# Webhook слушает WEBHOOK_LISTEN_HOST:WEBHOOK_LISTEN_PORT (TLS — на обратном прокси перед ним);
+# если задан WEBHOOK_URL, бот сам регистрирует WEBHOOK_URL + WEBHOOK_PATH в Telegram (setWebhook).
+# Секрет, который Telegram присылает с обновлениями, — WEBHOOK_SECRET в config.py.
+# Чтобы вернуться к polling, webhook нужно удалить (deleteWebhook), иначе getUpdates не работает
+UPDATE_MODE = "polling"
+WEBHOOK_LISTEN_HOST = "127.0.0.1"
+WEBHOOK_LISTEN_PORT = 8080
+WEBHOOK_PATH = "/telegram/webhook"
+WEBHOOK_URL = None
+# Сколько принятых обновлений может ждать обработки (дальше Telegram получает 429 и повторит позже)
+# и сколько обновлений обрабатывается одновременно
+WEBHOOK_QUEUE_SIZE = 100
+WEBHOOK_WORKERS = 4
+
+webhook_server = None  # WebhookServer, создается в run_webhook()
+
+# Очередь исходящих сообщений: проверки не ждут Telegram, лимиты и повторы — в фоновом отправителе
+outbox = Outbox(bot, on_delivered=lambda seconds: perf.observe("telegram_send", seconds))
 
-    # Настройка нового обработчика для записи логов в файл
-    file_handler = logging.FileHandler(logfile, mode='a')
-    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-    logger.addHandler(file_handler)
+#Обработчик ошибок
+@dp.errors_handler()
+async def error_bot(update: types.Update, e: Exception):
+    logging.error(f'Exception: {str(e)}')
+    outbox.send(CHAT_ID, 'Какая-то ошибка, проверьте логи!', merge=True)
+    return True
 
-    return logger
+# Период проверки сервера по умолчанию (в секундах)
+CHECK_INTERVAL = 60
 
-#Для логирования в разные файлы (указывается в функциях)
-def setup_function_logger1(logfile1):
-    logger = logging.getLogger(logfile1)
-    logger.setLevel(logging.INFO)
+# Цели мониторинга — файл TARGETS_FILE (см. inventory.py). Поля цели: "id", "name", "host",
+# "probe" — тип проверки (icmp, tcp, tls, http, https; по умолчанию tcp), "port" (по умолчанию — порт
+# типа проверки), "interval", "timeout", "down"/"up" — пороги смены статуса [N, M]; для http(s) —
+# "path" и "expect_status", для tls/https — "sni" и "verify"; "vantage" — точки проверки (имена агентов
+# и LOCAL_VANTAGE, по умолчанию только бот) и "quorum" — сколько из них должны не видеть цель
+inventory = Inventory(TARGETS_FILE, defaults={"probe": "tcp", "interval": CHECK_INTERVAL}, probes=PROBES)
 
-    # Отключаем передачу логов в родительский (глобальный) логгер
-    logger.propagate = False
+# Как часто проверять, не изменился ли файл целей (в секундах)
+INVENTORY_POLL_INTERVAL = 10
 
-    # Удаляем ранее добавленные обработчики, если они уже существуют
-    if logger.handlers:
-        logger.handlers.clear()
+# Период обслуживания: очистка старых данных, сохранение журнала (в секундах)
+HOUSEKEEPING_INTERVAL = 60
 
-    # Настройка нового обработчика для записи логов в файл
-    file_handler = logging.FileHandler(logfile1, mode='w')
-    file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-    logger.addHandler(file_handler)
+# Планировщик проверок
+monitoring_scheduler = Scheduler()
 
-    return logger
+# Таймаут одной попытки (в секундах) задает тип проверки (или поле цели "timeout"):
+# это значение по умолчанию и верхняя граница адаптивного таймаута.
+# Нижняя граница адаптивного таймаута и множитель к p99 задержки сервера за последние сутки
+PROBE_TIMEOUT_FLOOR = 1
+PROBE_TIMEOUT_MULTIPLIER = 4
 
-#Инициализация бота, диспетчера
-bot = Bot(token=API_TOKEN)
-dp = Dispatcher(bot)
+# Запас повторных попыток на цикл обслуживания: доля от числа серверов, но не меньше минимума
+RETRY_BUDGET_RATIO = 0.2
+MIN_RETRY_BUDGET = 10
 
-#Обработчик ошибок
-@dp.errors_handler()
-async def error_bot(update: types.Update, e: Exception):
-    logging.error(f'Exception: {str(e)}')
-    await bot.send_message(chat_id=CHAT_ID, text='Какая-то ошибка, проверьте логи!')
-    return True
+# Таймауты проверок по истории задержек (пересчитываются при обслуживании) и общий запас повторов
+probe_timeouts = {}
+retry_budget = RetryBudget(MIN_RETRY_BUDGET)  # Размер уточняется при загрузке целей
 
-# Список серверов для мониторинга
-SERVERS = [
-    {"name": "MyNameServer", "ip": "MyIP"},
-    {"name": "MyNameServer", "ip": "MyIP"},
-]
+# Максимальное число одновременных подключений при проверке
+MAX_CONCURRENT_PROBES = 100
+
+# Кэш резолва имен хостов целей (TTL записей DNS)
+dns_cache = DnsCache()
+
+# Проверки всех типов (ICMP, TCP, TLS, HTTP) в одном event loop с общим ограничением подключений
+probe_runner = ProbeRunner(concurrency=MAX_CONCURRENT_PROBES, resolver=dns_cache)
+
+# Число процессов-воркеров проверок: 0 — проверки в процессе бота. При десятках тысяч целей
+# один event loop не успевает и проверять, и обрабатывать результаты: цели делятся по воркерам
+# (у каждого свои планировщик, ProbeRunner и ограничение MAX_CONCURRENT_PROBES), а бот только
+# принимает пачки результатов, меняет статусы, пишет журнал и отправляет уведомления
+PROBE_WORKERS = 0
 
-# Порт, который будет проверяться
-PORT = 443
+shard_pool = None  # ShardPool, создается в __main__ при PROBE_WORKERS > 0
+
+# Прием удаленных агентов проверок (agent.py): адрес и порт или None — агенты не принимаются.
+# Общий секрет агентов — AGENT_TOKEN в config.py
+AGENT_LISTEN_HOST = "0.0.0.0"
+AGENT_LISTEN_PORT = None
+
+agent_server = None  # AgentServer, создается в __main__ при заданном AGENT_LISTEN_PORT
+
+# Решение о статусе целей с несколькими точками проверки
+quorum = Quorum()
+
+# Молчащие точки проверки целей (id -> список точек): для /status и уведомлений о деградации
+silent_vantage = {}
+disconnected_agents = set()  # Агенты, отключившиеся после подключения (об их возвращении уведомляем)
 
 # Последние 24 часа
 MONITORING_WINDOW = 24 * 60 * 60
 
-# Файл для сохранения статусов и статистики
+# Старый файл статусов и статистики (читается один раз для миграции)
 STATUS_FILE = "status.json"
 
+# Снимок состояния и журнал новых проверок
+SNAPSHOT_FILE = "status.snapshot"
+JOURNAL_FILE = "status.journal"
+
+# Как часто сворачивать журнал в новый снимок (в секундах)
+SNAPSHOT_INTERVAL = 60 * 60
+
+status_journal = StatusJournal(SNAPSHOT_FILE, JOURNAL_FILE)
+
+# Число процессов для рендера графиков
+GRAPH_WORKERS = 2
+
+graph_renderer = GraphRenderer(workers=GRAPH_WORKERS)
+
+# Бюджет точек на один ряд графика: доступность / задержка
+GRAPH_STATUS_POINTS = 120
+GRAPH_LATENCY_POINTS = 300
+
+# Кэш готовых графиков (сбрасывается после каждого цикла проверок)
+graph_cache = GraphCache(max_entries=32)
+last_snapshot_time = time.time()
+snapshot_task = None  # Идущая запись снимка (write_snapshot)
+
+# Сколько последних проверок хранить для каждого сервера
+STATS_CAPACITY = 10000
+
+# Сколько строк показывать в режиме /log «последние строки»
+LOG_TAIL_LINES = 100
+
+# Уровни агрегации долгосрочной истории: (имя, размер корзины, срок хранения) в секундах
+ROLLUP_TIERS = [
+    ("1m", 60, 7 * 24 * 60 * 60),                  # По минутам — неделя
+    ("1h", 60 * 60, 90 * 24 * 60 * 60),            # По часам — 90 дней
+    ("1d", 24 * 60 * 60, 2 * 365 * 24 * 60 * 60),  # По дням — 2 года
+]
+
+rollup_store = RollupStore(ROLLUP_TIERS)
+
+# Почасовые гистограммы задержки каждого сервера (последние 24 часа + текущий час)
+latency_windows = {}
+
+
+def record_aggregates(target_id, timestamp, status, response_time):
+    """Учитывает проверку в агрегатах: уровни rollup_store и гистограммы задержки."""
+    rollup_store.add(target_id, timestamp, status, response_time)
+    if response_time is not None:
+        if target_id not in latency_windows:
+            latency_windows[target_id] = LatencyWindows()
+        latency_windows[target_id].record(timestamp, response_time)
+
+
+def latency_histogram(target_id, start, end):
+    """Гистограмма задержки сервера за часы, пересекающиеся с [start, end)."""
+    windows = latency_windows.get(target_id)
+    return windows.merged(start, end) if windows else LatencyWindows().merged(start, end)
+
+
+def recent_latency_histogram(target_id, start):
+    """Гистограмма задержки сервера с часа, пересекающегося с start, до текущего (без слияния часов; только для чтения)."""
+    windows = latency_windows.get(target_id)
+    return windows.since(start) if windows else LatencyHistogram()
+
+# Проверки, еще не сохраненные в журнал, и сколько их было за прошлый цикл обслуживания
+pending_records = []
+last_cycle_checks = 0
+
 # Хранилище данных для мониторинга
-server_status = {server["ip"]: {"status": True, "response_time": None} for server in SERVERS}
-server_stats = {server["ip"]: deque(maxlen=10000) for server in SERVERS}
+server_status = {}
+
+# Пороги смены статуса и обнаружение флапа для каждого сервера
+flap_policies = {}
+server_stats = {}
+
+# Время неудачных проверок из-за ошибки резолва за последние 24 часа (отдельно от ошибок подключения)
+dns_failures = {}
 
 def load_status():
-    """Загружает статус серверов и статистику из файла."""
-    function_logger = setup_function_logger('log/bot.log')
+    """
+    Загружает статус серверов и статистику: снимок + проверки из хвоста журнала.
+    Если есть только старый status.json, переносит его в снимок.
+    """
     global server_status, server_stats
-    if os.path.exists(STATUS_FILE):
-        try:
-            with open(STATUS_FILE, "r") as file:
-                data = json.load(file)
-                server_status = data.get("server_status", server_status)
+    try:
+        payload, records = status_journal.load()
+        if payload is None and os.path.exists(STATUS_FILE):
+            # Миграция со старого формата: читаем status.json и сразу делаем из него снимок
+            with open(STATUS_FILE, "rb") as file:
+                payload = file.read()
+            bot_logger.info(f"Найден старый файл {STATUS_FILE}, переносим его в снимок.")
+
+        migrated = False
+        if payload:
+            migrated = load_snapshot(payload)
+
+        # Доигрываем журнал поверх снимка
+        for target_id, timestamp, status, response_time in records:
+            if target_id not in server_stats:
+                server_stats[target_id] = SampleRing(STATS_CAPACITY)
+            server_stats[target_id].append(timestamp, status, response_time)
+            record_aggregates(target_id, timestamp, status, response_time)
+            update_state(target_id, timestamp, response_time)
+
+        if migrated or (payload and not os.path.exists(SNAPSHOT_FILE)):
+            status_journal.snapshot(encode_snapshot(*dump_snapshot()))
+
+        bot_logger.info(f"Статусы и статистика успешно загружены (из журнала: {len(records)} записей).")
+    except Exception as e:
+        bot_logger.error(f"Ошибка при загрузке статусного файла: {e}")
+
+
+def load_snapshot(payload):
+    """
+    Восстанавливает server_status и server_stats из снимка.
+    Снимок — строка JSON-заголовка и следом кольцевые буферы в бинарном виде (SampleRing.dump).
+    Старые JSON-форматы (status.json и ранние снимки) тоже понимает.
+    Возвращает True, если данные были в старом формате и их стоит пересохранить.
+    """
+    header_line, _, blob = payload.partition(b"\n")
+    try:
+        header = json.loads(header_line)
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get("format") != "ring-v1":
+        # Старый формат: списки [timestamp, status] в JSON
+        data = json.loads(payload)
+        server_status.update(data.get("server_status", {}))
+        for target_id, entries in data.get("server_stats", {}).items():
+            ring = SampleRing(STATS_CAPACITY)
+            for entry in entries:
+                ring.append(entry[0], entry[1], entry[2] if len(entry) > 2 else None)
+                record_aggregates(target_id, entry[0], entry[1], entry[2] if len(entry) > 2 else None)
+            server_stats[target_id] = ring
+        return True
+
+    server_status.update(header["server_status"])
+    view = memoryview(blob)
+    offset = 0
+    for target_id, size in header["rings"]:
+        ring = SampleRing.load(view[offset:offset + size])
+        server_stats[target_id] = ring if ring.capacity == STATS_CAPACITY else ring.resized(STATS_CAPACITY)
+        offset += size
+    for target_id, timestamps in header.get("dns_failures", {}).items():
+        dns_failures[target_id] = deque(timestamps)
+
+    if "rollups" in header:
+        rollup_store.load(header["rollups"], view[offset:])
+        if "latency" in header:
+            for target_id, data in header["latency"].items():
+                latency_windows[target_id] = LatencyWindows().load_json(data)
+        else:
+            # Снимок без гистограмм задержки: заполняем их из сохраненной истории
+            for target_id, ring in server_stats.items():
+                for timestamp, _, response_time in ring:
+                    if response_time is not None:
+                        latency_windows.setdefault(target_id, LatencyWindows()).record(timestamp, response_time)
+        return False
+
+    # Снимок без агрегатов: строим их из сохраненной истории и пересохраняем
+    for target_id, ring in server_stats.items():
+        for timestamp, status, response_time in ring:
+            record_aggregates(target_id, timestamp, status, response_time)
+    return True
+
 
-                # Преобразование списков обратно в deque
-                stats = data.get("server_stats", {})
-                server_stats = {
-                    ip: deque(entries, maxlen=10000) for ip, entries in stats.items()
-                }
+def dump_snapshot():
+    """
+    Копия текущего статуса и статистики серверов для снимка: (заголовок, буферы).
+    Массивы кольцевых буферов копируются в bytes, статусы — поверхностно: дальше снимок можно
+    сериализовать и записать в другом потоке, пока проверки меняют состояние.
+    """
+    buffers = []
+    rings = []
+    for target_id, stats in server_stats.items():
+        buffers.extend(bytes(buffer) for buffer in stats.dump())
+        rings.append([target_id, SampleRing.dump_size(len(stats))])
+    rollups, rollup_buffers = rollup_store.dump()
+    header = {
+        "format": "ring-v1",
+        "server_status": {target_id: dict(state) for target_id, state in server_status.items()},
+        "rings": rings,
+        "rollups": rollups,
+        "latency": {target_id: windows.to_json() for target_id, windows in latency_windows.items()},
+        "dns_failures": {target_id: list(timestamps) for target_id, timestamps in dns_failures.items() if timestamps},
+    }
+    return header, buffers + [bytes(buffer) for buffer in rollup_buffers]
 
-                for ip in server_stats:
-                    if not isinstance(server_stats[ip], deque) or len(server_stats[ip]) == 0:
-                        server_stats[ip] = deque(maxlen=10000)
 
-                function_logger.info(f"Статусы и статистика успешно загружены из файла.")
-        except Exception as e:
-            function_logger.error(f"Ошибка при загрузке статусного файла: {e}")
-    else:
-        # Инициализируем, если файла нет
-        server_status = {server["ip"]: {"status": True, "response_time": None} for server in SERVERS}
-        server_stats = {server["ip"]: deque(maxlen=10000) for server in SERVERS}
-        function_logger.info("Файл статусов не найден, создано пустое состояние.")
+def encode_snapshot(header, buffers):
+    """Полезная нагрузка снимка из dump_snapshot(): JSON-заголовок строкой, затем бинарные буферы."""
+    return [json.dumps(header, separators=(",", ":")).encode() + b"\n"] + buffers
 
 
-def save_status():
-    """Сохраняет текущий статус и статистику серверов в файл."""
-    function_logger = setup_function_logger('log/bot.log')
+def save_status(records):
+    """
+    Сохраняет новые проверки в журнал [target_id, timestamp, status, response_time].
+    Раз в SNAPSHOT_INTERVAL журнал сворачивается в новый снимок.
+    """
+    global snapshot_task
     try:
-        data = {
-            "server_status": server_status,
-            "server_stats": {
-                ip: list(stats) for ip, stats in server_stats.items()
-            },  # Преобразуем `deque` в списки
-        }
-        with open(STATUS_FILE, "w") as file:
-            json.dump(data, file, indent=4)
-#        function_logger.info(f"Статусы и статистика успешно сохранены.")
+        status_journal.append(records)
+        if time.time() - last_snapshot_time >= SNAPSHOT_INTERVAL and not status_journal.snapshotting:
+            # Копия состояния — здесь, в event loop; сериализация и запись — в пуле потоков
+            snapshot_task = asyncio.ensure_future(write_snapshot(*dump_snapshot()))
+#        bot_logger.info(f"Статусы и статистика успешно сохранены.")
     except Exception as e:
-        function_logger.error(f"Ошибка при сохранении статусного файла: {e}")
+        bot_logger.error(f"Ошибка при сохранении статусного файла: {e}")
+
+
+async def write_snapshot(header, buffers):
+    """Сворачивает журнал в снимок, не блокируя event loop (задача из save_status)."""
+    global last_snapshot_time
+    try:
+        with perf.measure("snapshot"):
+            await status_journal.snapshot_async(encode_snapshot, header, buffers)
+        last_snapshot_time = time.time()
+    except Exception as e:
+        bot_logger.error(f"Ошибка при записи снимка: {e}")
 
 
 def clean_old_stats():
     """
     Удаляет проверки, которые старше 24 часов.
     """
-    function_logger = setup_function_logger1('log/CleanOldStats.log')
     now = time.time()
-    for ip, stats in server_stats.items():
-        old_count = 0
-        server_name = next(server['name'] for server in SERVERS if server['ip'] == ip)
-        while stats and stats[0][0] < now - MONITORING_WINDOW:
-            stats.popleft()
-            old_count += 1
+    for target_id, stats in server_stats.items():
+        server_name = inventory.name(target_id)
+        old_count = stats.trim(now - MONITORING_WINDOW)  # Счетчики буфера обновляются при вытеснении
+        failures = dns_failures.get(target_id)
+        while failures and failures[0] < now - MONITORING_WINDOW:
+            failures.popleft()
         if old_count > 0:
-            function_logger.info(f"Удалено {old_count} старых записей для {server_name} ({ip})")
+            clean_logger.info(f"Удалено {old_count} старых записей для {server_name} ({target_id})")
         else:
-            function_logger.info(f"Нечего удалять для {server_name} ({ip})")
+            clean_logger.info(f"Нечего удалять для {server_name} ({target_id})")
 
-        # Рассчитываем успешные, неудачные проверки заново
+        # Текущие счетчики буфера, без пересчета истории
         total_checks = len(stats)
-        successful_checks = sum(1 for _, status in stats if status)
-        failed_checks = total_checks - successful_checks
+        successful_checks = stats.ok_count
+        failed_checks = stats.fail_count
 
         # Логирование обновленной статистики
-        function_logger.info(f"Для {server_name} ({ip}): всего проверок - {total_checks}, успешных - {successful_checks}, неудачных - {failed_checks}")
+        clean_logger.info(f"Для {server_name} ({target_id}): всего проверок - {total_checks}, успешных - {successful_checks}, неудачных - {failed_checks}")
 
 
-async def check_server(server, retries=3, delay=1):
+async def check_server(target, retries=3):
     """
-    Проверяет доступность сервера через указанный порт (443) с использованием socket с несколькими попытками, если первая была неудачная.
+    Проверяет доступность цели проверкой ее типа (probes.py: ICMP, TCP, TLS, HTTP) с несколькими попытками, если первая была неудачная.
+    Таймаут попытки подбирается по истории задержек сервера (probe_timeouts), повторы запускаются
+    сразу и параллельно, пока не исчерпан общий на цикл запас retry_budget.
+    Имя хоста берется из кэша резолва (dns_cache); ошибка резолва считается отдельно от ошибки подключения.
 
     Возвращает:
+    - "id": id цели
     - "status": True/False (доступен/недоступен)
     - "response_time": время отклика (в миллисекундах) или None, если сервер недоступен
-    - "retries": Количество повторных попыток.
-    - "delay": Пауза между повторными попытками (в секундах).
+    - "error": None, "dns" (не удалось определить адрес) или "probe" (проверка не прошла)
     """
-    function_logger = setup_function_logger('log/bot.log')
-    ip = server["ip"]
-    server_name = next(server['name'] for server in SERVERS if server['ip'] == ip)
-    for attempt in range(retries):
+    timeout = probe_timeouts.get(target.id) or probe_runner.max_timeout(target)
+    # Неблокирующая проверка, event loop не простаивает на медленных серверах
+    response_time, error, detail, attempts = await probe_runner.check_target(target, timeout, retries, retry_budget)
+    if error is not None:
+        log_check_failure(target, error, detail, attempts, timeout)
+    return {"id": target.id, "status": error is None, "response_time": response_time, "error": error}
+
+
+def log_check_failure(target, error, detail, attempts, timeout, vantage=LOCAL_VANTAGE):
+    """Запись в лог о неудачной проверке цели (ошибка резолва или исчерпанные попытки) из точки vantage."""
+    source = "" if vantage == LOCAL_VANTAGE else f" с агента {vantage}"
+    if error == "dns":
+        bot_logger.info(f"Проверка {target.probe} сервера {target.name} ({target.host}){source} не выполнена: {detail}")
+        return
+    port = probe_runner.probe_for(target).port(target)
+    address = f"{target.host}:{port}" if port else target.host
+    bot_logger.info(f"Проверка {target.probe} сервера {target.name} ({address}){source} не удалась, попыток {attempts}, таймаут {timeout:.1f} с: {detail}")
 
-        try:
-            start_time = asyncio.get_event_loop().time()  # Засекаем время начала проверки
-
-            # Создаем сокет для подключения
-            with socket.create_connection((ip, PORT), timeout=5) as conn:
-                response_time = round((asyncio.get_event_loop().time() - start_time) * 1000)  # Время в мс
-                conn.close()
-                return {"ip": ip, "status": True, "response_time": response_time}
-        except (socket.timeout, socket.error) as e:
-            function_logger.info(f"Попытка подключения {attempt + 1} к серверу {server_name} ({ip}) не удалась: {str(e)}")
-            if attempt < retries - 1:
-                await asyncio.sleep(delay)  # Пауза перед повторной попыткой
-            else:
-                # Если retries исчерпаны, считаем сервер недоступным
-                return {"ip": ip, "status": False, "response_time": None}
+
+def refresh_probe_timeouts():
+    """Пересчитывает таймауты проверок: PROBE_TIMEOUT_MULTIPLIER × p99 задержки за сутки в пределах [PROBE_TIMEOUT_FLOOR, таймаут типа проверки]."""
+    now = time.time()
+    for target in inventory:
+        target_id = target.id
+        probe_timeouts[target_id] = adaptive_timeout(
+            recent_latency_histogram(target_id, now - MONITORING_WINDOW),
+            PROBE_TIMEOUT_FLOOR,
+            probe_runner.max_timeout(target),
+            PROBE_TIMEOUT_MULTIPLIER,
+        )
+    if shard_pool is not None:
+        shard_pool.set_timeouts(probe_timeouts)
+
+
+def update_state(target_id, timestamp, response_time):
+    """
+    Пересчитывает server_status[target_id] по последним проверкам из server_stats (пороги «N из M», флап).
+    Возвращает события FlapPolicy.evaluate().
+    """
+    state = server_status.setdefault(target_id, {"status": True, "response_time": None})
+    state["response_time"] = response_time
+    policy = flap_policies.get(target_id)
+    if policy is None:
+        policy = flap_policies[target_id] = FlapPolicy()
+    stats = server_stats[target_id]
+    statuses = stats.status_bytes(max(0, len(stats) - policy.history_needed()), len(stats))
+    return policy.evaluate(state, statuses, timestamp)
 
 
-async def check_servers_availability():
+def process_result(result):
     """
-    Асинхронно проверяет доступность всех серверов и отправляет уведомления в случае изменений статуса.
+    Учитывает результат проверки одного сервера: статистика, агрегаты, уведомления об изменении статуса.
+    Новая запись попадает в pending_records и сохраняется в журнал при ближайшем обслуживании,
+    уведомления — в очередь outbox (отправка не задерживает проверки).
     """
-    function_logger = setup_function_logger('log/bot.log')
     global server_status, server_stats
 
-    tasks = [check_server(server) for server in SERVERS]  # Создаем асинхронные задачи для каждого сервера
-    results = await asyncio.gather(*tasks)  # Выполняем задачи параллельно
+    target_id = result["id"]
+    target = inventory.get(target_id)
+    if target is None:
+        return  # Цель удалили из реестра, пока шла проверка
+    new_status = result["status"]
+    response_time = result["response_time"]
+
+    # Сохраняем проверку в очередь статистики (результат воркера приходит со временем проверки)
+    timestamp = result.get("timestamp") or time.time()
+    server_stats[target_id].append(timestamp, new_status, response_time)
+    record_aggregates(target_id, timestamp, new_status, response_time)
+    pending_records.append([target_id, timestamp, new_status, response_time])
+    server_status[target_id]["error"] = result.get("error")
+    server_status[target_id]["vantage"] = result.get("vantage")  # Голоса точек проверки (при нескольких)
+    if result.get("error") == "dns":
+        dns_failures.setdefault(target_id, deque()).append(timestamp)
+
+    # Обновляем статус сервера: смена статуса подтверждается порогом «N из M», при флапе уведомления подавляются
+    events = update_state(target_id, timestamp, response_time)
+    if FLAP_END in events:
+        # Сводка по окончании флапа уже содержит текущий статус
+        events = [FLAP_END]
+    for event in events:
+        bot_logger.info(f"Сервер {target.name} ({target_id}): {event} в {time.ctime()}. Время отклика: {response_time} мс")
+        outbox.send(
+            CHAT_ID,
+            alert_text(event, target.name, target.host, server_status[target_id]),
+            merge=True,  # Одновременные уведомления склеиваются в одно сообщение
+            disable_notification=True  # Тихое уведомление
+        )
+
+
+async def check_and_process(target_id):
+    """Проверка одной цели по расписанию (задача планировщика); параметры цели берутся из реестра на момент запуска."""
+    target = inventory.get(target_id)
+    if target is None:
+        return
+    with perf.measure("probe"):
+        result = await check_server(target)
+    with perf.measure("process_result"):
+        submit_result(result)
+
+
+def submit_result(result, vantage=LOCAL_VANTAGE):
+    """
+    Результат проверки из точки vantage. У цели с одной точкой проверки он сразу идет в process_result,
+    при нескольких точках статус решает кворум по раундам голосов (agent.Quorum).
+    """
+    target = inventory.get(result["id"])
+    if target is None:
+        return
+    if vantage_points(target) == [LOCAL_VANTAGE]:
+        process_result(result)
+        return
+    result.setdefault("timestamp", time.time())
+    for decision in quorum.report(target, vantage, result):
+        process_result(decision)
+
 
+def process_shard_results(results, vantage=LOCAL_VANTAGE):
+    """Пачка результатов от воркеров проверок (ShardPool.on_results) или агента vantage (AgentServer.on_results)."""
     for result in results:
-        ip = result["ip"]
-        new_status = result["status"]
-        response_time = result["response_time"]
-        server_name = next(server['name'] for server in SERVERS if server['ip'] == ip)
-
-
-        # Сохраняем проверку в очередь статистики
-        server_stats[ip].append((time.time(), new_status))
-
-        # Если статус изменился, уведомляем и обновляем хранилище статусов
-        if new_status and not server_status[ip]["status"]:
-            # Сервер снова доступен
-            function_logger.info(f"Сервер {server_name} ({ip}) стал доступен в {time.ctime()}. Время отклика: {response_time} мс")
-            await bot.send_message(
-                chat_id=CHAT_ID,
-                text=f"✅ Сервер {next(s['name'] for s in SERVERS if s['ip'] == ip)} ({ip}) снова доступен!\n\n⏱ Время ответа: {result['response_time']} мс",
-                disable_notification=True  # Тихое уведомление
-            )
-        elif not new_status and server_status[ip]["status"]:
-            # Сервер стал недоступен
-            function_logger.info(f"Сервер {server_name} ({ip}) недоступен в {time.ctime()}")
-            await bot.send_message(
-                chat_id=CHAT_ID,
-                text=f"⚠️ Сервер {next(s['name'] for s in SERVERS if s['ip'] == ip)} ({ip}) недоступен!",
-                disable_notification=True  # Тихое уведомление
-            )
+        if vantage == LOCAL_VANTAGE:
+            perf.observe("probe", result["duration"])
+        if result["detail"] is not None:
+            target = inventory.get(result["id"])
+            if target is not None:
+                attempts, timeout, detail = result["detail"]
+                log_check_failure(target, result["error"], detail, attempts, timeout, vantage)
+        with perf.measure("process_result"):
+            submit_result(result, vantage)
+
+
+def process_agent_results(agent, results):
+    process_shard_results(results, agent)
+
+
+def agent_changed(agent, connected):
+    """Отключение агента и его возвращение (AgentServer.on_agent): уведомление, если у агента есть цели."""
+    if connected and agent not in disconnected_agents:
+        return  # Обычное подключение при запуске
+    if connected:
+        disconnected_agents.discard(agent)
+    else:
+        disconnected_agents.add(agent)
+    names = [target.name for target in inventory if agent in vantage_points(target)]
+    if not names:
+        return
+    if connected:
+        text = f"🔌 Агент проверок {agent} подключен, целей: {len(names)}"
+    else:
+        text = (f"🔌 Агент проверок {agent} отключился, целей без этой точки проверки: {len(names)}. "
+                f"Пока он не вернется, недоступность этих целей может не определяться.")
+    outbox.send(CHAT_ID, text, merge=True)
+
+
+def check_vantage_points():
+    """
+    Ищет точки проверки, от которых давно нет результатов по целям (агент отключен или завис):
+    такие цели помечаются в /status, о пропаже и возвращении точки приходит уведомление.
+    """
+    now = time.time()
+    lost, restored = {}, {}
+    for target in inventory:
+        if vantage_points(target) == [LOCAL_VANTAGE]:
+            continue
+        silent = quorum.silent(target, now)
+        previous = silent_vantage.get(target.id, [])
+        for point in silent:
+            if point not in previous:
+                lost.setdefault(point, []).append(target.name)
+        for point in previous:
+            if point not in silent:
+                restored.setdefault(point, []).append(target.name)
+        if silent:
+            silent_vantage[target.id] = silent
+        else:
+            silent_vantage.pop(target.id, None)
+    for point, names in lost.items():
+        bot_logger.warning(f"Нет результатов из точки проверки {point} по целям: {', '.join(names)}")
+        outbox.send(CHAT_ID, vantage_alert(point, names), merge=True)
+    for point, names in restored.items():
+        bot_logger.info(f"Точка проверки {point} снова присылает результаты по целям: {', '.join(names)}")
+        outbox.send(CHAT_ID, vantage_alert(point, names, restored=True), merge=True)
+
+
+def start_target(target):
+    """Заводит состояние цели (история, если уже есть, сохраняется) и ставит ее проверку в планировщик."""
+    server_status.setdefault(target.id, {"status": True, "response_time": None})
+    if target.id not in server_stats:
+        server_stats[target.id] = SampleRing(STATS_CAPACITY)
+    flap_policies[target.id] = FlapPolicy.for_server(target)
+    quorum.forget(target.id)  # Голоса по старым параметрам цели не смешиваются с новыми
+    if agent_server is not None:
+        agent_server.assign(target)  # Цели с удаленными точками проверки — агентам
+    elif vantage_points(target) != [LOCAL_VANTAGE]:
+        bot_logger.warning(f"У цели {target.id} заданы точки проверки {vantage_points(target)}, но прием агентов выключен (AGENT_LISTEN_PORT)")
+    if LOCAL_VANTAGE not in vantage_points(target):
+        # Бот сам цель не проверяет
+        monitoring_scheduler.remove(("check", target.id))
+        if shard_pool is not None:
+            shard_pool.remove(target.id)
+        return
+    if shard_pool is not None:
+        shard_pool.assign(target)  # Проверяет воркер, результаты — в process_shard_results
+        return
+    monitoring_scheduler.add(("check", target.id), target.interval, lambda target_id=target.id: check_and_process(target_id))
+
+
+def stop_target(target_id):
+    """Снимает проверку цели с планировщика и удаляет ее состояние и историю."""
+    monitoring_scheduler.remove(("check", target_id))
+    if shard_pool is not None:
+        shard_pool.remove(target_id)
+    if agent_server is not None:
+        agent_server.remove(target_id)
+    quorum.forget(target_id)
+    for store in (server_status, server_stats, flap_policies, latency_windows, probe_timeouts, dns_failures, silent_vantage):
+        store.pop(target_id, None)
+    rollup_store.remove(target_id)
+
+
+def reload_inventory():
+    """
+    Перечитывает файл целей и применяет разницу: запускает новые проверки, останавливает
+    удаленные, перенастраивает измененные. История неизменных целей не трогается; у измененных
+    сохраняется, если не поменялось, что проверяется (тип проверки, host, port).
+    Возвращает (added, removed, changed) или None, если файл прочитать не удалось.
+    """
+    try:
+        added, removed, changed = inventory.reload()
+    except Exception as e:
+        bot_logger.error(f"Ошибка при загрузке файла целей {inventory.path}: {e}")
+        return None
+
+    for target in removed:
+        stop_target(target.id)
+    for old, new in changed:
+        if old.endpoint() != new.endpoint():
+            stop_target(old.id)  # История относится к старому адресу
+        start_target(new)
+    for target in added:
+        start_target(target)
+
+    retry_budget.per_cycle = max(MIN_RETRY_BUDGET, int(len(inventory) * RETRY_BUDGET_RATIO))
+    if shard_pool is not None:
+        shard_pool.set_budget(retry_budget.per_cycle)
+    if agent_server is not None:
+        agent_server.set_budget(retry_budget.per_cycle)
+    if added or removed or changed:
+        graph_cache.invalidate()
+        refresh_probe_timeouts()
+        bot_logger.info(f"Цели перезагружены: добавлено {len(added)}, удалено {len(removed)}, изменено {len(changed)}, всего {len(inventory)}")
+    return added, removed, changed
+
+
+def forget_unknown_targets():
+    """Удаляет загруженные из снимка данные целей, которых больше нет в реестре."""
+    if not inventory.loaded:
+        return  # Файл целей не прочитан — ничего не удаляем
+    for target_id in list(server_stats):
+        if target_id not in inventory:
+            bot_logger.info(f"Цели {target_id} нет в {inventory.path}, ее история удалена")
+            stop_target(target_id)
+
+
+async def watch_inventory():
+    """Перечитывает файл целей, если он изменился (задача планировщика)."""
+    if inventory.modified():
+        reload_inventory()
+
+
+def housekeeping():
+    """
+    Обслуживание после очередного периода проверок: очистка старых данных,
+    сброс кэша графиков и сохранение накопленных проверок в журнал.
+    Длительность каждой фазы записывается в perf.
+    """
+    with perf.measure("housekeeping"):
+        run_housekeeping_phases()
 
-        # Обновляем статус сервера
-        server_status[ip] = {"status": new_status, "response_time": response_time}
+
+def run_housekeeping_phases():
+    global pending_records, last_cycle_checks
 
     # Очистка старых данных
-    clean_old_stats()
+    with perf.measure("clean_old_stats"):
+        clean_old_stats()
+    dns_cache.prune()
+
+    # Новый цикл: таймауты по свежей истории задержек, полный запас повторов
+    with perf.measure("refresh_probe_timeouts"):
+        refresh_probe_timeouts()
+    if shard_pool is not None:
+        shard_pool.refill()  # Воркеры и агенты сообщают о нехватке запаса сами
+    if agent_server is not None:
+        agent_server.refill()
+    check_vantage_points()
+    denied = retry_budget.refill()
+    if denied:
+        bot_logger.info(f"Запас повторных попыток исчерпан, не выполнено повторов: {denied}")
+
+    # Появились новые проверки — закэшированные графики устарели
+    if pending_records:
+        graph_cache.invalidate()
 
     # Сохраняем изменения после проверки
-    save_status()
+    records, pending_records = pending_records, []
+    last_cycle_checks = len(records)
+    with perf.measure("save_status"):
+        save_status(records)
+
+    # Отчет о задержках планировщика
+    lag = monitoring_scheduler.lag_stats()
+    if lag["max"] > 1 or lag["overruns"] or lag["missed"]:
+        bot_logger.info(
+            f"Планировщик: задержка запуска последняя {lag['last']:.3f} с, средняя {lag['avg']:.3f} с, "
+            f"максимальная {lag['max']:.3f} с, пропущено запусков {lag['overruns']}, периодов {lag['missed']}"
+        )
 
 
-def calculate_stats(ip):
+def calculate_stats(target_id):
     """
     Рассчитывает статистику доступности для сервера за последние 24 часа.
+    Использует счетчики кольцевого буфера: O(1) плюс вытеснение устаревших проверок.
     """
-    now = time.time()
-    checks = [status for timestamp, status in server_stats[ip] if timestamp >= now - MONITORING_WINDOW]
-    total_checks = len(checks)
-    successful_checks = sum(checks)
-    failed_checks = total_checks - successful_checks
-    availability = round((successful_checks / total_checks) * 100, 2) if total_checks > 0 else 0
+    stats = server_stats[target_id]
+    stats.trim(time.time() - MONITORING_WINDOW)
+    total_checks = len(stats)
+    successful_checks = stats.ok_count
+    failed_checks = stats.fail_count
+    availability = stats.availability() or 0
     return total_checks, successful_checks, failed_checks, availability
 
 
@@ -280,9 +779,57 @@ async def send_welcome(message: types.Message):
     if message.chat.id not in adm:
         await message.answer('Я же сказал, нехуй тебе здесь делать!')
     else:
-        await message.answer('/status - текущий статус серверов\n\n/stats - общая статистика доступности серверов\n\n/graph - графики доступности серверов\n\n/log - просмотр логов')
+        await message.answer('/status - текущий статус серверов\n\n/stats - общая статистика доступности серверов (/stats 6h - за указанное окно)\n\n/graph - графики доступности серверов\n\n/log - просмотр логов\n\n/reload - перечитать файл целей\n\n/perf - производительность бота')
 
-# Функция для отправки длинных сообщений частями (без разрыва строк)
+#Обработчик команды /reload (перечитать файл целей без перезапуска)
+@dp.message_handler(commands=["reload"])
+async def send_reload(message: types.Message):
+    adm = users
+    if message.chat.id not in adm:
+        await message.answer('Я же сказал, нехуй тебе здесь делать!')
+        return
+    result = reload_inventory()
+    if result is None:
+        await message.answer(f"Не удалось прочитать {inventory.path}, цели остались прежними. Подробности в логах.")
+        return
+    added, removed, changed = result
+    await message.answer(
+        f"🔄 Цели перезагружены из {inventory.path}:\n"
+        f"  ➕ добавлено: {len(added)}\n"
+        f"  ➖ удалено: {len(removed)}\n"
+        f"  ✏️ изменено: {len(changed)}\n"
+        f"  Всего целей: {len(inventory)}"
+    )
+
+# Текущие значения для /perf и экспорта: нагрузка проверок, очереди, счетчики
+perf.gauge("targets", "целей в реестре", lambda: len(inventory))
+perf.gauge("probes_in_flight", "попыток проверки в работе", lambda: (shard_pool or probe_runner).active)
+perf.gauge("probes_in_flight_peak", "максимум попыток в работе с запуска", lambda: (shard_pool or probe_runner).peak)
+perf.gauge("checks_last_cycle", "проверок за прошлый цикл обслуживания", lambda: last_cycle_checks)
+perf.gauge("pending_records", "проверок, ожидающих записи в журнал", lambda: len(pending_records))
+perf.gauge("outbox_pending", "сообщений в очереди Telegram", lambda: outbox.pending())
+perf.gauge("scheduler_lag_max_seconds", "максимальная задержка запуска планировщика, с", lambda: round(monitoring_scheduler.lag_stats()["max"], 3))
+perf.gauge("scheduler_skipped_total", "пропущено запусков планировщика", lambda: monitoring_scheduler.lag_stats()["overruns"] + monitoring_scheduler.lag_stats()["missed"], kind="counter")
+perf.gauge("telegram_sent_total", "отправлено сообщений Telegram", lambda: outbox.sent, kind="counter")
+perf.gauge("telegram_failed_total", "не отправлено сообщений Telegram", lambda: outbox.failed, kind="counter")
+perf.gauge("webhook_queue", "обновлений в очереди webhook", lambda: webhook_server.pending() if webhook_server is not None else 0)
+perf.gauge("webhook_rejected_total", "отклонено обновлений webhook (очередь заполнена)", lambda: webhook_server.rejected if webhook_server is not None else 0, kind="counter")
+perf.gauge("agents_connected", "подключенных агентов проверок", lambda: len(agent_server.agents) if agent_server is not None else 0)
+perf.gauge("dns_cache_entries", "имен в кэше DNS", lambda: len(dns_cache))
+perf.gauge("dns_failures_total", "ошибок резолва", lambda: dns_cache.failures, kind="counter")
+
+#Обработчик команды /perf (самоизмерение бота)
+@dp.message_handler(commands=["perf"])
+async def send_perf(message: types.Message):
+    adm = users
+    if message.chat.id not in adm:
+        await message.answer('Я же сказал, нехуй тебе здесь делать!')
+        return
+    await message.answer(perf.report())
+
+# Функция для отправки длинных сообщений частями (без разрыва строк).
+# Части идут через outbox (лимиты Telegram, повторы на 429); следующая часть собирается после отправки
+# предыдущей, поэтому длинный поток строк не копится в памяти
 async def send_long_message(chat_id, lines, max_message_length=4000):
     chunk = []  # Массив строк для текущего блока
     current_length = 0  # Общая длина текущего блока
@@ -291,7 +838,7 @@ async def send_long_message(chat_id, lines, max_message_length=4000):
         line_length = len(line)
         # Если добавление строки превышает лимит, отправляем текущий блок
         if current_length + line_length > max_message_length:
-            await bot.send_message(chat_id, "\n".join(chunk))
+            await outbox.send(chat_id, "\n".join(chunk))
             chunk = []  # Очищаем текущий блок
             current_length = 0  # Сбрасываем длину блока
 
@@ -300,10 +847,11 @@ async def send_long_message(chat_id, lines, max_message_length=4000):
 
     # Отправляем оставшиеся строки в финальном блоке
     if chunk:
-        await bot.send_message(chat_id, "\n".join(chunk))
+        await outbox.send(chat_id, "\n".join(chunk))
 
 #Обработчик команды /log (получаем логи из файла в чат)
 @dp.message_handler(commands=['log'])
+@perf.timed("handler_log")
 async def send_logs(message: types.Message):
     adm = users
     if message.chat.id not in adm:
@@ -322,6 +870,7 @@ async def send_logs(message: types.Message):
 
 # Обработка выбора файла
 @dp.callback_query_handler(lambda callback: callback.data.startswith('file_'))
+@perf.timed("handler_log")
 async def process_file_selection(callback_query: types.CallbackQuery):
     selected_file = callback_query.data.split('file_')[1]
 
@@ -331,6 +880,7 @@ async def process_file_selection(callback_query: types.CallbackQuery):
 
     # Создаем кнопки для выбора: все логи или фильтрация по числу и часу
     mode_buttons = [
+        InlineKeyboardButton(f"Последние {LOG_TAIL_LINES} строк", callback_data=f"mode_tail_{selected_file}"),
         InlineKeyboardButton("Все логи", callback_data=f"mode_all_{selected_file}"),
         InlineKeyboardButton("Фильтр по числу и часу", callback_data=f"mode_filtered_{selected_file}"),
     ]
@@ -339,19 +889,34 @@ async def process_file_selection(callback_query: types.CallbackQuery):
 
 # Обработка выбора режима (все логи или фильтрация)
 @dp.callback_query_handler(lambda callback: callback.data.startswith('mode_'))
+@perf.timed("handler_log")
 async def process_mode_selection(callback_query: types.CallbackQuery):
     mode, selected_file = callback_query.data.split('_')[1], callback_query.data.split('_')[-1]
 
-    if mode == "all":
-        # Считать все данные из файла логов
+    if mode == "tail":
+        # Последние строки: файл читается с конца, сколько бы он ни весил
         if os.path.exists(f"log/{selected_file}"):
             try:
-                with open(f"log/{selected_file}", 'r', encoding='utf-8') as file:
-                    logs = file.readlines()
-                await callback_query.message.answer(f"Все логи из файла {selected_file}:")
+                loop = asyncio.get_event_loop()
+                logs = await loop.run_in_executor(None, log_reader.tail, f"log/{selected_file}", LOG_TAIL_LINES)
+                await callback_query.message.answer(f"Последние {len(logs)} строк из файла {selected_file}:")
                 await send_long_message(callback_query.message.chat.id, logs)
             except Exception as e:
                 await callback_query.message.answer(f"Ошибка при обработке файла логов: {e}")
+        else:
+            await callback_query.message.answer("Файл логов не найден.")
+    elif mode == "all":
+        # Все данные из файла логов: файл читается блоками в executor по мере отправки, целиком в память не загружается
+        if os.path.exists(f"log/{selected_file}"):
+            try:
+                await callback_query.message.answer(f"Все логи из файла {selected_file}:")
+                loop = asyncio.get_event_loop()
+                offset = 0
+                while offset is not None:
+                    logs, offset = await loop.run_in_executor(None, log_reader.read_lines, f"log/{selected_file}", offset)
+                    await send_long_message(callback_query.message.chat.id, logs)
+            except Exception as e:
+                await callback_query.message.answer(f"Ошибка при обработке файла логов: {e}")
         else:
             print(selected_file)
             await callback_query.message.answer("Файл логов не найден.")
@@ -363,6 +928,7 @@ async def process_mode_selection(callback_query: types.CallbackQuery):
 
 # Обработка выбора числа
 @dp.callback_query_handler(lambda callback: callback.data.startswith('day_'))
+@perf.timed("handler_log")
 async def process_day(callback_query: types.CallbackQuery):
     callback_data = callback_query.data.split('_')
     day = callback_data[1].zfill(2)  # Преобразуем число в формат "01", "02", и т.д.
@@ -374,6 +940,7 @@ async def process_day(callback_query: types.CallbackQuery):
 
 # Обработка выбора часа и отправка логов
 @dp.callback_query_handler(lambda callback: callback.data.startswith('hour_'))
+@perf.timed("handler_log")
 async def process_hour(callback_query: types.CallbackQuery):
     callback_data = callback_query.data.split('_')
     hour = int(callback_data[1])  # Час
@@ -382,16 +949,15 @@ async def process_hour(callback_query: types.CallbackQuery):
 
     if os.path.exists(f"log/{selected_file}"):
         try:
-            # Открываем файл с логами
-            with open(f"log/{selected_file}", 'r', encoding='utf-8') as file:
-                logs = file.readlines()
-
-            # Фильтруем логи по числу и часу
-            filtered_logs = [log for log in logs if f"-{day} " in log and log.split()[1].startswith(f"{hour:02}:")]
+            # Читаем только строки нужного часа по индексу смещений (индекс дочитывается в фоновом потоке)
+            loop = asyncio.get_event_loop()
+            filtered_logs, truncated = await loop.run_in_executor(None, log_reader.read_hour, f"log/{selected_file}", day, hour)
 
             if filtered_logs:
                 # Отправляем логи в чат
                 await callback_query.message.answer(f"Логи за {day} число и {hour:02}:00 час из файла {selected_file}:")
+                if truncated:
+                    await callback_query.message.answer(f"Логов за этот час слишком много, показаны последние {log_reader.MAX_READ_BYTES // 1024} КБ.")
                 await send_long_message(callback_query.message.chat.id, filtered_logs)
             else:
                 await callback_query.message.answer(f"Нет данных логов за {day} число и {hour:02}:00 час в файле {selected_file}.")
@@ -402,6 +968,7 @@ async def process_hour(callback_query: types.CallbackQuery):
 
 #Обработчик команды /status для проверки текущего состояния серверов
 @dp.message_handler(commands=["status"])
+@perf.timed("handler_status")
 async def send_status(message: types.Message):
     adm = users
     if message.chat.id not in adm:
@@ -409,54 +976,148 @@ async def send_status(message: types.Message):
     else:
         global server_status
         status_message = "📊 Текущий статус серверов:\n\n"
-        for server in SERVERS:
-            ip = server["ip"]
-            status = "✅ Доступен" if server_status[ip]["status"] else "❌ Недоступен"
+        now = time.time()
+        for target in inventory:
+            target_id = target.id
+            status = state_label(server_status[target_id])
+            if target_id in silent_vantage:
+                status += f" ⚠️ нет результатов из: {', '.join(silent_vantage[target_id])}"
             response_time = (
-                f"⏱ {server_status[ip]['response_time']} мс"
-                if server_status[ip]["response_time"] is not None
+                f"⏱ {server_status[target_id]['response_time']} мс"
+                if server_status[target_id]["response_time"] is not None
                 else "N/A"
             )
-            status_message += f"{server['name']} ({ip}): {status} ({response_time})\n"
+            # p95 задержки за последний час из гистограммы
+            p95 = latency_histogram(target_id, now - 60 * 60, now).percentile(95)
+            if p95 is not None:
+                response_time += f", p95 за час {format_ms(p95)}"
+            status_message += f"{target.name} ({target.host}): {status} ({response_time})\n"
+
+        # Задержка запуска проверок относительно расписания
+        lag = monitoring_scheduler.lag_stats()
+        status_message += f"\n🕒 Планировщик: задержка запуска до {lag['max']:.2f} с, пропущено запусков: {lag['overruns'] + lag['missed']}\n"
+
+        # Кэш резолва имен хостов
+        dns = dns_cache.stats()
+        if dns["hits"] + dns["misses"]:
+            status_message += (
+                f"🌐 DNS: имен в кэше {dns['entries']}, попаданий {dns['hits'] / (dns['hits'] + dns['misses']):.0%}, "
+                f"ошибок резолва {dns['failures']}\n"
+            )
 
         await message.answer(status_message)
 
 #Обработчик команды /stats
 @dp.message_handler(commands=["stats"])
+@perf.timed("handler_stats")
 async def send_stats(message: types.Message):
     """
     Реагирует на команду /stats для отображения общей статистики доступности серверов.
+    С аргументом (/stats 6h, /stats 30m, /stats 2d) — статистика за указанное окно.
     """
     adm = users
     if message.chat.id not in adm:
         await message.answer('Я же сказал, нехуй тебе здесь делать!')
+    elif message.get_args():
+        await send_window_stats(message, message.get_args())
     else:
         global server_stats
 
         # Формируем сообщение статистики
         stats_message = "📊 Общая статистика серверов:\n\n"
-        for server in SERVERS:
-            ip = server["ip"]
-            stats = server_stats.get(ip, {"total_checks": 0, "successful_checks": 0, "failed_checks": 0})
-
-            # Рассчитываем метрики
-            total_checks = len(stats)
-            successful_checks = sum(1 for ts, status in stats if status)  # Количество успешных проверок
-            failed_checks = total_checks - successful_checks  # Количество неудачных проверок
-            availability = round((successful_checks / total_checks) * 100, 2) if total_checks > 0 else "N/A"
+        for target in inventory:
+            target_id = target.id
+            if target_id not in server_stats:
+                continue
+            # Метрики за 24 часа из счетчиков буфера, без прохода по истории
+            total_checks, successful_checks, failed_checks, availability = calculate_stats(target_id)
+            if not total_checks:
+                availability = "N/A"
+            now = time.time()
+            percentiles = format_percentiles(recent_latency_histogram(target_id, now - MONITORING_WINDOW))
 
             stats_message += (
-                f"💻 {server['name']} ({ip}):\n"
+                f"💻 {target.name} ({target.host}):\n"
                 f"  ✅ Успешных проверок: {successful_checks}\n"
                 f"  ❌ Неудачных проверок: {failed_checks}\n"
                 f"  📈 Доступность: {availability}%\n"
-                f"  🔄 Всего проверок: {total_checks}\n\n"
+                f"  🔄 Всего проверок: {total_checks}\n"
+                f"  ⏱ Задержка: {percentiles}\n"
+                f"{format_dns_failures(target_id, now - MONITORING_WINDOW)}\n"
             )
 
         await message.answer(stats_message)
 
+def format_dns_failures(target_id, since):
+    """Строка /stats о неудачных проверках из-за ошибки резолва после since (пустая, если их не было)."""
+    count = sum(1 for timestamp in dns_failures.get(target_id, ()) if timestamp >= since)
+    return f"  ❓ Неудачных из-за ошибки DNS: {count}\n" if count else ""
+
+async def send_window_stats(message, window_text):
+    """
+    Статистика за произвольное окно: доступность, число неудачных проверок,
+    самый долгий простой и MTTR (query_window).
+    Окна длиннее MONITORING_WINDOW считаются по агрегатам (rollup_store).
+    """
+    window = parse_window(window_text)
+    if window is None:
+        await message.answer('Не понял окно. Примеры: /stats 30m, /stats 6h, /stats 1d, /stats 30d')
+        return
+
+    now = time.time()
+    if window > MONITORING_WINDOW:
+        await send_rollup_stats(message, window_text, now - window, now)
+        return
+
+    stats_message = f"📊 Статистика серверов за {window_text.strip()}:\n\n"
+    for target in inventory:
+        target_id = target.id
+        if target_id not in server_stats:
+            continue
+        result = query_window(server_stats[target_id], now - window, now)
+        availability = result["availability"] if result["availability"] is not None else "N/A"
+        longest_outage = format_duration(result["longest_outage"]) if result["outages"] else "нет"
+        if result["ongoing"]:
+            longest_outage += " (продолжается)"
+
+        stats_message += (
+            f"💻 {target.name} ({target.host}):\n"
+            f"  📈 Доступность: {availability}%\n"
+            f"  ❌ Неудачных проверок: {result['failed']} из {result['total']}\n"
+            f"  ⛔ Простоев: {result['outages']}, самый долгий: {longest_outage}\n"
+            f"  🔧 MTTR: {format_duration(result['mttr'])}\n"
+            f"  ⏱ Задержка: {format_percentiles(latency_histogram(target_id, now - window, now))}\n"
+            f"{format_dns_failures(target_id, now - window)}\n"
+        )
+
+    await message.answer(stats_message)
+
+async def send_rollup_stats(message, window_text, start, end):
+    """
+    Статистика за длинный период по агрегатам из самого дешевого подходящего уровня.
+    """
+    stats_message = f"📊 Статистика серверов за {window_text.strip()}:\n\n"
+    for target in inventory:
+        target_id = target.id
+        tier, rows = rollup_store.select(target_id, start, end)
+        result = summarize(rows)
+        availability = result["availability"] if result["availability"] is not None else "N/A"
+        rtt_avg = f"{round(result['rtt_avg'])} мс" if result["rtt_avg"] is not None else "N/A"
+        rtt_max = f"{round(result['rtt_max'])} мс" if result["rtt_max"] is not None else "N/A"
+
+        stats_message += (
+            f"💻 {target.name} ({target.host}):\n"
+            f"  📈 Доступность: {availability}%\n"
+            f"  ❌ Неудачных проверок: {result['failed']} из {result['total']}\n"
+            f"  ⛔ Интервалов ({tier.name}) с простоями: {result['failed_buckets']}\n"
+            f"  ⏱ Задержка: средняя {rtt_avg}, максимальная {rtt_max}\n\n"
+        )
+
+    await message.answer(stats_message)
+
 #Обработчик команды /graph (создание кнопок)
 @dp.message_handler(commands=["graph"])
+@perf.timed("handler_graph")
 async def send_graph1(message: types.Message):
     """
     Создает ступенчатый график доступности серверов с учетом критических событий (изменений состояния).
@@ -473,6 +1134,10 @@ async def send_graph1(message: types.Message):
         InlineKeyboardButton(text="6 часов", callback_data="graph_6h"),
         InlineKeyboardButton(text="12 часов", callback_data="graph_12h"),
         InlineKeyboardButton(text="24 часа", callback_data="graph_24h"),
+        InlineKeyboardButton(text="7 дней", callback_data="graph_7d"),
+        InlineKeyboardButton(text="30 дней", callback_data="graph_30d"),
+        InlineKeyboardButton(text="1 год", callback_data="graph_1y"),
+        InlineKeyboardButton(text="Задержка за 24 часа", callback_data="latency_24h"),
         InlineKeyboardButton(text="последние 50 проверок", callback_data="last_50pr"),
     ]
     keyboard.add(*buttons)
@@ -480,90 +1145,170 @@ async def send_graph1(message: types.Message):
     # Отправляем сообщение с кнопками
     await message.answer("📊 Выберите временной диапазон для графика:", reply_markup=keyboard)
 
-#Обработчик кнопки (последние 50 проверок)
-@dp.callback_query_handler(text="last_50pr")
-async def send_eng(callback: types.CallbackQuery):
+async def send_cached_graph(chat_id, key, render, caption):
     """
-    Создает ступенчатый график доступности серверов с вертикальными отступами на оси Y.
+    Отправляет график из кэша (graph_cache): одинаковые одновременные запросы ждут один рендер,
+    повторная отправка идет по Telegram file_id без загрузки картинки.
     """
+    key = (key, tuple(inventory.targets))
 
-    global server_stats
-
-    # Подготовка данных
-    server_names = [server["name"] for server in SERVERS]
-    colors = ['blue', 'green', 'orange', 'red', 'purple', 'cyan', 'magenta']  # Цвета для серверов
-    max_checks = 50  # Отобразим последние 50 проверок
-    offset_step = 1.5  # Отступ по оси Y между серверами
-
-    plt.figure(figsize=(16, 10))  # Размер изображения
-
-    # Построение ступенчатых графиков для каждого сервера
-    for idx, server in enumerate(SERVERS):
-        ip = server["ip"]
-        name = server["name"]
+    async def timed_render():
+        with perf.measure("graph_render"):
+            return await render()
 
-        stats = server_stats.get(ip, deque())
-#        logging.info(f"Сервер {server['name']} ({ip}): всего записей: {len(stats)}")
+    entry = await graph_cache.get(key, timed_render)
+    # Файл создается заново на каждую попытку: при повторе после 429 поток уже прочитан
+    photo = lambda: entry.file_id or types.InputFile(io.BytesIO(entry.png), filename='server_availability_graph.png')
+    sent = await outbox.request(chat_id, lambda: bot.send_photo(chat_id=chat_id, photo=photo(), caption=caption))
+    if entry.file_id is None and sent.photo:
+        graph_cache.set_file_id(key, sent.photo[-1].file_id)
 
-        stats = server_stats.get(ip, deque())  # Получаем данные (все проверки)
-        stats = list(islice(stats, max(len(stats) - max_checks, 0), len(stats)))  # Оставляем только последние max_checks записей
-#        logging.info(f"{name} ({ip}): Загружено {len(stats)} записей для отображения на графике")
 
-        timestamps = [datetime.fromtimestamp(ts) for ts, _ in stats]  # Преобразование меток времени в формат datetime вместо строк
+async def render_recent_graph(max_checks=50):
+    """
+    Строит график последних max_checks проверок (рендер в пуле процессов).
+    """
+    # Подготовка данных: (имя, метки времени, доступность 0/1) для каждого сервера
+    series = []
+    for target in inventory:
+        target_id = target.id
+        name = target.name
 
-        availability = [1 if status else 0 for _, status in stats]  # Теперь заполняем переменную на основе stats
+        stats = server_stats.get(target_id)
+        stats = stats.tail(max_checks) if stats else []  # Оставляем только последние max_checks записей
+#        logging.info(f"{name} ({target_id}): Загружено {len(stats)} записей для отображения на графике")
 
-        # Обработка отсутствия данных
-        if not availability:
-#            timestamps = ['Нет данных']
-            timestamps = [datetime.now()]  # Используем текущее время для пустых данных
-            availability = [0]
+        series.append((name, [ts for ts, _, _ in stats], [1 if status else 0 for _, status, _ in stats]))
 
-        offset = idx * offset_step  # Добавляем вертикальный отступ (offset) для текущего сервера
-        availability_with_offset = [a + offset for a in availability]  # Смещение значений
+    # Рендер в пуле процессов, event loop в это время продолжает работать
+    return await graph_renderer.render(
+        render_availability_graph,
+        series,
+        f'Доступность серверов с вертикальными отступами (последние {max_checks} проверок)',
+        locator_minutes=2,  # Каждые 2 минуты
+        date_format='%H:%M:%S',  # Формат HH:MM:SS
+    )
 
-        # Построение ступенчатого графика
-        plt.step(timestamps, availability_with_offset, label=name, color=colors[idx % len(colors)], where='post')
 
-        # Добавляем подписи рядом с каждой линией
-        if timestamps:
-            center_idx = len(timestamps) // 2  # Центр временных меток
-            plt.text(timestamps[center_idx], offset + 1.1, f' {name}', color=colors[idx % len(colors)], fontsize=10, ha='center', va='bottom')
+async def render_range_graph(hours):
+    """
+    Строит график доступности серверов за последние hours часов (рендер в пуле процессов).
+    """
+    # Интервал меток на оси времени (в минутах) для каждого диапазона
+    locator_intervals = {1: 2, 6: 10, 12: 30, 24: 60}
+    time_range = hours * 60 * 60
+    now = time.time()
 
-    # Настройки отображения
-    plt.title('Доступность серверов с вертикальными отступами (последние 50 проверок)', fontsize=16)
-    plt.xlabel('Время проверки', fontsize=12)
-    plt.ylabel('Доступность', fontsize=12)
-    plt.xticks(rotation=45, fontsize=10)  # Поворот подписей временной оси
-    plt.yticks([], [])  # Убираем автоматически создаваемые метки на оси Y
-    plt.grid(axis='x', linestyle='--', alpha=0.7)
-    plt.gca().xaxis.set_major_locator(mdates.MinuteLocator(interval=2))  # Каждая 2 минута
-    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))  # Формат HH:MM:SS
-    plt.gcf().autofmt_xdate()  # Автоматически форматируем метки времени
+    # Подготовка данных для каждого сервера
+    series = []
+    latency = []
+    for target in inventory:
+        target_id = target.id
+        name = target.name
 
-    # Легенда для графика
-    plt.legend(title='Сервера', fontsize=10)
+        # Получаем данные за указанный диапазон времени
+        stats = server_stats.get(target_id)
+        # Бинарный поиск начала диапазона вместо фильтрации всей истории
+        filtered_stats = samples_since(stats, now - time_range) if stats else []
+        timestamps = [ts for ts, _, _ in filtered_stats]
+
+        # Редукция с фиксированным бюджетом точек: границы простоев сохраняются, задержка — через LTTB
+        series.append((name, *downsample_status(timestamps, [1 if status else 0 for _, status, _ in filtered_stats], GRAPH_STATUS_POINTS)))
+        latency.append((name, *lttb(timestamps, [rtt for _, _, rtt in filtered_stats], GRAPH_LATENCY_POINTS)))
+
+    # Рендер в пуле процессов, event loop в это время продолжает работать
+    return await graph_renderer.render(
+        render_availability_graph,
+        series,
+        f'Доступность серверов за последние {hours} часов',
+        locator_minutes=locator_intervals.get(hours, 60),
+        date_format='%H:%M',  # Формат отображения: ЧЧ:ММ
+        latency=latency,
+    )
+
+
+async def render_rollup_graph(days):
+    """
+    Строит график доступности (доля успешных проверок в корзине) и средней задержки
+    за последние days дней по агрегатам (rollup_store).
+    """
+    now = time.time()
+    start = now - days * 24 * 60 * 60
+
+    series = []
+    latency = []
+    for target in inventory:
+        target_id = target.id
+        _, rows = rollup_store.select(target_id, start, now, max_buckets=GRAPH_LATENCY_POINTS * 4)
+        timestamps = [row[0] for row in rows]
+        availability = [(row[1] - row[2]) / row[1] if row[1] else 0 for row in rows]
+        # Доля успешных проверок дробная, поэтому прореживаем ее тоже через LTTB (провалы сохраняются)
+        series.append((target.name, *lttb(timestamps, availability, GRAPH_LATENCY_POINTS)))
+        latency.append((target.name, *lttb(timestamps, [row[4] for row in rows], GRAPH_LATENCY_POINTS)))
+
+    return await graph_renderer.render(
+        render_availability_graph,
+        series,
+        f'Доступность серверов за последние {days} дней',
+        locator_minutes=None,  # Автоматические метки для длинных диапазонов
+        date_format='%d.%m',
+        latency=latency,
+    )
+
+
+async def render_latency_graph_24h():
+    """
+    Строит график задержки за последние 24 часа: кривая RTT (LTTB) и почасовые p50/p95
+    из гистограмм задержки (рендер в пуле процессов).
+    """
+    now = time.time()
+    start = now - MONITORING_WINDOW
+    slot = 60 * 60
+
+    series = []
+    for target in inventory:
+        target_id = target.id
+        stats = server_stats.get(target_id)
+        samples = samples_since(stats, start) if stats else []
+        timestamps, values = lttb([ts for ts, _, _ in samples], [rtt for _, _, rtt in samples], GRAPH_LATENCY_POINTS)
+
+        # Почасовые перцентили: начало часа и p50/p95 его гистограммы
+        hours, p50, p95 = [], [], []
+        first_hour = int(start // slot) * slot
+        for hour in range(first_hour, int(now) + 1, slot):
+            histogram = latency_histogram(target_id, hour, hour + slot)
+            if histogram.total:
+                hours.append(hour)
+                p50.append(histogram.percentile(50))
+                p95.append(histogram.percentile(95))
+        series.append((target.name, timestamps, values, hours, p50, p95))
+
+    return await graph_renderer.render(
+        render_latency_graph,
+        series,
+        'Задержка серверов за последние 24 часа',
+        locator_minutes=60,
+    )
 
-    # Сохранение графика
-    graph_path = 'server_availability_graph.png'
-    plt.tight_layout()  # Автоматическое исправление границ
-    plt.savefig(graph_path, dpi=300)
-    plt.close()
 
-    # Отправка графика в Telegram
-    with open(graph_path, 'rb') as photo:
-        await bot.send_photo(
-            chat_id=callback.message.chat.id,
-            photo=photo,
-            caption='📊 График доступности серверов с вертикальными отступами (последние 50 проверок)'
-        )
-
-    # Удаляем файл после отправки
-    os.remove(graph_path)
+#Обработчик кнопки (последние 50 проверок)
+@dp.callback_query_handler(text="last_50pr")
+@perf.timed("handler_graph")
+async def send_eng(callback: types.CallbackQuery):
+    """
+    Создает ступенчатый график доступности серверов с вертикальными отступами на оси Y.
+    """
+    await send_cached_graph(
+        callback.message.chat.id,
+        "last_50pr",
+        lambda: render_recent_graph(50),
+        '📊 График доступности серверов с вертикальными отступами (последние 50 проверок)'
+    )
 
 
 #Обработчик кнопок с построение графиков (временные диапазаны)
 @dp.callback_query_handler(lambda call: call.data.startswith("graph_"))
+@perf.timed("handler_graph")
 async def send_graph_callback(call: types.CallbackQuery):
     """
     Обрабатывает выбор кнопки для отображения графика с указанным диапазоном времени.
@@ -575,107 +1320,47 @@ async def send_graph_callback(call: types.CallbackQuery):
         "graph_12h": 12,
         "graph_24h": 24,
     }
+    # Длинные диапазоны (в днях) строятся по агрегатам
+    rollup_ranges = {
+        "graph_7d": 7,
+        "graph_30d": 30,
+        "graph_1y": 365,
+    }
     range_key = call.data
+    if range_key in rollup_ranges:
+        days = rollup_ranges[range_key]
+        await send_cached_graph(
+            call.message.chat.id,
+            range_key,
+            lambda: render_rollup_graph(days),
+            f'📊 График доступности серверов за последние {days} дней'
+        )
+        return
     if range_key not in time_ranges:
         await call.answer("Неверный выбор!", show_alert=True)
         return
 
     hours = time_ranges[range_key]  # Получаем количество часов
-    time_range = hours * 60 * 60
-
-    global server_stats
-
-    # Подготовка графика
-    server_names = [server["name"] for server in SERVERS]
-    colors = ['blue', 'green', 'orange', 'red', 'purple', 'cyan', 'magenta']
-    offset_step = 1.5  # Отступ по оси Y между серверами
-
-    plt.figure(figsize=(16, 10))  # Размер изображения
-#    plt.figure(figsize=(23, 10))  # Размер изображения
-
-    now = time.time()
-
-    # Построение графика для каждого сервера
-    for idx, server in enumerate(SERVERS):
-        ip = server["ip"]
-        name = server["name"]
-
-        # Получаем данные за указанный диапазон времени
-        stats = server_stats.get(ip, deque())
-        filtered_stats = [(ts, status) for ts, status in stats if ts >= now - time_range]
-
-        # Алгоритм редукции, сохраняющий изменения доступности
-        reduced_stats = []
-        last_status = None
-        step = max(1, len(filtered_stats) // 60)  # Интервал редукции (оставляем максимум 120 точек)
-        for i, (timestamp, status) in enumerate(filtered_stats):
-            # Сохраняем первую точку, каждую step-ю точку или изменения состояния
-            if i % step == 0 or status != last_status:
-                reduced_stats.append((timestamp, status))
-                last_status = status
-
-        timestamps = [datetime.fromtimestamp(ts) for ts, _ in reduced_stats]  # Преобразуем временные метки в формат datetime
-
-        availability = [1 if status else 0 for _, status in reduced_stats]  # Теперь заполняем переменную на основе stats
-
-        # Если данных недостаточно, добавляем заглушки
-        if not availability:
-#            timestamps = ['Нет данных']
-            timestamps = [datetime.now()]  # Используем текущее время в качестве заглушки
-            availability = [0]
-
-        # Добавляем вертикальный офсет (отступ по Y) для сервера
-        offset = idx * offset_step
-        availability_with_offset = [a + offset for a in availability]
-
-        # Строим график
-        plt.step(timestamps, availability_with_offset, label=name, color=colors[idx % len(colors)], where='post')
-
-        # Добавляем подпись рядом с сервером
-        if timestamps:
-            center_idx = len(timestamps) // 2  # Центр временных меток
-            plt.text(timestamps[center_idx], offset + 1.1, f' {name}', color=colors[idx % len(colors)], fontsize=10, ha='center', va='bottom')
-
-    # Настройки графика
-    plt.title(f'Доступность серверов за последние {hours} часов', fontsize=16)
-    plt.xlabel('Время проверки', fontsize=12)
-    plt.ylabel('Доступность', fontsize=12)
-    plt.xticks(rotation=45, fontsize=10)  # Поворот временных меток
-    plt.yticks([], [])  # Убираем автоматические метки на оси Y
-    plt.grid(axis='x', linestyle='--', alpha=0.7)
-    if hours == 24:
-        plt.gca().xaxis.set_major_locator(mdates.MinuteLocator(interval=60))  # Каждые 60 минут
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))  # Формат отображения: ЧЧ:ММ
-    elif hours == 12:
-        plt.gca().xaxis.set_major_locator(mdates.MinuteLocator(interval=30))  # Каждые 30 минут
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))  # Формат отображения: ЧЧ:ММ
-    elif hours == 6:
-        plt.gca().xaxis.set_major_locator(mdates.MinuteLocator(interval=10))  # Каждые 10 минут
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))  # Формат отображения: ЧЧ:ММ
-    else:
-        plt.gca().xaxis.set_major_locator(mdates.MinuteLocator(interval=2))  # Каждые 2 минуты
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))  # Формат отображения: ЧЧ:ММ
-    plt.gcf().autofmt_xdate()  # Автоматическое форматирование меток времени
-
-    # Добавляем легенду
-    plt.legend(title='Сервера', fontsize=10)
-
-    # Сохраняем график
-    graph_path = 'server_availability_graph.png'
-    plt.tight_layout()  # Исправление границ
-    plt.savefig(graph_path, dpi=300)
-    plt.close()
-
-    # Отправляем график в Telegram
-    with open(graph_path, 'rb') as photo:
-        await bot.send_photo(
-            chat_id=call.message.chat.id,
-            photo=photo,
-            caption=f'📊 График доступности серверов за последние {hours} часов'
-        )
-
-    # Удаляем локальный файл графика
-    os.remove(graph_path)
+    await send_cached_graph(
+        call.message.chat.id,
+        range_key,
+        lambda: render_range_graph(hours),
+        f'📊 График доступности серверов за последние {hours} часов'
+    )
+
+#Обработчик кнопки (график задержки)
+@dp.callback_query_handler(text="latency_24h")
+@perf.timed("handler_graph")
+async def send_latency_graph(callback: types.CallbackQuery):
+    """
+    Отправляет график задержки серверов с почасовыми перцентилями.
+    """
+    await send_cached_graph(
+        callback.message.chat.id,
+        "latency_24h",
+        render_latency_graph_24h,
+        '⏱ График задержки серверов за последние 24 часа (линия — RTT, пунктир — p95 по часам)'
+    )
 
 #Обработчик текста
 @dp.message_handler(content_types=['text'])
@@ -686,21 +1371,111 @@ async def text(message: types.Message):
     else:
         await message.answer('Ну ты чё ебанулся? Я же ничего не обрабатываю, кроме определенных команд.\n\nЕсли что-то забыл, ебани /help')
 
+async def on_shutdown(dp):
+    """Дожидается отправки очереди сообщений и записи снимка, останавливает воркеры проверок и пул рендера графиков при завершении бота."""
+    await outbox.close()
+    if snapshot_task is not None:
+        await snapshot_task  # Снимок, начатый до остановки, дописывается
+    if shard_pool is not None:
+        await shard_pool.close()
+    if agent_server is not None:
+        await agent_server.close()
+    graph_renderer.shutdown()
+
+
+async def start_instrumentation():
+    """Запускает замер задержки event loop и, если задан PERF_EXPORT_PORT, экспорт метрик в Prometheus."""
+    perf.start_loop_monitor()
+    if PERF_EXPORT_PORT:
+        try:
+            await perf.serve_prometheus(PERF_EXPORT_HOST, PERF_EXPORT_PORT)
+            bot_logger.info(f"Метрики доступны на http://{PERF_EXPORT_HOST}:{PERF_EXPORT_PORT}/metrics")
+        except OSError as e:
+            bot_logger.error(f"Не удалось запустить экспорт метрик на порту {PERF_EXPORT_PORT}: {e}")
+
+
+def run_webhook(loop):
+    """Режим webhook: HTTP-сервер с очередью обновлений вместо long polling, работает до остановки процесса."""
+    global webhook_server
+    webhook_server = WebhookServer(
+        dp, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_QUEUE_SIZE, WEBHOOK_WORKERS,
+        on_dequeued=lambda seconds: perf.observe("update_queue_wait", seconds),
+    )
+    loop.run_until_complete(webhook_server.start(WEBHOOK_LISTEN_HOST, WEBHOOK_LISTEN_PORT))
+    if WEBHOOK_URL:
+        # drop_pending_updates — как skip_updates при polling
+        loop.run_until_complete(bot.set_webhook(WEBHOOK_URL + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET, drop_pending_updates=True))
+    bot_logger.info(f"Обновления принимаются через webhook на {WEBHOOK_LISTEN_HOST}:{webhook_server.port}{WEBHOOK_PATH}")
+
+    async def shutdown():
+        # Сначала дообрабатываем принятые обновления, затем как при остановке polling
+        await webhook_server.close()
+        await on_shutdown(dp)
+        await dp.storage.close()
+        await (await bot.get_session()).close()
+
+    try:
+        loop.run_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        loop.run_until_complete(shutdown())
+
+
 async def scheduled_monitoring():
     """
-    Периодическая проверка доступности серверов.
+    Периодическая проверка доступности серверов: у каждой цели свой интервал
+    (поле "interval", по умолчанию CHECK_INTERVAL), запуски разнесены по периоду.
+    Проверки целей ставит в планировщик reload_inventory().
     """
-    while True:
-        await check_servers_availability()
-        await asyncio.sleep(60)  # Проверяем каждые 60 секунд
+    async def run_housekeeping():
+        housekeeping()
 
+    monitoring_scheduler.add("housekeeping", HOUSEKEEPING_INTERVAL, run_housekeeping, phase=HOUSEKEEPING_INTERVAL)
+    monitoring_scheduler.add("inventory", INVENTORY_POLL_INTERVAL, watch_inventory, phase=INVENTORY_POLL_INTERVAL)
+    await monitoring_scheduler.run()
 
-if __name__ == "__main__":
-    # Загружаем сохраненные данные
+
+def main():
+    """Запуск бота (из run_bot.py)."""
+    global shard_pool, agent_server
+
+    # Настройка логирования: один раз при старте, запись в файлы через очередь в фоновом потоке.
+    # Внутри __main__, чтобы процессы рендера графиков (spawn импортирует этот модуль) не открывали логи
+    setup_logging(MAIN_LOG, channels=LOG_CHANNELS)
+
+    if UPDATE_MODE == "webhook" and not WEBHOOK_SECRET:
+        # Без секрета поддельное обновление от имени администратора выполнило бы любую команду
+        raise SystemExit("Режим webhook: задайте WEBHOOK_SECRET в config.py")
+
+    loop = asyncio.get_event_loop()
+    if PROBE_WORKERS:
+        # До загрузки целей: start_target() передает их воркерам
+        shard_pool = ShardPool(PROBE_WORKERS, MAX_CONCURRENT_PROBES, on_results=process_shard_results)
+        loop.run_until_complete(shard_pool.start())
+    if AGENT_LISTEN_PORT:
+        agent_server = AgentServer(AGENT_TOKEN, on_results=process_agent_results, on_agent=agent_changed)
+        loop.run_until_complete(agent_server.start(AGENT_LISTEN_HOST, AGENT_LISTEN_PORT))
+        bot_logger.info(f"Прием агентов проверок на {AGENT_LISTEN_HOST}:{AGENT_LISTEN_PORT}")
+
+    # Загружаем цели мониторинга и сохраненные данные
+    reload_inventory()
     load_status()
+    forget_unknown_targets()
+    refresh_probe_timeouts()
     # Запускаем задачу мониторинга в фоне
-    loop = asyncio.get_event_loop()
     loop.create_task(scheduled_monitoring())
+    loop.create_task(start_instrumentation())
 
     # Запускаем бота
-    executor.start_polling(dp, skip_updates=True)
+    if UPDATE_MODE == "webhook":
+        run_webhook(loop)
+    else:
+        executor.start_polling(dp, skip_updates=True, on_shutdown=on_shutdown)
+
+
+if __name__ == "__main__":
+    # Процессы воркеров проверок и рендера графиков (spawn) заново импортируют главный модуль, а этот
+    # модуль при импорте создает бота, диспетчер, очереди и остальное состояние. Поэтому запускаемся
+    # через маленький run_bot.py: в воркерах главным модулем будет он
+    os.execv(sys.executable, [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "run_bot.py")] + sys.argv[1:])
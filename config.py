@@ -3,3 +3,5 @@
 API_TOKEN = '' #токен бота
 users = [] #список id которым разрешено писать боту, если несколько, то просто через запятую
 CHAT_ID = '' #кому будем отправлять сообщения
+AGENT_TOKEN = '' #общий секрет удаленных агентов проверок (agent.py), нужен, если в bot_port.py задан AGENT_LISTEN_PORT
+WEBHOOK_SECRET = '' #секрет для режима webhook (UPDATE_MODE в bot_port.py): Telegram присылает его в заголовке каждого обновления
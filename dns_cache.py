@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import ipaddress
+import socket
+import time
+
+try:
+    import aiodns  # Асинхронный резолвер с TTL записей (необязательно)
+except ImportError:
+    aiodns = None
+
+# Сколько хранить адреса, если TTL записи неизвестен (резолв через getaddrinfo), в секундах
+DEFAULT_TTL = 300
+# Границы TTL: слишком короткий TTL не должен превращаться в запрос на каждую проверку
+MIN_TTL = 5
+MAX_TTL = 60 * 60
+# Сколько помнить неудачный резолв, чтобы не повторять запрос на каждую попытку
+NEGATIVE_TTL = 30
+
+# Задержка перед попыткой подключения к следующему адресу (Happy Eyeballs, RFC 8305)
+HAPPY_EYEBALLS_DELAY = 0.25
+
+
+class ResolveError(OSError):
+    """Имя хоста не удалось преобразовать в адреса."""
+
+
+def interleave(addresses):
+    """Чередует адреса IPv6/IPv4 (RFC 8305), начиная с семейства первого адреса."""
+    families = {}
+    for family, address in addresses:
+        families.setdefault(family, [])
+        if address not in families[family]:
+            families[family].append(address)
+    result = []
+    queues = list(families.items())
+    while queues:
+        for family, queue in queues:
+            result.append((family, queue.pop(0)))
+        queues = [(family, queue) for family, queue in queues if queue]
+    return result
+
+
+class _Entry:
+    __slots__ = ('addresses', 'error', 'expires')
+
+    def __init__(self, addresses, error, expires):
+        self.addresses = addresses
+        self.error = error
+        self.expires = expires
+
+
+class DnsCache:
+    """
+    Асинхронный резолвер с кэшем: адреса имени хранятся, пока не истечет TTL записи,
+    неудачный резолв запоминается на NEGATIVE_TTL. Одновременные запросы одного имени
+    ждут один резолв. IP-адреса возвращаются сразу, без обращения к DNS.
+
+    С установленным aiodns записи A и AAAA запрашиваются параллельно и кэшируются на их TTL
+    (в пределах [MIN_TTL, MAX_TTL]); без него или если DNS ничего не вернул (например, имя
+    из /etc/hosts) используется getaddrinfo в пуле потоков и DEFAULT_TTL.
+    """
+
+    def __init__(self, default_ttl=DEFAULT_TTL, negative_ttl=NEGATIVE_TTL):
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl
+        self.entries = {}  # имя -> _Entry
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self._inflight = {}  # имя -> future идущего резолва
+        self._resolver = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    async def resolve(self, host):
+        """
+        Адреса хоста [(family, address)] в порядке попыток подключения.
+        При ошибке резолва бросает ResolveError.
+        """
+        literal = _literal(host)
+        if literal is not None:
+            return [literal]
+
+        entry = self.entries.get(host)
+        if entry is not None and entry.expires > time.monotonic():
+            self.hits += 1
+        else:
+            future = self._inflight.get(host)
+            if future is None:
+                self.misses += 1
+                future = self._inflight[host] = asyncio.ensure_future(self._refresh(host))
+                future.add_done_callback(lambda _: self._inflight.pop(host, None))
+            entry = await asyncio.shield(future)
+        if entry.error is not None:
+            raise ResolveError(entry.error)
+        return entry.addresses
+
+    async def _refresh(self, host):
+        try:
+            addresses, ttl = await self._query(host)
+        except Exception as e:
+            addresses, ttl = None, None
+            error = str(e) or e.__class__.__name__
+        else:
+            error = None if addresses else "нет адресов"
+        if error is not None:
+            self.failures += 1
+            entry = _Entry(None, f"не удалось определить адрес {host}: {error}", time.monotonic() + self.negative_ttl)
+        else:
+            entry = _Entry(interleave(addresses), None, time.monotonic() + min(max(ttl, MIN_TTL), MAX_TTL))
+        self.entries[host] = entry
+        return entry
+
+    async def _query(self, host):
+        """(адреса, TTL) имени: сначала DNS через aiodns, затем getaddrinfo."""
+        if aiodns is not None:
+            if self._resolver is None:
+                self._resolver = aiodns.DNSResolver()
+            answers = await asyncio.gather(
+                self._resolver.query(host, 'AAAA'),
+                self._resolver.query(host, 'A'),
+                return_exceptions=True,
+            )
+            addresses, ttls = [], []
+            for family, answer in zip((socket.AF_INET6, socket.AF_INET), answers):
+                if isinstance(answer, Exception):
+                    continue
+                for record in answer:
+                    addresses.append((family, record.host))
+                    ttls.append(record.ttl)
+            if addresses:
+                return addresses, min(ttls)
+
+        infos = await asyncio.get_event_loop().getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        return [(family, sockaddr[0]) for family, _, _, _, sockaddr in infos], self.default_ttl
+
+    def prune(self):
+        """Удаляет просроченные записи (имена, которые больше не проверяются, не копятся)."""
+        now = time.monotonic()
+        for host in [host for host, entry in self.entries.items() if entry.expires <= now]:
+            del self.entries[host]
+
+    def stats(self):
+        """Счетчики для отчета: записей в кэше, попаданий, промахов, ошибок резолва."""
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "failures": self.failures}
+
+
+def _literal(host):
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return None
+    return (socket.AF_INET if address.version == 4 else socket.AF_INET6), str(address)
+
+
+async def open_connection(addresses, port, delay=HAPPY_EYEBALLS_DELAY, **kwargs):
+    """
+    Подключение к первому ответившему адресу (Happy Eyeballs): попытки к адресам из списка
+    [(family, address)] запускаются по очереди с задержкой delay (или сразу после неудачи
+    предыдущей) и идут параллельно; лишние соединения закрываются.
+    kwargs передаются в asyncio.open_connection (ssl, server_hostname).
+    Возвращает (reader, writer), если не удалось ни одно подключение — последнюю ошибку.
+    """
+    remaining = [address for _, address in addresses]
+    pending = set()
+    error = None
+    try:
+        while remaining or pending:
+            if remaining:
+                pending.add(asyncio.ensure_future(asyncio.open_connection(remaining.pop(0), port, **kwargs)))
+            done, pending = await asyncio.wait(
+                pending, timeout=delay if remaining else None, return_when=asyncio.FIRST_COMPLETED,
+            )
+            connections = []
+            for task in done:
+                try:
+                    connections.append(task.result())
+                except OSError as e:
+                    error = e
+            if connections:
+                for _, writer in connections[1:]:
+                    writer.close()
+                return connections[0]
+    finally:
+        for task in pending:
+            task.cancel()
+    raise error or OSError("нет адресов для подключения")
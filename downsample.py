@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import math
+
+
+def downsample_status(timestamps, statuses, max_points=120):
+    """
+    Прореживание ступенчатого ряда доступности (0/1) с сохранением формы.
+
+    Для ступенчатого графика достаточно первой точки, точек смены состояния и последней точки,
+    поэтому при умеренном числе переключений все границы простоев сохраняются точно.
+    Если переключений больше бюджета (сервер «флапает»), интервал делится на корзины по времени
+    и каждая корзина с хотя бы одной неудачной проверкой рисуется как недоступность — так
+    короткие простои не пропадают, а число точек никогда не превышает max_points.
+
+    Возвращает (timestamps, statuses) длиной не больше max_points.
+    """
+    n = len(timestamps)
+    if n <= 2 or n <= max_points:
+        return list(timestamps), list(statuses)
+
+    # Первая точка, все смены состояния и последняя точка
+    points = [0]
+    for i in range(1, n):
+        if statuses[i] != statuses[i - 1]:
+            points.append(i)
+    if points[-1] != n - 1:
+        points.append(n - 1)
+    if len(points) <= max_points:
+        return [timestamps[i] for i in points], [statuses[i] for i in points]
+
+    # Слишком много переключений: корзины по времени, в корзине берется худший статус
+    buckets = max(1, max_points - 1)  # Одна точка в запасе под конец интервала
+    start, end = timestamps[0], timestamps[-1]
+    width = (end - start) / buckets or 1
+    values = [1] * buckets
+    for ts, status in zip(timestamps, statuses):
+        if not status:
+            values[min(int((ts - start) / width), buckets - 1)] = 0
+
+    out_ts, out_status = [], []
+    for b, value in enumerate(values):
+        if not out_status or out_status[-1] != value:
+            out_ts.append(start + b * width)
+            out_status.append(value)
+    out_ts.append(end)
+    out_status.append(values[-1])
+    return out_ts, out_status
+
+
+def lttb(timestamps, values, max_points=300):
+    """
+    Largest-Triangle-Three-Buckets: выбирает max_points точек, лучше всего сохраняющих форму
+    кривой (пики задержки не теряются, в отличие от прореживания «каждая n-я точка»).
+    Точки со значением None/NaN (нет ответа) отбрасываются.
+
+    Возвращает (timestamps, values) длиной не больше max_points.
+    """
+    data = [(t, v) for t, v in zip(timestamps, values) if v is not None and not math.isnan(v)]
+    n = len(data)
+    if n <= max_points:
+        return [t for t, _ in data], [v for _, v in data]
+    if max_points < 3:
+        data = [data[0], data[-1]][:max_points]
+        return [t for t, _ in data], [v for _, v in data]
+
+    out = [data[0]]
+    bucket_size = (n - 2) / (max_points - 2)
+    a = 0  # Индекс последней выбранной точки
+    for i in range(max_points - 2):
+        # Текущая корзина
+        start = int(math.floor(i * bucket_size)) + 1
+        end = int(math.floor((i + 1) * bucket_size)) + 1
+        # Средняя точка следующей корзины
+        next_start = end
+        next_end = min(int(math.floor((i + 2) * bucket_size)) + 1, n)
+        count = next_end - next_start
+        avg_t = sum(data[j][0] for j in range(next_start, next_end)) / count
+        avg_v = sum(data[j][1] for j in range(next_start, next_end)) / count
+
+        # Точка корзины с наибольшей площадью треугольника (последняя выбранная, точка, среднее)
+        at, av = data[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            t, v = data[j]
+            area = abs((at - avg_t) * (v - av) - (at - t) * (avg_v - av))
+            if area > best_area:
+                best, best_area = j, area
+        out.append(data[best])
+        a = best
+    out.append(data[-1])
+    return [t for t, _ in out], [v for _, v in out]
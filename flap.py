@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+# Пороги смены статуса «N из M»: недоступен — N неудач среди последних M проверок,
+# снова доступен — N успехов среди последних M проверок
+DOWN_THRESHOLD = (2, 3)
+UP_THRESHOLD = (2, 3)
+
+# Обнаружение «флапа»: доля переключений среди последних FLAP_WINDOW проверок.
+# Флап начинается при доле >= FLAP_HIGH и заканчивается при доле <= FLAP_LOW (гистерезис)
+FLAP_WINDOW = 21
+FLAP_HIGH = 0.3
+FLAP_LOW = 0.15
+
+# События evaluate()
+DOWN = "down"
+UP = "up"
+FLAP_START = "flap_start"
+FLAP_END = "flap_end"
+
+
+def flap_ratio(statuses):
+    """
+    Взвешенная доля переключений в ряду статусов (bytes, от старых к новым): свежие переключения
+    весят больше старых (от 0.8 до 1.2), как в обнаружении флапа у Nagios.
+    """
+    pairs = len(statuses) - 1
+    if pairs < 1:
+        return 0.0
+    changes = 0.0
+    for i in range(pairs):
+        if statuses[i] != statuses[i + 1]:
+            changes += 0.8 + 0.4 * i / max(pairs - 1, 1)
+    return changes / pairs
+
+
+class FlapPolicy:
+    """
+    Машина состояний статуса цели поверх истории проверок.
+
+    Подтвержденный статус (state["status"]) меняется только по порогу «N из M», поэтому одиночная
+    неудача не дает пары уведомлений «упал/поднялся». Если сервер часто переключается, он помечается
+    как нестабильный: уведомления о смене статуса подавляются (и считаются), вместо них приходят
+    одно сообщение о начале флапа и одна сводка по его окончании.
+    """
+
+    def __init__(self, down=DOWN_THRESHOLD, up=UP_THRESHOLD, window=FLAP_WINDOW, high=FLAP_HIGH, low=FLAP_LOW):
+        self.down = tuple(down)
+        self.up = tuple(up)
+        self.window = window
+        self.high = high
+        self.low = low
+
+    @classmethod
+    def for_server(cls, server):
+        """Политика сервера: необязательные поля "down"/"up" ([N, M]) переопределяют пороги по умолчанию."""
+        return cls(down=server.get("down", DOWN_THRESHOLD), up=server.get("up", UP_THRESHOLD))
+
+    def history_needed(self):
+        """Сколько последних проверок нужно evaluate()."""
+        return max(self.down[1], self.up[1], self.window)
+
+    def evaluate(self, state, statuses, timestamp):
+        """
+        Пересчитывает состояние цели после новой проверки. state — запись server_status (меняется
+        на месте), statuses — bytes статусов последних проверок (новая — последняя).
+        Возвращает список событий: DOWN/UP (подтвержденная смена статуса, о которой надо
+        уведомить), FLAP_START/FLAP_END.
+        """
+        events = []
+
+        recent = statuses[-self.window:]
+        ratio = flap_ratio(recent)
+        state["flap_ratio"] = round(ratio, 3)
+        flapping = state.get("flapping", False)
+        if not flapping and len(recent) >= self.window and ratio >= self.high:
+            state["flapping"] = True
+            state["suppressed"] = 0
+            events.append(FLAP_START)
+        elif flapping and ratio <= self.low:
+            state["flapping"] = False
+            events.append(FLAP_END)
+
+        n, m = self.down if state["status"] else self.up
+        window = statuses[-m:]
+        # Для перехода в «недоступен» считаем неудачи, для возврата — успехи
+        hits = window.count(0) if state["status"] else window.count(1)
+        if hits >= n:
+            state["status"] = not state["status"]
+            state["since"] = timestamp
+            if state.get("flapping"):
+                state["suppressed"] = state.get("suppressed", 0) + 1
+            else:
+                events.append(UP if state["status"] else DOWN)
+        return events
+
+
+def alert_text(event, name, ip, state):
+    """Текст уведомления о событии evaluate() для сервера name (ip)."""
+    if event == DOWN:
+        if state.get("error") == "dns":
+            text = f"⚠️ Сервер {name} ({ip}) недоступен: не удалось определить адрес (ошибка DNS)!"
+        else:
+            text = f"⚠️ Сервер {name} ({ip}) недоступен!"
+        if state.get("vantage"):
+            down = [point for point, up in state["vantage"].items() if not up]
+            text += f"\n\n📍 Не отвечает из: {', '.join(down)} ({len(down)} из {len(state['vantage'])})"
+        return text
+    if event == UP:
+        return f"✅ Сервер {name} ({ip}) снова доступен!\n\n⏱ Время ответа: {state['response_time']} мс"
+    if event == FLAP_START:
+        return (f"🔀 Сервер {name} ({ip}) нестабилен: {state['flap_ratio']:.0%} переключений за последние проверки. "
+                f"Уведомления о смене статуса приостановлены.")
+    if event == FLAP_END:
+        current = "✅ доступен" if state["status"] else "❌ недоступен"
+        return (f"🔁 Сервер {name} ({ip}) стабилизировался, сейчас {current}. "
+                f"Пропущено уведомлений о смене статуса: {state.get('suppressed', 0)}.")
+    return None
+
+
+def state_label(state):
+    """Статус для /status с учетом флапа."""
+    status = "✅ Доступен" if state["status"] else "❌ Недоступен"
+    if not state["status"] and state.get("error") == "dns":
+        status += " (ошибка DNS)"
+    if state["status"] and state.get("vantage"):
+        down = [point for point, up in state["vantage"].items() if not up]
+        if down:
+            status += f" (не отвечает из: {', '.join(down)})"
+    if state.get("flapping"):
+        status = f"🔀 Нестабилен ({state.get('flap_ratio', 0):.0%} переключений), сейчас: {status.lower()}"
+    return status
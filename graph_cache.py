@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+from collections import OrderedDict
+
+
+class GraphEntry:
+    """Готовый график: PNG в памяти и/или file_id уже загруженной в Telegram картинки."""
+
+    __slots__ = ('png', 'file_id')
+
+    def __init__(self, png):
+        self.png = png
+        self.file_id = None
+
+    @property
+    def size(self):
+        return len(self.png) if self.png is not None else 0
+
+
+class GraphCache:
+    """
+    Кэш графиков с LRU-вытеснением и объединением одинаковых запросов (single-flight).
+
+    Ключ — (диапазон, набор серверов); к нему добавляется номер цикла проверок (epoch),
+    поэтому после нового цикла старые графики больше не выдаются, а invalidate() их удаляет.
+    Одновременные запросы одного ключа ждут один и тот же рендер.
+    После первой отправки в Telegram хранится file_id, а байты картинки освобождаются.
+    """
+
+    def __init__(self, max_entries=32, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.epoch = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._bytes = 0
+
+    def _full_key(self, key):
+        return (self.epoch,) + tuple(key)
+
+    async def get(self, key, render):
+        """
+        Возвращает GraphEntry для ключа. Если графика нет, вызывает render() (корутина,
+        возвращающая PNG bytes) — один раз на все одновременные запросы этого ключа.
+        """
+        full_key = self._full_key(key)
+        entry = self._entries.get(full_key)
+        if entry is not None:
+            self._entries.move_to_end(full_key)
+            return entry
+
+        future = self._inflight.get(full_key)
+        if future is None:
+            future = asyncio.ensure_future(render())
+            self._inflight[full_key] = future
+            future.add_done_callback(lambda f: self._store(full_key, f))
+        # shield: отмена одного ожидающего не должна отменять общий рендер
+        await asyncio.shield(future)
+        entry = self._entries.get(full_key)
+        return entry if entry is not None else GraphEntry(future.result())
+
+    def _store(self, full_key, future):
+        self._inflight.pop(full_key, None)
+        if future.cancelled() or future.exception() is not None:
+            return
+        if full_key[0] != self.epoch:
+            return  # Пока рисовали, пришел новый цикл проверок — результат уже устарел
+        entry = GraphEntry(future.result())
+        self._entries[full_key] = entry
+        self._bytes += entry.size
+        self._evict()
+
+    def set_file_id(self, key, file_id):
+        """Запоминает file_id отправленной картинки; дальше график пересылается без загрузки байтов."""
+        entry = self._entries.get(self._full_key(key))
+        if entry is None or entry.file_id is not None:
+            return
+        entry.file_id = file_id
+        self._bytes -= entry.size
+        entry.png = None
+
+    def invalidate(self):
+        """Новый цикл проверок: все закэшированные графики устарели."""
+        self.epoch += 1
+        self._entries.clear()
+        self._bytes = 0
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
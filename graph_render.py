@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import functools
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import matplotlib
+matplotlib.use('Agg')  # Без GUI, рендер только в память
+import matplotlib.dates as mdates
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# Цвета для серверов
+COLORS = ['blue', 'green', 'orange', 'red', 'purple', 'cyan', 'magenta']
+
+# Отступ по оси Y между серверами
+OFFSET_STEP = 1.5
+
+
+def render_availability_graph(series, title, locator_minutes=2, date_format='%H:%M', dpi=300, latency=None):
+    """
+    Рисует ступенчатый график доступности серверов с вертикальными отступами.
+    Выполняется в процессе-воркере, поэтому использует только объектный API matplotlib
+    (Figure), без глобального состояния pyplot.
+
+    series — список кортежей (name, timestamps, availability), где timestamps — unix-время,
+    availability — значения 0/1 (или доля успешных проверок для агрегатов). latency — необязательный список (name, timestamps, rtt_ms)
+    для панели задержки под графиком доступности. Возвращает PNG в виде bytes.
+    """
+    fig = Figure(figsize=(16, 10))  # Размер изображения
+    FigureCanvasAgg(fig)
+    if latency:
+        ax, latency_ax = fig.subplots(2, 1, sharex=True, gridspec_kw={'height_ratios': [3, 1]})
+    else:
+        ax, latency_ax = fig.add_subplot(), None
+
+    # Построение ступенчатых графиков для каждого сервера
+    for idx, (name, timestamps, availability) in enumerate(series):
+        timestamps = [datetime.fromtimestamp(ts) for ts in timestamps]  # Преобразование меток времени в формат datetime
+
+        # Обработка отсутствия данных
+        if not availability:
+            timestamps = [datetime.now()]  # Используем текущее время для пустых данных
+            availability = [0]
+
+        offset = idx * OFFSET_STEP  # Вертикальный отступ для текущего сервера
+        availability_with_offset = [a + offset for a in availability]  # Смещение значений
+        color = COLORS[idx % len(COLORS)]
+
+        ax.step(timestamps, availability_with_offset, label=name, color=color, where='post')
+
+        # Добавляем подписи рядом с каждой линией
+        center_idx = len(timestamps) // 2  # Центр временных меток
+        ax.text(timestamps[center_idx], offset + 1.1, f' {name}', color=color, fontsize=10, ha='center', va='bottom')
+
+    # Настройки отображения
+    ax.set_title(title, fontsize=16)
+    ax.set_xlabel('Время проверки', fontsize=12)
+    ax.set_ylabel('Доступность', fontsize=12)
+    ax.tick_params(axis='x', labelrotation=45, labelsize=10)  # Поворот подписей временной оси
+    ax.set_yticks([])  # Убираем автоматически создаваемые метки на оси Y
+    ax.grid(axis='x', linestyle='--', alpha=0.7)
+    ax.xaxis.set_major_locator(_locator(locator_minutes))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter(date_format))
+    fig.autofmt_xdate()  # Автоматически форматируем метки времени
+
+    # Легенда для графика
+    ax.legend(title='Сервера', fontsize=10)
+
+    # Панель задержки
+    if latency_ax is not None:
+        for idx, (name, timestamps, values) in enumerate(latency):
+            if timestamps:
+                latency_ax.plot([datetime.fromtimestamp(ts) for ts in timestamps], values, color=COLORS[idx % len(COLORS)], linewidth=1)
+        latency_ax.set_ylabel('Задержка, мс', fontsize=12)
+        latency_ax.grid(linestyle='--', alpha=0.7)
+        latency_ax.xaxis.set_major_locator(_locator(locator_minutes))
+        latency_ax.xaxis.set_major_formatter(mdates.DateFormatter(date_format))
+        ax.set_xlabel('')
+        latency_ax.set_xlabel('Время проверки', fontsize=12)
+
+    # Сохранение графика в память
+    fig.tight_layout()  # Автоматическое исправление границ
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi)
+    return buffer.getvalue()
+
+
+def render_latency_graph(series, title, locator_minutes=60, date_format='%H:%M', dpi=300):
+    """
+    Рисует график задержки серверов: кривая RTT и почасовые перцентили.
+
+    series — список кортежей (name, timestamps, rtt_ms, hours, p50, p95): прореженная кривая
+    задержки и начала часов с перцентилями из гистограмм. Возвращает PNG в виде bytes.
+    """
+    fig = Figure(figsize=(16, 10))  # Размер изображения
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    for idx, (name, timestamps, values, hours, p50, p95) in enumerate(series):
+        color = COLORS[idx % len(COLORS)]
+        if timestamps:
+            ax.plot([datetime.fromtimestamp(ts) for ts in timestamps], values, label=name, color=color, linewidth=1, alpha=0.6)
+        if hours:
+            hours = [datetime.fromtimestamp(ts) for ts in hours]
+            ax.step(hours, p50, color=color, where='post', linestyle=':', linewidth=1)
+            ax.step(hours, p95, color=color, where='post', linestyle='--', linewidth=1.5, label=f'{name} p95')
+
+    # Настройки отображения
+    ax.set_title(title, fontsize=16)
+    ax.set_xlabel('Время проверки', fontsize=12)
+    ax.set_ylabel('Задержка, мс', fontsize=12)
+    ax.grid(linestyle='--', alpha=0.7)
+    ax.xaxis.set_major_locator(_locator(locator_minutes))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter(date_format))
+    fig.autofmt_xdate()  # Автоматически форматируем метки времени
+    if ax.get_legend_handles_labels()[0]:
+        ax.legend(title='Сервера', fontsize=10)
+
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi)
+    return buffer.getvalue()
+
+
+def _locator(locator_minutes):
+    """Метки оси времени каждые locator_minutes минут или автоматические (None) для длинных диапазонов."""
+    if locator_minutes is None:
+        return mdates.AutoDateLocator()
+    return mdates.MinuteLocator(interval=locator_minutes)
+
+
+class GraphRenderer:
+    """
+    Рендер графиков в пуле процессов: event loop бота не блокируется на время
+    построения и сохранения картинки, одновременные запросы не делят состояние pyplot.
+    """
+
+    def __init__(self, workers=2):
+        self.workers = workers
+        self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            # spawn: не наследуем event loop и потоки бота в воркерах
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    async def render(self, func, *args, **kwargs):
+        """Выполняет func(*args, **kwargs) в процессе-воркере и возвращает результат (PNG bytes)."""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.pool, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+import re
+
+# Единицы для окон вида 30m, 6h, 7d
+WINDOW_UNITS = {"s": 1, "m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 24 * 60 * 60}
+WINDOW_RE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([smhdw])\s*$', re.IGNORECASE)
+
+
+def parse_window(text):
+    """Разбирает окно вида '30m', '6h', '7d', '1w' в секунды. None, если формат не распознан."""
+    match = WINDOW_RE.match(text or "")
+    if not match:
+        return None
+    return float(match.group(1)) * WINDOW_UNITS[match.group(2).lower()]
+
+
+def format_duration(seconds):
+    """Человекочитаемая длительность: 45 с, 12 мин, 3 ч 5 мин, 2 д 4 ч."""
+    if seconds is None:
+        return "N/A"
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} с"
+    minutes, _ = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes} мин"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 24:
+        return f"{hours} ч {minutes} мин" if minutes else f"{hours} ч"
+    days, hours = divmod(hours, 24)
+    return f"{days} д {hours} ч" if hours else f"{days} д"
+
+
+def window_bounds(ring, start, end):
+    """Логические индексы [i, j) проверок кольцевого буфера, попавших в интервал [start, end)."""
+    return ring.bisect_left(start), ring.bisect_left(end)
+
+
+def query_window(ring, start, end):
+    """
+    Статистика доступности сервера за произвольный интервал [start, end).
+
+    Границы ищутся бинарным поиском по времени, подсчет и поиск простоев идут по
+    байтам статусов средствами C (bytes.count / bytes.find), так что число шагов на
+    Python пропорционально числу простоев, а не числу проверок.
+
+    Простой — серия неудачных проверок; его длительность считается от первой неудачной
+    проверки до первой успешной (или до конца интервала, если простой продолжается).
+    MTTR — среднее время восстановления по завершившимся простоям.
+    """
+    i, j = window_bounds(ring, start, end)
+    total = j - i
+    result = {
+        "total": total,
+        "successful": 0,
+        "failed": 0,
+        "availability": None,
+        "outages": 0,
+        "longest_outage": None,
+        "mttr": None,
+        "ongoing": False,
+    }
+    if not total:
+        return result
+
+    statuses = ring.status_bytes(i, j)
+    failed = statuses.count(0)
+    result["successful"] = total - failed
+    result["failed"] = failed
+    result["availability"] = round((total - failed) / total * 100, 2)
+    if not failed:
+        return result
+
+    durations = []  # Длительности завершившихся простоев
+    longest = 0
+    pos = statuses.find(0)
+    while pos != -1:
+        recovered = statuses.find(1, pos)
+        outage_start = ring.timestamp(i + pos)
+        if recovered == -1:
+            # Простой продолжается до конца интервала
+            result["ongoing"] = True
+            longest = max(longest, min(end, ring.timestamp(j - 1)) - outage_start)
+            result["outages"] += 1
+            break
+        duration = ring.timestamp(i + recovered) - outage_start
+        durations.append(duration)
+        longest = max(longest, duration)
+        result["outages"] += 1
+        pos = statuses.find(0, recovered)
+
+    result["longest_outage"] = longest
+    if durations:
+        result["mttr"] = sum(durations) / len(durations)
+    return result
+
+
+def samples_since(ring, timestamp):
+    """Проверки кольцевого буфера начиная с timestamp (бинарный поиск вместо полного прохода)."""
+    return ring.range(ring.bisect_left(timestamp), len(ring))
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import ipaddress
+import random
+import socket
+import struct
+import time
+
+# Типы ICMP-сообщений (эхо-запрос / эхо-ответ) для IPv4 и IPv6
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+ICMPV6_ECHO_REQUEST = 128
+ICMPV6_ECHO_REPLY = 129
+
+# Полезная нагрузка эхо-запроса
+PAYLOAD = b'NetMonitorTlgBot'
+
+# Размер приемного буфера сокета: при широком проходе ответы приходят пачкой
+RECV_BUFFER = 4 * 1024 * 1024
+
+# Через сколько отправленных запросов отдавать управление event loop (чтобы вычитывать ответы)
+SEND_BATCH = 64
+
+
+def checksum(data):
+    """Контрольная сумма ICMP (RFC 1071)."""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def build_echo_request(ident, seq, family=socket.AF_INET):
+    """Собирает ICMP (или ICMPv6) эхо-запрос с заданными identifier/sequence."""
+    icmp_type = ICMP_ECHO_REQUEST if family == socket.AF_INET else ICMPV6_ECHO_REQUEST
+    header = struct.pack('!BBHHH', icmp_type, 0, 0, ident, seq)
+    if family == socket.AF_INET6:
+        # Для ICMPv6 контрольную сумму (с псевдозаголовком) считает ядро
+        return header + PAYLOAD
+    csum = checksum(header + PAYLOAD)
+    return struct.pack('!BBHHH', icmp_type, 0, csum, ident, seq) + PAYLOAD
+
+
+def open_icmp_socket(family=socket.AF_INET):
+    """
+    Открывает неблокирующий ICMP-сокет.
+
+    Сначала пробуем непривилегированный datagram-сокет (net.ipv4.ping_group_range),
+    затем raw-сокет (нужен root или CAP_NET_RAW).
+    Возвращает (sock, raw), где raw=True для raw-сокета.
+    """
+    proto = socket.IPPROTO_ICMP if family == socket.AF_INET else socket.IPPROTO_ICMPV6
+    try:
+        sock = socket.socket(family, socket.SOCK_DGRAM, proto)
+        raw = False
+    except (PermissionError, OSError):
+        sock = socket.socket(family, socket.SOCK_RAW, proto)
+        raw = True
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER)
+    except OSError:
+        pass
+    sock.setblocking(False)
+    return sock, raw
+
+
+def parse_echo_reply(packet, family, raw):
+    """
+    Разбирает принятый пакет. Возвращает (ident, seq) для эхо-ответа или None.
+    Raw-сокет IPv4 отдает пакет вместе с IP-заголовком, остальные — только ICMP.
+    """
+    if family == socket.AF_INET and raw:
+        if len(packet) < 20:
+            return None
+        packet = packet[(packet[0] & 0x0F) * 4:]  # Пропускаем IP-заголовок (IHL)
+    if len(packet) < 8:
+        return None
+    icmp_type, _, _, ident, seq = struct.unpack('!BBHHH', packet[:8])
+    if icmp_type != (ICMP_ECHO_REPLY if family == socket.AF_INET else ICMPV6_ECHO_REPLY):
+        return None
+    return ident, seq
+
+
+async def resolve(host):
+    """Возвращает (family, address) для IP-адреса или имени хоста, None при ошибке резолва."""
+    try:
+        addr = ipaddress.ip_address(host)
+        return (socket.AF_INET if addr.version == 4 else socket.AF_INET6), str(addr)
+    except ValueError:
+        pass
+    try:
+        infos = await asyncio.get_event_loop().getaddrinfo(host, None, type=socket.SOCK_RAW)
+    except socket.gaierror:
+        return None
+    family, _, _, _, sockaddr = infos[0]
+    return family, sockaddr[0]
+
+
+class _FamilySweep:
+    """Отправка и прием эхо-запросов через один сокет одного семейства адресов."""
+
+    def __init__(self, family):
+        self.family = family
+        self.sock, self.raw = open_icmp_socket(family)
+        # Для datagram-сокетов identifier подставляет ядро и само фильтрует ответы
+        self.ident = random.randrange(0x10000)
+        self.pending = {}  # (address, seq) -> (host, время отправки)
+
+    def close(self):
+        self.sock.close()
+
+
+async def icmp_sweep(hosts, timeout=2):
+    """
+    Пингует все hosts одним проходом: эхо-запросы отправляются через общий сокет
+    (на каждое семейство адресов), ответы разбираются по адресу/identifier/sequence.
+
+    Весь проход занимает не больше одного окна timeout вне зависимости от числа хостов.
+    timeout — число или словарь {host: таймаут}: свой срок ожидания ответа для каждого хоста,
+    проход заканчивается, как только истекли сроки всех хостов без ответа.
+    Возвращает словарь {host: время ответа в мс или None}.
+    """
+    loop = asyncio.get_event_loop()
+    results = {host: None for host in hosts}
+    if not results:
+        return results
+
+    resolved = await asyncio.gather(*(resolve(host) for host in results))
+
+    timeouts = timeout if isinstance(timeout, dict) else {}
+    default_timeout = max(timeouts.values(), default=2) if timeouts else timeout
+
+    sweeps = {}
+    progress = asyncio.Event()
+    try:
+        for seq, (host, target) in enumerate(zip(results, resolved)):
+            if target is None:
+                continue  # Ошибка резолва, хост считается недоступным
+            family, address = target
+            if family not in sweeps:
+                sweeps[family] = _FamilySweep(family)
+            sweep = sweeps[family]
+            seq &= 0xFFFF
+            sweep.pending[(address, seq)] = (host, time.perf_counter())
+
+        def on_readable(sweep):
+            while True:
+                try:
+                    packet, sockaddr = sweep.sock.recvfrom(2048)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    break
+                received = time.perf_counter()
+                reply = parse_echo_reply(packet, sweep.family, sweep.raw)
+                if reply is None:
+                    continue
+                ident, seq = reply
+                if sweep.raw and ident != sweep.ident:
+                    continue  # Чужой ответ: raw-сокет видит весь ICMP-трафик хоста
+                entry = sweep.pending.pop((sockaddr[0], seq), None)
+                if entry is None:
+                    continue
+                host, sent = entry
+                if received - sent <= timeouts.get(host, default_timeout):
+                    results[host] = round((received - sent) * 1000, 2)
+                progress.set()
+
+        for sweep in sweeps.values():
+            loop.add_reader(sweep.sock.fileno(), on_readable, sweep)
+
+        # Отправляем все запросы; время отправки фиксируем непосредственно перед sendto
+        sent_count = 0
+        for sweep in sweeps.values():
+            for (address, seq), (host, _) in list(sweep.pending.items()):
+                sent_count += 1
+                if sent_count % SEND_BATCH == 0:
+                    await asyncio.sleep(0)
+                packet = build_echo_request(sweep.ident, seq, sweep.family)
+                sweep.pending[(address, seq)] = (host, time.perf_counter())
+                while True:
+                    try:
+                        sweep.sock.sendto(packet, (address, 0))
+                        break
+                    except BlockingIOError:
+                        await asyncio.sleep(0.001)  # Буфер сокета заполнен, даем ядру разгрузиться
+                    except OSError:
+                        sweep.pending.pop((address, seq), None)  # Например, нет маршрута
+                        break
+
+        # Ждем, пока у хостов без ответа не истекут их сроки
+        while True:
+            deadlines = [sent + timeouts.get(host, default_timeout)
+                         for s in sweeps.values() for host, sent in s.pending.values()]
+            remaining = max(deadlines, default=0) - time.perf_counter()
+            if remaining <= 0:
+                break
+            progress.clear()
+            try:
+                await asyncio.wait_for(progress.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+    finally:
+        for sweep in sweeps.values():
+            loop.remove_reader(sweep.sock.fileno())
+            sweep.close()
+
+    return results
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+# Файл со списком целей мониторинга
+TARGETS_FILE = "targets.json"
+
+
+class Target:
+    """
+    Цель мониторинга из файла целей.
+
+    - id: уникальный ключ цели — по нему хранятся статус и история (по умолчанию — host)
+    - name: имя для сообщений
+    - host, port, probe: что и как проверять
+    - interval: период проверки в секундах
+    - down/up: пороги смены статуса [N, M] (необязательно)
+    """
+
+    __slots__ = ('id', 'name', 'host', 'port', 'probe', 'interval', 'down', 'up', 'spec')
+
+    def __init__(self, spec, defaults):
+        spec = dict(defaults, **spec)
+        if not spec.get("host"):
+            raise ValueError(f"у цели {spec} не указан host")
+        self.host = str(spec["host"])
+        self.id = str(spec.get("id") or self.host)
+        self.name = str(spec.get("name") or self.id)
+        self.port = int(spec["port"]) if spec.get("port") is not None else None
+        self.probe = str(spec.get("probe", "tcp"))
+        self.interval = float(spec.get("interval", 60))
+        if self.interval <= 0:
+            raise ValueError(f"у цели {self.id} неположительный interval")
+        self.down = spec.get("down")
+        self.up = spec.get("up")
+        self.spec = spec
+
+    def get(self, key, default=None):
+        """Доступ к полям как у словаря (для кода, который принимает и dict, и Target)."""
+        return self.spec.get(key, default)
+
+    def endpoint(self):
+        """Что проверяется; при его изменении история цели начинается заново."""
+        return self.probe, self.host, self.port
+
+    def __eq__(self, other):
+        return isinstance(other, Target) and self.spec == other.spec
+
+    def __repr__(self):
+        return f"Target({self.id!r}, {self.probe}://{self.host}:{self.port})"
+
+
+class Inventory:
+    """
+    Реестр целей мониторинга, загружаемый из JSON-файла и индексированный по id (поиск за O(1)).
+
+    Файл — список объектов {"id", "name", "host", "port", "probe", "interval", ...} или объект
+    {"defaults": {...}, "targets": [...]}. Несколько проверок одного хоста задаются списком
+    "checks": каждая проверка наследует поля хоста и становится отдельной целью с id
+    "<id>/<probe>[:<port>]". reload() перечитывает файл и возвращает разницу с текущим
+    набором целей, чтобы вызывающий код запускал и останавливал только затронутые проверки.
+    Ошибка в файле не ломает текущий набор: он остается прежним.
+    probes — допустимые типы проверок (None — любые).
+    """
+
+    def __init__(self, path=TARGETS_FILE, defaults=None, probes=None):
+        self.path = path
+        self.defaults = defaults or {}
+        self.probes = set(probes) if probes else None
+        self.targets = {}  # id -> Target, в порядке файла
+        self.loaded = False  # Был ли файл хоть раз успешно прочитан
+        self._signature = None  # (mtime, размер) файла при последнем чтении
+
+    def __iter__(self):
+        return iter(list(self.targets.values()))
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __contains__(self, target_id):
+        return target_id in self.targets
+
+    def get(self, target_id):
+        return self.targets.get(target_id)
+
+    def name(self, target_id):
+        """Имя цели для сообщений (id, если цель уже удалена из реестра)."""
+        target = self.targets.get(target_id)
+        return target.name if target is not None else target_id
+
+    def _stat(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def modified(self):
+        """Изменился ли файл с последнего чтения (файл с ошибкой повторно не читается, пока его не исправят)."""
+        try:
+            return self._stat() != self._signature
+        except OSError:
+            return False
+
+    def parse(self, data):
+        """Разбирает содержимое файла в словарь {id: Target}."""
+        defaults = dict(self.defaults)
+        if isinstance(data, dict):
+            defaults.update(data.get("defaults", {}))
+            data = data.get("targets", [])
+        if not isinstance(data, list):
+            raise ValueError("ожидается список целей")
+        targets = {}
+        for spec in self._expand(data):
+            target = Target(spec, defaults)
+            if self.probes is not None and target.probe not in self.probes:
+                raise ValueError(f"у цели {target.id} неизвестный тип проверки: {target.probe}")
+            if target.id in targets:
+                raise ValueError(f"повторяющийся id цели: {target.id}")
+            targets[target.id] = target
+        return targets
+
+    @staticmethod
+    def _expand(data):
+        """Разворачивает записи со списком "checks" в отдельные цели."""
+        for spec in data:
+            checks = spec.get("checks")
+            if not checks:
+                yield spec
+                continue
+            base = {key: value for key, value in spec.items() if key != "checks"}
+            base_id = str(base.get("id") or base.get("host"))
+            for check in checks:
+                merged = dict(base, **check)
+                suffix = str(merged.get("probe", "tcp"))
+                if merged.get("port") is not None:
+                    suffix += f":{merged['port']}"
+                merged["id"] = check.get("id") or f"{base_id}/{suffix}"
+                merged["name"] = check.get("name") or f"{base.get('name') or base_id} {suffix}"
+                yield merged
+
+    def reload(self):
+        """
+        Перечитывает файл целей. Возвращает (added, removed, changed): списки новых целей,
+        удаленных целей и пар (старая, новая) для измененных. Неизменные цели не затрагиваются.
+        При ошибке чтения или разбора бросает исключение, набор целей остается прежним.
+        """
+        self._signature = self._stat()
+        with open(self.path, "r", encoding="utf-8") as file:
+            targets = self.parse(json.load(file))
+        self.loaded = True
+
+        added = [target for target_id, target in targets.items() if target_id not in self.targets]
+        removed = [target for target_id, target in self.targets.items() if target_id not in targets]
+        changed = [(self.targets[target_id], target) for target_id, target in targets.items()
+                   if target_id in self.targets and self.targets[target_id] != target]
+        # Неизмененные цели остаются теми же объектами
+        for target_id in targets:
+            if target_id in self.targets and self.targets[target_id] == targets[target_id]:
+                targets[target_id] = self.targets[target_id]
+        self.targets = targets
+        return added, removed, changed
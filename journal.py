@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import os
+
+
+def atomic_write(path, data):
+    """
+    Атомарно записывает data (bytes или список буферов) в path: пишем во временный файл, fsync,
+    затем os.replace. При падении посреди записи на диске остается либо старый, либо новый файл целиком.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.writelines(data if isinstance(data, list) else [data])
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+    # Фиксируем переименование в каталоге
+    try:
+        dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+class StatusJournal:
+    """
+    Хранилище истории проверок: снимок (snapshot) + журнал, в который дописываются только новые записи.
+
+    Запись журнала — одна компактная JSON-строка [ip, timestamp, status, response_time].
+    Снимок и журнал помечаются номером поколения: после компакции журнал с устаревшим
+    поколением просто игнорируется, поэтому падение между записью снимка и обнулением
+    журнала не приводит к дублированию записей.
+
+    Формат полезной нагрузки снимка определяет вызывающий код (bytes или список буферов).
+    snapshot_async() пишет снимок в пуле потоков; записи, пришедшие, пока снимок пишется,
+    придерживаются в памяти и попадают в журнал уже нового поколения.
+    """
+
+    def __init__(self, snapshot_path, journal_path):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.generation = 0
+        self.records_since_snapshot = 0
+        self.snapshotting = False  # Идет snapshot_async()
+        self._held = []  # Записи, пришедшие во время snapshot_async()
+        self._file = None
+
+    def load(self):
+        """
+        Читает снимок и хвост журнала.
+        Возвращает (payload снимка или None, список записей журнала).
+        """
+        payload = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as file:
+                header = json.loads(file.readline())
+                self.generation = header["generation"]
+                payload = file.read()
+
+        records = []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb") as file:
+                header_line = file.readline()
+                try:
+                    journal_generation = json.loads(header_line)["generation"]
+                except (ValueError, KeyError, TypeError):
+                    journal_generation = None
+                if journal_generation == self.generation:
+                    good_offset = file.tell()
+                    for line in file:
+                        if not line.endswith(b"\n"):
+                            # Оборванная последняя строка (падение посреди записи), даже если JSON в ней
+                            # полный: без перевода строки к ней приклеилась бы следующая запись
+                            break
+                        try:
+                            records.append(json.loads(line))
+                        except ValueError:
+                            break
+                        good_offset = file.tell()
+                    # Отрезаем поврежденный хвост, чтобы новые записи не склеились с ним
+                    if good_offset != os.path.getsize(self.journal_path):
+                        os.truncate(self.journal_path, good_offset)
+                else:
+                    self._reset_journal()
+        self.records_since_snapshot = len(records)
+        return payload, records
+
+    def append(self, records):
+        """Дописывает новые записи [ip, timestamp, status, response_time] в конец журнала."""
+        if not records:
+            return
+        if self.snapshotting:
+            # Снимок нового поколения еще пишется: в старый журнал эти записи попасть не должны
+            self._held.extend(records)
+            return
+        if self._file is None:
+            if not os.path.exists(self.journal_path):
+                self._reset_journal()
+            self._file = open(self.journal_path, "ab")
+        data = b"".join(json.dumps(record, separators=(",", ":")).encode() + b"\n" for record in records)
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.records_since_snapshot += len(records)
+
+    def snapshot(self, payload):
+        """
+        Компакция: атомарно записывает новый снимок следующего поколения и начинает журнал заново.
+        """
+        self._write_snapshot(self.generation + 1, payload)
+        self.generation += 1
+        self._reset_journal()
+        self.records_since_snapshot = 0
+
+    async def snapshot_async(self, encode, *args):
+        """
+        Компакция без блокировки event loop: encode(*args) (сериализация снимка, например
+        из заранее скопированных буферов) и запись файла выполняются в пуле потоков.
+        Новый журнал начинается после записи снимка, придержанные записи дописываются в него.
+        Если снимок записать не удалось, они дописываются в старый журнал, ошибка пробрасывается.
+        """
+        if self.snapshotting:
+            raise RuntimeError("снимок уже записывается")
+        self.snapshotting = True
+        generation = self.generation + 1
+        try:
+            await asyncio.get_event_loop().run_in_executor(
+                None, lambda: self._write_snapshot(generation, encode(*args)),
+            )
+            self.generation = generation
+            self._reset_journal()
+            self.records_since_snapshot = 0
+        finally:
+            self.snapshotting = False
+            held, self._held = self._held, []
+            self.append(held)
+
+    def _write_snapshot(self, generation, payload):
+        header = json.dumps({"generation": generation}).encode() + b"\n"
+        atomic_write(self.snapshot_path, [header] + (payload if isinstance(payload, list) else [payload]))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _reset_journal(self):
+        """Атомарно заменяет журнал пустым с заголовком текущего поколения."""
+        self.close()
+        atomic_write(self.journal_path, json.dumps({"generation": self.generation}).encode() + b"\n")
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+import math
+import operator
+from array import array
+
+# Диапазон и шаг логарифмической шкалы задержек (мс): от 0.1 мс до 60 с, корзины по +10%
+MIN_LATENCY = 0.1
+MAX_LATENCY = 60000.0
+GROWTH = 1.1
+
+_LOG_GROWTH = math.log(GROWTH)
+# Корзина 0 — всё, что меньше MIN_LATENCY, последняя — всё, что больше MAX_LATENCY
+BINS = int(math.ceil(math.log(MAX_LATENCY / MIN_LATENCY) / _LOG_GROWTH)) + 2
+
+
+def bin_index(value):
+    """Номер корзины для задержки value (мс)."""
+    if value < MIN_LATENCY:
+        return 0
+    if value >= MAX_LATENCY:
+        return BINS - 1
+    return min(BINS - 2, int(math.log(value / MIN_LATENCY) / _LOG_GROWTH) + 1)
+
+
+def bin_value(index):
+    """Представитель корзины: середина (в геометрическом смысле) ее границ, мс."""
+    if index <= 0:
+        return MIN_LATENCY
+    if index >= BINS - 1:
+        return MAX_LATENCY
+    return MIN_LATENCY * GROWTH ** (index - 0.5)
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек с логарифмическими корзинами (в духе HDR Histogram).
+
+    Память фиксирована (BINS счетчиков) независимо от числа записанных значений,
+    относительная погрешность перцентилей — около 5%. Гистограммы складываются (merge),
+    поэтому перцентили по нескольким интервалам считаются точно так же, как по одному.
+    """
+
+    __slots__ = ('counts', 'total')
+
+    def __init__(self):
+        self.counts = array('I', bytes(4 * BINS))
+        self.total = 0
+
+    def record(self, value, count=1):
+        self.counts[bin_index(value)] += count
+        self.total += count
+
+    def merge(self, other):
+        counts = self.counts
+        for i, count in enumerate(other.counts):
+            if count:
+                counts[i] += count
+        self.total += other.total
+        return self
+
+    def subtract(self, other):
+        self.counts = array('I', map(operator.sub, self.counts, other.counts))
+        self.total -= other.total
+        return self
+
+    def reset(self):
+        self.counts = array('I', bytes(4 * BINS))
+        self.total = 0
+
+    def percentile(self, q):
+        """Значение q-го перцентиля (0 < q <= 100), None — если значений нет."""
+        if not self.total:
+            return None
+        rank = max(1, int(math.ceil(q / 100 * self.total)))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return bin_value(i)
+        return bin_value(BINS - 1)
+
+    def to_json(self):
+        """Разреженное представление: {номер корзины: счетчик}."""
+        return {str(i): count for i, count in enumerate(self.counts) if count}
+
+    @classmethod
+    def from_json(cls, data):
+        histogram = cls()
+        for i, count in data.items():
+            histogram.counts[int(i)] = count
+            histogram.total += count
+        return histogram
+
+
+class LatencyWindows:
+    """
+    Кольцо почасовых гистограмм задержки одного сервера (по умолчанию последние 24 часа + текущий).
+    Перцентили за любое окно в пределах кольца — слиянием гистограмм попавших в окно часов.
+    Для окна до текущего момента (since) слияние не нужно: сумма всех часов кольца ведется
+    на лету — при записи прибавляется, при вытеснении часа вычитается.
+    Память фиксирована: slots + 1 гистограмм.
+    """
+
+    def __init__(self, slots=25, slot_seconds=60 * 60):
+        self.slot_seconds = slot_seconds
+        self.starts = [None] * slots
+        self.histograms = [LatencyHistogram() for _ in range(slots)]
+        self.window = LatencyHistogram()  # Сумма гистограмм всех занятых слотов
+
+    def record(self, timestamp, value):
+        start = int(timestamp // self.slot_seconds)
+        i = start % len(self.starts)
+        if self.starts[i] != start:
+            # Слот занят давно прошедшим часом — переиспользуем
+            if self.starts[i] is not None:
+                self.window.subtract(self.histograms[i])
+            self.starts[i] = start
+            self.histograms[i].reset()
+        self.histograms[i].record(value)
+        self.window.record(value)
+
+    def since(self, start):
+        """
+        Гистограмма за часы от пересекающегося с start до текущего, без слияния: часы старше start
+        вычитаются из суммы и освобождаются. Возвращается общий объект — изменять его нельзя.
+        """
+        first = int(start // self.slot_seconds)
+        for i, slot_start in enumerate(self.starts):
+            if slot_start is not None and slot_start < first:
+                self.window.subtract(self.histograms[i])
+                self.starts[i] = None
+                self.histograms[i].reset()
+        return self.window
+
+    def merged(self, start, end):
+        """Гистограмма за часы, пересекающиеся с [start, end)."""
+        first = int(start // self.slot_seconds)
+        last = int(math.ceil(end / self.slot_seconds))
+        result = LatencyHistogram()
+        for slot_start, histogram in zip(self.starts, self.histograms):
+            if slot_start is not None and first <= slot_start < last:
+                result.merge(histogram)
+        return result
+
+    def to_json(self):
+        return [[start, histogram.to_json()] for start, histogram in zip(self.starts, self.histograms) if start is not None]
+
+    def load_json(self, data):
+        for start, counts in data:
+            i = start % len(self.starts)
+            if self.starts[i] is not None:
+                self.window.subtract(self.histograms[i])
+            self.starts[i] = start
+            self.histograms[i] = LatencyHistogram.from_json(counts)
+            self.window.merge(self.histograms[i])
+        return self
+
+
+def adaptive_timeout(histogram, floor, ceiling, multiplier=4.0, quantile=99, min_samples=20):
+    """
+    Таймаут проверки в секундах по распределению задержек цели: multiplier × p99 в пределах
+    [floor, ceiling]. Пока ответов меньше min_samples — ceiling.
+    """
+    if histogram.total < min_samples:
+        return ceiling
+    return min(ceiling, max(floor, histogram.percentile(quantile) * multiplier / 1000))
+
+
+def format_ms(value):
+    """Задержка в мс для сообщений: до 10 мс — с одним знаком после запятой."""
+    return f"{round(value, 1) if value < 10 else round(value)} мс"
+
+
+def format_percentiles(histogram, quantiles=(50, 95, 99)):
+    """Строка вида 'p50 12 мс, p95 30 мс, p99 41 мс' (N/A, если данных нет)."""
+    if not histogram.total:
+        return "N/A"
+    return ", ".join(f"p{q} {format_ms(histogram.percentile(q))}" for q in quantiles)
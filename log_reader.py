@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import threading
+
+# Начало строки лога: "2024-05-01 13:..." — ключ часа b'2024-05-01 13'
+TIMESTAMP = re.compile(rb'\d{4}-\d\d-\d\d \d\d:')
+
+READ_CHUNK = 1024 * 1024  # Размер блока при индексации и чтении с конца
+MAX_READ_BYTES = 256 * 1024  # Ограничение объема одного ответа на /log
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _line_start(data, pos):
+    """Начало первой строки, начинающейся не раньше pos (len(data), если такой нет)."""
+    if pos == 0 or data[pos - 1] == 0x0A:
+        return pos
+    newline = data.find(b'\n', pos)
+    return len(data) if newline < 0 else newline + 1
+
+
+def _next_key(data, pos):
+    """(ключ часа, начало строки) первой строки со временем, начинающейся не раньше pos."""
+    pos = _line_start(data, pos)
+    while pos < len(data):
+        match = TIMESTAMP.match(data, pos)
+        if match:
+            return match.group(0)[:13], pos
+        pos = _line_start(data, pos + 1)
+    return None, len(data)
+
+
+class LogIndex:
+    """
+    Разреженный индекс файла лога: для каждого часа — смещение первой строки этого часа.
+
+    Строки в логе идут по времени, поэтому границы часов внутри прочитанного блока ищутся
+    двоичным поиском, а не разбором каждой строки: блок, целиком относящийся к текущему часу,
+    пропускается за несколько обращений. Индекс дополняется только новой частью файла;
+    после ротации (файл подменен или стал короче) строится заново.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, inode):
+        self.inode = inode
+        self.offset = 0  # До какого места файл проиндексирован (всегда на границе строки)
+        self.entries = []  # [(ключ часа, смещение первой строки часа)]
+
+    def update(self):
+        """Дочитывает в индекс новую часть файла."""
+        with self.lock:
+            stat = os.stat(self.path)
+            if stat.st_ino != self.inode or stat.st_size < self.offset:
+                self._reset(stat.st_ino)
+            if stat.st_size == self.offset:
+                return
+            with open(self.path, 'rb') as file:
+                file.seek(self.offset)
+                while True:
+                    data = file.read(READ_CHUNK)
+                    if not data:
+                        break
+                    end = data.rfind(b'\n') + 1
+                    if not end:
+                        if len(data) < READ_CHUNK:
+                            break  # Последняя строка еще дописывается
+                        end = len(data)  # Очень длинная строка без перевода — индексируем как есть
+                    self._scan(data[:end], self.offset)
+                    self.offset += end
+                    file.seek(self.offset)
+
+    def _scan(self, data, base):
+        current = self.entries[-1][0] if self.entries else None
+        pos = 0
+        while pos < len(data):
+            if current is None:
+                key, start = _next_key(data, pos)
+            else:
+                # Двоичный поиск первой строки следующего часа
+                lo, hi = pos, len(data)
+                while lo < hi:
+                    mid = (lo + hi) // 2
+                    key, _ = _next_key(data, mid)
+                    if key is None or key > current:
+                        hi = mid
+                    else:
+                        lo = mid + 1
+                key, start = _next_key(data, lo)
+                if key is not None and key <= current:
+                    key = None
+            if key is None:
+                return
+            self.entries.append((key, base + start))
+            current = key
+            pos = start + 1
+
+    def hour_ranges(self, day, hour):
+        """Диапазоны байт [start, end) строк за указанное число месяца и час (за все месяцы в файле)."""
+        self.update()
+        day, hour = f"{int(day):02}".encode(), f"{int(hour):02}".encode()
+        ranges = []
+        for i, (key, start) in enumerate(self.entries):
+            if key[8:10] == day and key[11:13] == hour:
+                end = self.entries[i + 1][1] if i + 1 < len(self.entries) else self.offset
+                ranges.append((start, end))
+        return ranges
+
+
+def get_index(path):
+    """Индекс файла лога (создается при первом обращении и дальше обновляется инкрементально)."""
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            index = _indexes[path] = LogIndex(path)
+        return index
+
+
+def read_hour(path, day, hour, max_bytes=MAX_READ_BYTES):
+    """
+    Строки лога за число месяца day и час hour: читаются только нужные диапазоны файла.
+    Возвращает (строки, обрезано ли по max_bytes — тогда отдаются последние строки часа).
+    """
+    ranges = get_index(path).hour_ranges(day, hour)
+    total = sum(end - start for start, end in ranges)
+    truncated = total > max_bytes
+    lines = []
+    with open(path, 'rb') as file:
+        skip = total - max_bytes if truncated else 0
+        for start, end in ranges:
+            if skip >= end - start:
+                skip -= end - start
+                continue
+            file.seek(start + skip)
+            data = file.read(end - start - skip)
+            if skip:
+                data = data[data.find(b'\n') + 1:]  # Первая строка обрезана — отбрасываем
+                skip = 0
+            lines.extend(data.decode('utf-8', errors='replace').splitlines())
+    return lines, truncated
+
+
+def tail(path, n=100, max_bytes=MAX_READ_BYTES):
+    """Последние n строк файла: читается с конца блоками, не больше max_bytes."""
+    with open(path, 'rb') as file:
+        file.seek(0, os.SEEK_END)
+        position = file.tell()
+        data = b''
+        while position > 0 and data.count(b'\n') <= n and len(data) < max_bytes:
+            size = min(READ_CHUNK, position, max_bytes - len(data))
+            position -= size
+            file.seek(position)
+            data = file.read(size) + data
+    lines = data.decode('utf-8', errors='replace').splitlines()
+    if position > 0 and lines:
+        lines = lines[1:]  # Первая строка блока может быть неполной
+    return lines[-n:]
+
+
+def read_lines(path, offset=0, max_bytes=MAX_READ_BYTES):
+    """
+    Строки файла начиная со смещения offset (начало строки), не больше max_bytes за вызов:
+    файл отдается блоками, каждый можно читать в executor, не загружая файл в память целиком.
+    Возвращает (строки, смещение следующего блока или None, если файл дочитан).
+    """
+    with open(path, 'rb') as file:
+        file.seek(offset)
+        data = file.read(max_bytes)
+    if len(data) < max_bytes:
+        return data.decode('utf-8', errors='replace').splitlines(), None
+    end = data.rfind(b'\n') + 1
+    if end:
+        data = data[:end]  # Неполная последняя строка уйдет в следующий блок
+    return data.decode('utf-8', errors='replace').splitlines(), offset + len(data)
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import atexit
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Ротация файлов логов: максимальный размер файла и число старых копий
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+_listener = None
+
+
+class _ChannelFilter(logging.Filter):
+    """Пропускает в файл только записи своего канала (логгера)."""
+
+    def __init__(self, names):
+        super().__init__()
+        self.names = set(names)
+
+    def filter(self, record):
+        return record.name in self.names
+
+
+class _RootFilter(logging.Filter):
+    """Пропускает записи, не относящиеся ни к одному каналу (общий лог)."""
+
+    def __init__(self, channels):
+        super().__init__()
+        self.channels = set(channels)
+
+    def filter(self, record):
+        return record.name not in self.channels
+
+
+def setup_logging(root_file, channels=None, level=logging.INFO, console=True):
+    """
+    Настраивает логирование один раз при старте.
+
+    Все логгеры пишут через QueueHandler в общую очередь — в горячем пути это только
+    queue.put. Запись на диск делает фоновый поток QueueListener через RotatingFileHandler
+    (ротация по размеру). channels — словарь {имя логгера: файл} для отдельных каналов,
+    их записи не попадают в общий лог root_file.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    channels = channels or {}
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = []
+
+    def file_handler(path, log_filter):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+        handler.setFormatter(formatter)
+        handler.addFilter(log_filter)
+        return handler
+
+    handlers.append(file_handler(root_file, _RootFilter(channels)))
+    if console:
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(formatter)
+        stream_handler.addFilter(_RootFilter(channels))
+        handlers.append(stream_handler)
+
+    # Один файл может обслуживать несколько каналов
+    by_file = {}
+    for name, path in channels.items():
+        by_file.setdefault(path, []).append(name)
+    for path, names in by_file.items():
+        handlers.append(file_handler(path, _ChannelFilter(names)))
+
+    log_queue = queue.Queue(-1)
+    queue_handler = QueueHandler(log_queue)
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+
+    for name in channels:
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        logger.propagate = False  # Записи канала не дублируются в общий лог
+        logger.handlers[:] = [queue_handler]
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Дописывает оставшиеся в очереди записи и останавливает фоновый поток."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from aiogram.utils.exceptions import NetworkError, RetryAfter, TelegramAPIError
+
+# Ограничения Telegram: ~1 сообщение в секунду в личный чат, 20 в минуту в группу, ~30 в секунду всего
+PER_CHAT_INTERVAL = 1.0
+GROUP_CHAT_INTERVAL = 3.0
+GLOBAL_INTERVAL = 1 / 30
+
+MAX_MESSAGE_LENGTH = 4096  # Максимальная длина одного сообщения Telegram
+BATCH_DELAY = 1.0  # Сколько ждать остальные уведомления, чтобы отправить их одним сообщением
+MAX_ATTEMPTS = 5  # Попыток при сетевых ошибках
+RETRY_BACKOFF = 2.0  # Начальная пауза между попытками, секунды
+
+
+def chat_key(chat_id):
+    """
+    Номер чата как int: CHAT_ID в config.py задается строкой ('-100…'), а у входящих сообщений
+    это int. Иначе один чат получил бы две очереди и два лимита, а группа — лимит личного чата.
+    Имя канала ('@channel') остается строкой.
+    """
+    if isinstance(chat_id, str):
+        try:
+            return int(chat_id)
+        except ValueError:
+            return chat_id
+    return chat_id
+
+
+class _Item:
+    """Одно исходящее сообщение (или произвольный запрос к API) и future для результата."""
+
+    __slots__ = ('text', 'kwargs', 'call', 'merge', 'ready', 'attempts', 'future')
+
+    def __init__(self, text, kwargs, call, merge, ready, future):
+        self.text = text
+        self.kwargs = kwargs
+        self.call = call
+        self.merge = merge
+        self.ready = ready  # Не отправлять раньше этого времени (loop.time())
+        self.attempts = 0
+        self.future = future
+
+
+class Outbox:
+    """
+    Очередь исходящих сообщений Telegram с отдельным фоновым отправителем.
+
+    - send() только ставит сообщение в очередь и сразу возвращает управление: проверки
+      никогда не ждут сети Telegram.
+    - Соблюдаются лимиты на чат и общий лимит бота; на 429 чат ставится на паузу на retry_after,
+      сообщение повторяется. Сетевые ошибки повторяются с нарастающей паузой.
+    - Накопившиеся уведомления (merge=True) для одного чата склеиваются в одно сообщение —
+      массовая авария на 50 серверов приходит парой сообщений, а не пятьюдесятью.
+    - Сообщения одного чата уходят в порядке постановки в очередь.
+
+    on_delivered — необязательная функция, которой передается длительность каждого успешного запроса к API (секунды).
+    """
+
+    def __init__(self, bot, batch_delay=BATCH_DELAY, on_delivered=None):
+        self.bot = bot
+        self.batch_delay = batch_delay
+        self.on_delivered = on_delivered
+        self.queues = {}  # chat_id -> deque[_Item]
+        self.chat_ready = {}  # chat_id -> время, раньше которого в чат писать нельзя
+        self.global_ready = 0.0
+        self.sent = 0
+        self.merged = 0
+        self.retries = 0
+        self.failed = 0
+        self._task = None
+        self._wakeup = None
+
+    def send(self, chat_id, text, merge=False, **kwargs):
+        """
+        Ставит сообщение в очередь. merge=True — уведомление, которое можно склеить с соседними
+        уведомлениями того же чата. Возвращает future с результатом отправки (ждать не обязательно).
+        """
+        return self._put(chat_id, _Item(text, kwargs, None, merge, 0.0, None))
+
+    def request(self, chat_id, call):
+        """Произвольный запрос к API для чата (например, отправка фото): call — функция без аргументов, возвращающая корутину."""
+        return self._put(chat_id, _Item(None, None, call, False, 0.0, None))
+
+    def _put(self, chat_id, item):
+        chat_id = chat_key(chat_id)
+        loop = asyncio.get_event_loop()
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        item.future = loop.create_future()
+        if item.merge:
+            item.ready = loop.time() + self.batch_delay
+        self.queues.setdefault(chat_id, deque()).append(item)
+        self._wakeup.set()
+        return item.future
+
+    def pending(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def _next_chat(self, now):
+        """Чат, в который можно писать прямо сейчас, или (None, сколько ждать до ближайшего)."""
+        best, best_ready = None, None
+        for chat_id, queue in self.queues.items():
+            ready = max(self.chat_ready.get(chat_id, 0.0), self.global_ready, queue[0].ready)
+            if best_ready is None or ready < best_ready:
+                best, best_ready = chat_id, ready
+        if best is None:
+            return None, None
+        if best_ready <= now:
+            return best, 0.0
+        return None, best_ready - now
+
+    def _take(self, chat_id):
+        """Снимает с очереди чата следующее сообщение, склеивая подряд идущие уведомления."""
+        queue = self.queues[chat_id]
+        batch = [queue.popleft()]
+        if batch[0].merge:
+            length = len(batch[0].text)
+            while (queue and queue[0].merge and queue[0].kwargs == batch[0].kwargs
+                   and length + 2 + len(queue[0].text) <= MAX_MESSAGE_LENGTH):
+                length += 2 + len(queue[0].text)
+                batch.append(queue.popleft())
+        if not queue:
+            del self.queues[chat_id]
+        return batch
+
+    def _requeue(self, chat_id, batch):
+        queue = self.queues.setdefault(chat_id, deque())
+        queue.extendleft(reversed(batch))
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            self._wakeup.clear()
+            chat_id, delay = self._next_chat(loop.time())
+            if chat_id is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._deliver(loop, chat_id, self._take(chat_id))
+
+    async def _deliver(self, loop, chat_id, batch):
+        first = batch[0]
+        interval = GROUP_CHAT_INTERVAL if isinstance(chat_id, int) and chat_id < 0 else PER_CHAT_INTERVAL
+        now = loop.time()
+        self.chat_ready[chat_id] = now + interval
+        self.global_ready = now + GLOBAL_INTERVAL
+        start_time = time.perf_counter()
+        try:
+            if first.call is not None:
+                result = await first.call()
+            else:
+                text = "\n\n".join(item.text for item in batch)
+                result = await self.bot.send_message(chat_id, text, **first.kwargs)
+        except RetryAfter as e:
+            # Telegram просит подождать: чат на паузу, сообщение — обратно в начало очереди
+            self.retries += 1
+            self.chat_ready[chat_id] = loop.time() + e.timeout
+            logging.warning(f"Telegram: превышен лимит для чата {chat_id}, повтор через {e.timeout} с")
+            self._requeue(chat_id, batch)
+            return
+        except (NetworkError, asyncio.TimeoutError, OSError) as e:
+            first.attempts += 1
+            if first.attempts < MAX_ATTEMPTS:
+                self.retries += 1
+                pause = RETRY_BACKOFF * 2 ** (first.attempts - 1)
+                self.chat_ready[chat_id] = loop.time() + pause
+                logging.warning(f"Telegram: ошибка отправки в чат {chat_id} ({e}), повтор через {pause:.0f} с")
+                self._requeue(chat_id, batch)
+                return
+            self._fail(chat_id, batch, e)
+            return
+        except TelegramAPIError as e:
+            self._fail(chat_id, batch, e)
+            return
+        except asyncio.CancelledError:
+            self._requeue(chat_id, batch)
+            raise
+        except Exception as e:
+            self._fail(chat_id, batch, e)
+            return
+
+        self.sent += 1
+        self.merged += len(batch) - 1
+        if self.on_delivered is not None:
+            self.on_delivered(time.perf_counter() - start_time)
+        for item in batch:
+            if not item.future.done():
+                item.future.set_result(result)
+
+    def _fail(self, chat_id, batch, error):
+        self.failed += len(batch)
+        logging.error(f"Telegram: не удалось отправить сообщение в чат {chat_id}: {error}")
+        for item in batch:
+            if not item.future.done():
+                item.future.set_exception(error)
+                item.future.exception()  # Ошибка уже залогирована — не ругаемся на неполученное исключение
+
+    async def close(self, timeout=10):
+        """Дожидается отправки очереди (не дольше timeout секунд) и останавливает отправителя."""
+        if self._task is None:
+            return
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        while self.queues and loop.time() < deadline and not self._task.done():
+            await asyncio.sleep(0.1)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
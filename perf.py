@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import functools
+import logging
+import time
+from contextlib import contextmanager
+
+from latency_hist import LatencyHistogram, format_ms
+
+# Период замера задержки event loop (секунды)
+LOOP_LAG_INTERVAL = 0.5
+
+# Перцентили в отчете /perf и в экспорте Prometheus
+QUANTILES = (50, 95, 99)
+
+# Префикс имен метрик Prometheus
+METRIC_PREFIX = "netmon_"
+
+
+class Stat:
+    """
+    Распределение длительностей одной фазы: гистограмма с фиксированной памятью (LatencyHistogram, мс),
+    число замеров, сумма, максимум и последнее значение.
+    """
+
+    __slots__ = ('name', 'help', 'histogram', 'count', 'sum', 'max', 'last')
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.histogram = LatencyHistogram()
+        self.count = 0
+        self.sum = 0.0  # Секунды
+        self.max = 0.0
+        self.last = None
+
+    def observe(self, seconds):
+        self.histogram.record(seconds * 1000)
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        self.last = seconds
+
+    def percentile(self, q):
+        """q-й перцентиль в секундах (не больше максимума: у корзин гистограммы погрешность ~5%), None — замеров нет."""
+        value = self.histogram.percentile(q)
+        return min(value / 1000, self.max) if value is not None else None
+
+
+class Perf:
+    """
+    Самоизмерение бота: длительности фаз (observe/measure/timed), текущие значения (gauge —
+    функции без аргументов, опрашиваются при отчете) и задержка event loop.
+    Память фиксирована: одна гистограмма на фазу, сколько бы замеров ни было.
+    Отчет — report() для /perf и prometheus() в текстовом формате Prometheus.
+    """
+
+    def __init__(self):
+        self.stats = {}  # имя -> Stat, в порядке объявления
+        self.gauges = {}  # имя -> (описание, функция, тип метрики)
+        self.started = time.time()
+        self._lag_task = None
+
+    def define(self, name, help):
+        """Объявляет фазу с описанием (для отчета); порядок объявления — порядок в отчете."""
+        if name not in self.stats:
+            self.stats[name] = Stat(name, help)
+        return self.stats[name]
+
+    def observe(self, name, seconds):
+        """Записывает длительность фазы name (секунды)."""
+        stat = self.stats.get(name) or self.define(name, name)
+        stat.observe(seconds)
+
+    @contextmanager
+    def measure(self, name):
+        """Замер блока кода: with perf.measure("save_status"): ... (внутри можно await)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """Декоратор корутинной функции (например, обработчика команды): замер каждого вызова."""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                with self.measure(name):
+                    return await func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def gauge(self, name, help, func, kind="gauge"):
+        """Текущее значение (глубина очереди, число проверок в работе); kind="counter" — растущий счетчик."""
+        self.gauges[name] = (help, func, kind)
+
+    def start_loop_monitor(self, interval=LOOP_LAG_INTERVAL):
+        """
+        Запускает замер задержки event loop: задача засыпает на interval, опоздание пробуждения —
+        время, на которое loop был занят чем-то другим (блокирующий код, долгие колбэки).
+        """
+        self.define("loop_lag", "задержка event loop")
+        if self._lag_task is None or self._lag_task.done():
+            self._lag_task = asyncio.ensure_future(self._monitor_loop(interval))
+
+    async def _monitor_loop(self, interval):
+        loop = asyncio.get_event_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.observe("loop_lag", max(0.0, loop.time() - start - interval))
+
+    def _gauge_values(self):
+        values = []
+        for name, (help, func, kind) in self.gauges.items():
+            try:
+                values.append((name, help, func(), kind))
+            except Exception as e:
+                logging.error(f"Ошибка при чтении метрики {name}: {e}")
+        return values
+
+    def report(self):
+        """Текст отчета для /perf."""
+        uptime = int(time.time() - self.started)
+        lines = [f"⚙️ Производительность бота (за {uptime // 3600} ч {uptime % 3600 // 60} мин работы)", ""]
+        lines.append("⏱ Длительности (последняя; " + ", ".join(f"p{q}" for q in QUANTILES) + "; макс; замеров):")
+        for stat in self.stats.values():
+            if not stat.count:
+                continue
+            percentiles = ", ".join(format_ms(stat.percentile(q) * 1000) for q in QUANTILES)
+            lines.append(
+                f"  {stat.help}: {format_ms(stat.last * 1000)}; {percentiles}; "
+                f"{format_ms(stat.max * 1000)}; {stat.count}"
+            )
+        lines.append("")
+        lines.append("📦 Текущие значения:")
+        for name, help, value, kind in self._gauge_values():
+            lines.append(f"  {help}: {value}")
+        return "\n".join(lines)
+
+    def prometheus(self):
+        """Метрики в текстовом формате Prometheus (version 0.0.4): фазы — summary в секундах."""
+        lines = []
+        for stat in self.stats.values():
+            metric = f"{METRIC_PREFIX}{stat.name}_seconds"
+            lines.append(f"# HELP {metric} {stat.help}")
+            lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                value = stat.percentile(q)
+                value = value if value is not None else float("nan")
+                lines.append(f'{metric}{{quantile="{q / 100}"}} {value:.6g}')
+            lines.append(f"{metric}_sum {stat.sum:.6g}")
+            lines.append(f"{metric}_count {stat.count}")
+        for name, help, value, kind in self._gauge_values():
+            metric = f"{METRIC_PREFIX}{name}"
+            lines.append(f"# HELP {metric} {help}")
+            lines.append(f"# TYPE {metric} {kind}")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    async def serve_prometheus(self, host, port):
+        """
+        HTTP-сервер экспорта метрик: GET /metrics отдает prometheus(). Слушать стоит только
+        локальный адрес — аутентификации нет. Возвращает asyncio.Server.
+        """
+        async def handle(reader, writer):
+            try:
+                request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+                while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                    pass  # Заголовки запроса не нужны
+                parts = request_line.split()
+                if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] == b"/metrics":
+                    status, body = "200 OK", self.prometheus().encode()
+                else:
+                    status, body = "404 Not Found", b"not found\n"
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n"
+                    f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: close\r\n\r\n".encode() + body
+                )
+                await writer.drain()
+            except (asyncio.TimeoutError, OSError):
+                pass
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port)
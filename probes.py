@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import ssl
+
+from tcp_probe import tcp_probe, retry_parallel
+from icmp_sweep import icmp_sweep
+from dns_cache import DnsCache, ResolveError, open_connection
+
+try:
+    from ping3 import ping  # Запасной вариант ICMP без прав на ICMP-сокет
+except ImportError:
+    ping = None
+
+# Реестр типов проверок: значение поля "probe" цели -> класс проверки
+PROBES = {}
+
+
+def register(probe_class):
+    """Регистрирует тип проверки (декоратор класса)."""
+    PROBES[probe_class.name] = probe_class
+    return probe_class
+
+
+async def _close(writer):
+    """Закрывает соединение, ошибки при закрытии нас не интересуют."""
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+
+
+_ssl_contexts = {}
+
+
+def _ssl_context(target):
+    """
+    TLS-контекст цели: проверка сертификата включена, если не указано "verify": false.
+    Контексты создаются один раз — загрузка корневых сертификатов блокирует event loop.
+    """
+    verify = bool(target.get("verify", True))
+    context = _ssl_contexts.get(verify)
+    if context is None:
+        context = ssl.create_default_context()
+        if not verify:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        _ssl_contexts[verify] = context
+    return context
+
+
+class Probe:
+    """
+    Тип проверки. check() возвращает (response_time в мс, None) при успехе или (None, текст ошибки).
+    addresses — адреса хоста цели [(family, address)] из DnsCache, имя заново не резолвится.
+
+    - default_port: порт, если у цели он не указан
+    - timeout: верхняя граница таймаута попытки (секунды), если у цели не указан "timeout"
+    - uses_connection: проверка открывает соединение и занимает слот общего ограничения подключений
+    """
+
+    name = None
+    default_port = None
+    timeout = 5
+    uses_connection = True
+
+    def port(self, target):
+        return target.port or self.default_port
+
+    async def check(self, target, timeout, addresses):
+        raise NotImplementedError
+
+
+@register
+class TcpProbe(Probe):
+    """Установка TCP-соединения."""
+
+    name = "tcp"
+    default_port = 443
+
+    async def check(self, target, timeout, addresses):
+        return await tcp_probe(target.host, self.port(target), timeout, addresses)
+
+
+@register
+class TlsProbe(Probe):
+    """TCP-соединение и TLS-рукопожатие (время — до окончания рукопожатия)."""
+
+    name = "tls"
+    default_port = 443
+    timeout = 10
+
+    async def check(self, target, timeout, addresses):
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
+        try:
+            reader, writer = await asyncio.wait_for(
+                open_connection(
+                    addresses, self.port(target),
+                    ssl=_ssl_context(target), server_hostname=target.get("sni") or target.host,
+                ),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            return None, f"timed out ({timeout} с)"
+        except OSError as e:  # В том числе ssl.SSLError
+            return None, str(e) or e.__class__.__name__
+        response_time = round((loop.time() - start_time) * 1000)
+        await _close(writer)
+        return response_time, None
+
+
+@register
+class HttpProbe(Probe):
+    """
+    HTTP-запрос HEAD (поле цели "path", по умолчанию "/"). Успех — код ответа меньше 400
+    или из списка "expect_status". Время — до получения строки статуса.
+    """
+
+    name = "http"
+    default_port = 80
+    timeout = 10
+    tls = False
+
+    async def check(self, target, timeout, addresses):
+        loop = asyncio.get_event_loop()
+        start_time = loop.time()
+        try:
+            return await asyncio.wait_for(self._head(target, addresses, loop, start_time), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None, f"timed out ({timeout} с)"
+        except (OSError, ValueError) as e:
+            return None, str(e) or e.__class__.__name__
+
+    async def _head(self, target, addresses, loop, start_time):
+        port = self.port(target)
+        reader, writer = await open_connection(
+            addresses, port,
+            ssl=_ssl_context(target) if self.tls else None,
+            server_hostname=(target.get("sni") or target.host) if self.tls else None,
+        )
+        try:
+            default_port = 443 if self.tls else 80
+            host_header = target.host if port == default_port else f"{target.host}:{port}"
+            writer.write(
+                f"HEAD {target.get('path', '/')} HTTP/1.1\r\n"
+                f"Host: {host_header}\r\n"
+                f"User-Agent: monitoring-bot\r\n"
+                f"Connection: close\r\n\r\n".encode()
+            )
+            status_line = await reader.readline()
+            response_time = round((loop.time() - start_time) * 1000)
+        finally:
+            await _close(writer)
+
+        parts = status_line.split()
+        if len(parts) < 2 or not parts[0].startswith(b"HTTP/"):
+            return None, f"некорректный ответ: {status_line[:50]!r}"
+        status = int(parts[1])
+        expected = target.get("expect_status")
+        if (status in expected) if expected else status < 400:
+            return response_time, None
+        return None, f"HTTP {status}"
+
+
+@register
+class HttpsProbe(HttpProbe):
+    """HTTP-запрос HEAD по TLS."""
+
+    name = "https"
+    default_port = 443
+    tls = True
+
+
+@register
+class IcmpProbe(Probe):
+    """
+    Эхо-запрос ICMP. Проверки, запущенные почти одновременно (в пределах BATCH_WINDOW),
+    объединяются в один проход icmp_sweep через общий сокет. Запросы уходят сразу на все адреса
+    хоста (IPv4 и IPv6), засчитывается самый быстрый ответ. Если ICMP-сокет открыть нельзя
+    (нет прав), используется ping3 в пуле потоков.
+    """
+
+    name = "icmp"
+    timeout = 10
+    uses_connection = False
+
+    BATCH_WINDOW = 0.05
+
+    def __init__(self):
+        self._batch = None  # адрес -> [(таймаут, future)]
+
+    def port(self, target):
+        return None
+
+    async def check(self, target, timeout, addresses):
+        loop = asyncio.get_event_loop()
+        if self._batch is None:
+            self._batch = {}
+            loop.call_later(self.BATCH_WINDOW, lambda: loop.create_task(self._flush()))
+        futures = []
+        for _, address in addresses:
+            futures.append(loop.create_future())
+            self._batch.setdefault(address, []).append((timeout, futures[-1]))
+        results = await asyncio.gather(*futures)
+        response_times = [response_time for response_time, _ in results if response_time is not None]
+        if response_times:
+            return min(response_times), None
+        return results[0]
+
+    async def _flush(self):
+        batch, self._batch = self._batch, None
+        timeouts = {host: max(timeout for timeout, _ in waiters) for host, waiters in batch.items()}
+        try:
+            try:
+                response_times = await icmp_sweep(list(timeouts), timeout=timeouts)
+            except OSError as e:
+                if ping is None:
+                    raise
+                logging.warning(f"ICMP-сокет недоступен ({e}), проверяем через ping3")
+                response_times = await self._ping3(timeouts)
+        except Exception as e:
+            for waiters in batch.values():
+                for _, future in waiters:
+                    if not future.done():
+                        future.set_result((None, str(e) or e.__class__.__name__))
+            return
+
+        for host, waiters in batch.items():
+            response_time = response_times.get(host)
+            for timeout, future in waiters:
+                if future.done():
+                    continue
+                if response_time is not None and response_time <= timeout * 1000:
+                    future.set_result((round(response_time), None))
+                else:
+                    future.set_result((None, f"нет эхо-ответа за {timeout:.1f} с"))
+
+    @staticmethod
+    async def _ping3(timeouts):
+        loop = asyncio.get_event_loop()
+
+        async def one(host, timeout):
+            try:
+                # ping3 блокирующий, поэтому выполняем его в пуле потоков
+                seconds = await loop.run_in_executor(None, lambda: ping(host, timeout=timeout))
+            except Exception:
+                seconds = None
+            return host, seconds * 1000 if seconds else None
+
+        return dict(await asyncio.gather(*(one(host, timeout) for host, timeout in timeouts.items())))
+
+
+class ProbeRunner:
+    """
+    Запуск проверок любых типов в одном event loop: экземпляры типов проверок общие,
+    число одновременных соединений ограничено (ICMP в ограничение не входит — у него один сокет).
+    Имена хостов резолвятся через общий DnsCache один раз на проверку, а не на каждую попытку.
+    active и peak — число попыток в работе сейчас и максимум с запуска.
+    """
+
+    def __init__(self, concurrency=100, resolver=None):
+        self.concurrency = concurrency
+        self.resolver = resolver if resolver is not None else DnsCache()
+        self.probes = {name: probe_class() for name, probe_class in PROBES.items()}
+        self.active = 0
+        self.peak = 0
+        self._semaphore = None  # Создается лениво, уже внутри работающего event loop
+
+    @property
+    def semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def probe_for(self, target):
+        return self.probes[target.probe]
+
+    def max_timeout(self, target):
+        """Верхняя граница таймаута попытки для цели: поле "timeout" или значение типа проверки."""
+        return float(target.get("timeout") or self.probe_for(target).timeout)
+
+    async def check(self, target, timeout, addresses):
+        probe = self.probe_for(target)
+        if not probe.uses_connection:
+            return await self._check(probe, target, timeout, addresses)
+        async with self.semaphore:
+            return await self._check(probe, target, timeout, addresses)
+
+    async def _check(self, probe, target, timeout, addresses):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            return await probe.check(target, timeout, addresses)
+        finally:
+            self.active -= 1
+
+    async def check_with_retries(self, target, timeout, retries=3, budget=None):
+        """
+        Проверка цели с повторами (retry_parallel). Возвращает (response_time, error, число попыток).
+        Если имя хоста не резолвится, бросает ResolveError: это не ошибка подключения, попытки не делаются.
+        """
+        addresses = await self.resolver.resolve(target.host)
+        return await retry_parallel(lambda: self.check(target, timeout, addresses), retries, budget)
+
+    async def check_target(self, target, timeout, retries=3, budget=None):
+        """
+        Проверка цели по расписанию: check_with_retries с разбором ошибки резолва.
+        Возвращает (response_time, error, текст ошибки, число попыток), error — None,
+        "dns" (не удалось определить адрес) или "probe" (проверка не прошла).
+        """
+        try:
+            response_time, detail, attempts = await self.check_with_retries(target, timeout, retries, budget)
+        except ResolveError as e:
+            return None, "dns", str(e), 0
+        if response_time is not None:
+            return response_time, None, None, attempts
+        return None, "probe", detail, attempts
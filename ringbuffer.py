@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+import math
+import struct
+from array import array
+
+# Заголовок сериализованного буфера: емкость, индекс самой старой записи, число записей
+HEADER = struct.Struct('<III')
+
+# Байт на проверку: время (double), статус (uint8), время отклика (float32)
+SAMPLE_SIZE = 8 + 1 + 4
+
+# Начальный размер массивов; дальше они растут вдвое, пока не достигнут емкости
+MIN_ALLOCATION = 16
+
+
+class SampleRing:
+    """
+    Кольцевой буфер проверок одного сервера емкостью до capacity записей.
+
+    Данные лежат в трех типизированных массивах: время проверки (double, 8 байт),
+    статус (uint8, 1 байт) и время отклика в мс (float32, 4 байта, NaN — нет данных).
+    Итого ~13 байт на проверку против 100+ байт на кортеж в deque.
+    Добавление и вытеснение старейшей записи — O(1) (амортизированно: массивы растут вдвое
+    по мере заполнения, память занимают только накопленные проверки, а не вся емкость).
+
+    Счетчики ok_count / fail_count обновляются при добавлении и вытеснении,
+    поэтому доступность по содержимому буфера считается за O(1).
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.timestamps = array('d')
+        self.statuses = array('B')
+        self.response_times = array('f')
+        self.allocated = 0  # Текущая длина массивов (не больше capacity)
+        self.head = 0  # Физический индекс самой старой записи
+        self.size = 0
+        self.ok_count = 0  # Успешных проверок в буфере
+        self.fail_count = 0  # Неудачных проверок в буфере
+
+    def __len__(self):
+        return self.size
+
+    def _index(self, i):
+        """Переводит логический индекс (0 — самая старая запись, -1 — самая новая) в физический."""
+        if i < 0:
+            i += self.size
+        if not 0 <= i < self.size:
+            raise IndexError('SampleRing index out of range')
+        return (self.head + i) % self.allocated
+
+    def __getitem__(self, i):
+        j = self._index(i)
+        rtt = self.response_times[j]
+        return self.timestamps[j], bool(self.statuses[j]), None if math.isnan(rtt) else rtt
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield self[i]
+
+    def append(self, timestamp, status, response_time=None):
+        """
+        Добавляет проверку. Если буфер заполнен, вытесняет самую старую
+        и возвращает ее (timestamp, status, response_time), иначе None.
+        """
+        evicted = None
+        if self.size == self.capacity:
+            evicted = self.popleft()
+        elif self.size == self.allocated:
+            self._grow()
+        j = (self.head + self.size) % self.allocated
+        self.timestamps[j] = timestamp
+        self.statuses[j] = 1 if status else 0
+        self.response_times[j] = math.nan if response_time is None else response_time
+        self.size += 1
+        if status:
+            self.ok_count += 1
+        else:
+            self.fail_count += 1
+        return evicted
+
+    def _grow(self):
+        """Удлиняет массивы (вдвое, в пределах capacity), переставив записи в логический порядок."""
+        if self.head:
+            for name in ('timestamps', 'statuses', 'response_times'):
+                column = getattr(self, name)
+                setattr(self, name, column[self.head:] + column[:self.head])
+            self.head = 0
+        extra = min(self.capacity, max(MIN_ALLOCATION, 2 * self.allocated)) - self.allocated
+        self.timestamps.frombytes(bytes(8 * extra))
+        self.statuses.frombytes(bytes(extra))
+        self.response_times.frombytes(bytes(4 * extra))
+        self.allocated += extra
+
+    def popleft(self):
+        """Удаляет и возвращает самую старую проверку."""
+        if not self.size:
+            raise IndexError('pop from an empty SampleRing')
+        sample = self[0]
+        self.head = (self.head + 1) % self.allocated
+        self.size -= 1
+        if sample[1]:
+            self.ok_count -= 1
+        else:
+            self.fail_count -= 1
+        return sample
+
+    def trim(self, oldest_timestamp):
+        """Вытесняет проверки старше oldest_timestamp. Возвращает число удаленных записей."""
+        removed = 0
+        while self.size and self.timestamps[self.head] < oldest_timestamp:
+            self.popleft()
+            removed += 1
+        return removed
+
+    def availability(self):
+        """Процент успешных проверок в буфере (None, если проверок нет)."""
+        if not self.size:
+            return None
+        return round(self.ok_count / self.size * 100, 2)
+
+    def bisect_left(self, timestamp):
+        """
+        Логический индекс первой проверки с временем >= timestamp (бинарный поиск, O(log n)).
+        Проверки в буфере упорядочены по времени.
+        """
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.timestamps[(self.head + mid) % self.allocated] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def timestamp(self, i):
+        """Время проверки с логическим индексом i."""
+        return self.timestamps[self._index(i)]
+
+    def status_bytes(self, start, stop):
+        """Статусы проверок [start, stop) одним bytes-объектом (b'\\x01' — успех, b'\\x00' — неудача)."""
+        if start >= stop:
+            return b''
+        begin = (self.head + start) % self.allocated
+        end = begin + (stop - start)
+        if end <= self.allocated:
+            return self.statuses[begin:end].tobytes()
+        return self.statuses[begin:].tobytes() + self.statuses[:end - self.allocated].tobytes()
+
+    def range(self, start, stop):
+        """Проверки с логическими индексами [start, stop) (от старых к новым)."""
+        return [self[i] for i in range(max(start, 0), min(stop, self.size))]
+
+    def tail(self, n):
+        """Последние n проверок (от старых к новым)."""
+        return self.range(self.size - n, self.size)
+
+    def dump(self):
+        """
+        Сериализация только накопленных проверок в логическом порядке, без копирования:
+        список буферов (заголовок + memoryview кусков массивов), который можно сразу
+        отдать в file.writelines().
+        """
+        buffers = [HEADER.pack(self.capacity, 0, self.size)]
+        first = min(self.size, self.allocated - self.head)
+        for column in (self.timestamps, self.statuses, self.response_times):
+            view = memoryview(column).cast('B')
+            itemsize = column.itemsize
+            buffers.append(view[self.head * itemsize:(self.head + first) * itemsize])
+            if first < self.size:
+                buffers.append(view[:(self.size - first) * itemsize])
+        return buffers
+
+    @staticmethod
+    def dump_size(size):
+        """Размер сериализованного буфера из size проверок в байтах."""
+        return HEADER.size + SAMPLE_SIZE * size
+
+    @classmethod
+    def load(cls, buffer):
+        """
+        Восстанавливает буфер из результата dump() (bytes или memoryview). Читает и старый
+        формат, где массивы записаны на всю емкость: число записей определяется по длине буфера.
+        """
+        capacity, head, size = HEADER.unpack_from(buffer)
+        stored = (len(buffer) - HEADER.size) // SAMPLE_SIZE
+        ring = cls(capacity)
+        offset = HEADER.size
+        for name in ('timestamps', 'statuses', 'response_times'):
+            column = getattr(ring, name)
+            column.frombytes(buffer[offset:offset + column.itemsize * stored])
+            offset += column.itemsize * stored
+            if head or size < stored:
+                # Старый формат: оставляем только занятую часть, в логическом порядке
+                column = column[head:] + column[:head]
+                del column[size:]
+            setattr(ring, name, column)
+        ring.allocated = size
+        ring.size = size
+        ring.ok_count = ring.statuses.count(1)
+        ring.fail_count = size - ring.ok_count
+        return ring
+
+    def resized(self, capacity):
+        """Копия буфера с другой емкостью (при нехватке места остаются самые новые проверки)."""
+        ring = SampleRing(capacity)
+        for sample in self.tail(capacity):
+            ring.append(*sample)
+        return ring
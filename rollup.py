@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+
+import math
+import struct
+from array import array
+
+from latency_hist import LatencyHistogram
+
+# Поля закрытой корзины и типы массивов, в которых они хранятся
+BUCKET_FIELDS = (
+    ('start', 'd'),     # Начало корзины (unix-время)
+    ('count', 'I'),     # Всего проверок
+    ('failures', 'I'),  # Неудачных проверок
+    ('rtt_min', 'f'),   # Задержка, мс (NaN — не было успешных проверок)
+    ('rtt_avg', 'f'),
+    ('rtt_max', 'f'),
+    ('rtt_p95', 'f'),
+)
+
+# Заголовок сериализованного кольца корзин: емкость, индекс самой старой корзины, число корзин
+HEADER = struct.Struct('<III')
+
+
+class Bucket:
+    """Открытая (текущая) корзина: накапливает проверки, пока не начнется следующий интервал."""
+
+    __slots__ = ('start', 'count', 'failures', 'rtt_min', 'rtt_max', 'rtt_sum', 'histogram')
+
+    def __init__(self, start):
+        self.start = start
+        self.count = 0
+        self.failures = 0
+        self.rtt_min = math.inf
+        self.rtt_max = -math.inf
+        self.rtt_sum = 0.0
+        # Гистограмма задержек (для p95): память фиксирована при любом числе проверок в корзине
+        self.histogram = LatencyHistogram()
+
+    def add(self, status, response_time):
+        self.count += 1
+        if not status:
+            self.failures += 1
+        if response_time is not None:
+            self.rtt_min = min(self.rtt_min, response_time)
+            self.rtt_max = max(self.rtt_max, response_time)
+            self.rtt_sum += response_time
+            self.histogram.record(response_time)
+
+    def row(self):
+        """Корзина в виде кортежа полей BUCKET_FIELDS."""
+        rtt_count = self.histogram.total
+        if not rtt_count:
+            return self.start, self.count, self.failures, math.nan, math.nan, math.nan, math.nan
+        return (self.start, self.count, self.failures, self.rtt_min,
+                self.rtt_sum / rtt_count, self.rtt_max, self.histogram.percentile(95))
+
+    def to_json(self):
+        rtt_min = self.rtt_min if self.histogram.total else None
+        rtt_max = self.rtt_max if self.histogram.total else None
+        return [self.start, self.count, self.failures, rtt_min, rtt_max, self.rtt_sum, self.histogram.to_json()]
+
+    @classmethod
+    def from_json(cls, data):
+        if len(data) == 4:
+            # Старый формат: [start, count, failures, список задержек]
+            start, count, failures, rtts = data
+            bucket = cls(start)
+            for rtt in rtts:
+                bucket.add(True, rtt)
+            bucket.count = count
+            bucket.failures = failures
+            return bucket
+        start, count, failures, rtt_min, rtt_max, rtt_sum, histogram = data
+        bucket = cls(start)
+        bucket.count = count
+        bucket.failures = failures
+        bucket.rtt_min = rtt_min if rtt_min is not None else math.inf
+        bucket.rtt_max = rtt_max if rtt_max is not None else -math.inf
+        bucket.rtt_sum = rtt_sum
+        bucket.histogram = LatencyHistogram.from_json(histogram)
+        return bucket
+
+
+class BucketRing:
+    """
+    Кольцо закрытых корзин емкостью до capacity в типизированных массивах (32 байта на корзину).
+    Массивы растут по мере закрытия корзин: у цели с короткой историей память занимают
+    только ее корзины, а не весь срок хранения.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.columns = [array(code) for _, code in BUCKET_FIELDS]
+        self.head = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _physical(self, i):
+        return (self.head + i) % len(self.columns[0])
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.size
+        j = self._physical(i)
+        return tuple(column[j] for column in self.columns)
+
+    def _rotate(self):
+        """Переставляет корзины в логический порядок (head = 0), чтобы массивы можно было дописывать в конец."""
+        if self.head:
+            self.columns = [column[self.head:] + column[:self.head] for column in self.columns]
+            self.head = 0
+
+    def append(self, row):
+        allocated = len(self.columns[0])
+        if self.size < allocated:
+            j = self._physical(self.size)
+            for column, value in zip(self.columns, row):
+                column[j] = value
+            self.size += 1
+        elif allocated < self.capacity:
+            self._rotate()
+            for column, value in zip(self.columns, row):
+                column.append(value)
+            self.size += 1
+        else:
+            # Кольцо заполнено — новая корзина замещает самую старую
+            j = self.head
+            for column, value in zip(self.columns, row):
+                column[j] = value
+            self.head = (self.head + 1) % self.capacity
+
+    def trim(self, oldest_start):
+        """Удаляет корзины, начавшиеся раньше oldest_start."""
+        starts = self.columns[0]
+        while self.size and starts[self.head] < oldest_start:
+            self.head = (self.head + 1) % len(starts)
+            self.size -= 1
+
+    def bisect_left(self, timestamp):
+        """Логический индекс первой корзины с началом >= timestamp."""
+        starts = self.columns[0]
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if starts[self._physical(mid)] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def range(self, start, stop):
+        return [self[i] for i in range(max(start, 0), min(stop, self.size))]
+
+    def dump(self):
+        """
+        Сериализация только заполненных корзин в логическом порядке: заголовок + по столбцу
+        (memoryview без копирования; у перекрученного кольца — два куска на столбец).
+        """
+        buffers = [HEADER.pack(self.capacity, 0, self.size)]
+        if not self.size:
+            return buffers
+        allocated = len(self.columns[0])
+        first = min(self.size, allocated - self.head)
+        for column in self.columns:
+            view = memoryview(column).cast('B')
+            itemsize = column.itemsize
+            buffers.append(view[self.head * itemsize:(self.head + first) * itemsize])
+            if first < self.size:
+                buffers.append(view[:(self.size - first) * itemsize])
+        return buffers
+
+    @staticmethod
+    def dump_size(size):
+        """Размер dump() кольца из size корзин."""
+        return HEADER.size + sum(array(code).itemsize for _, code in BUCKET_FIELDS) * size
+
+    @classmethod
+    def load(cls, buffer):
+        """
+        Восстанавливает кольцо из dump(). Читает и старый формат, где столбцы записаны
+        на всю емкость: число записанных корзин определяется по длине буфера.
+        """
+        capacity, head, size = HEADER.unpack_from(buffer)
+        stored = (len(buffer) - HEADER.size) // (BucketRing.dump_size(1) - HEADER.size)
+        ring = cls(capacity)
+        offset = HEADER.size
+        for i, (_, code) in enumerate(BUCKET_FIELDS):
+            column = array(code)
+            length = column.itemsize * stored
+            column.frombytes(buffer[offset:offset + length])
+            if stored:
+                # Только заполненные корзины, в логическом порядке
+                order = [(head + k) % stored for k in range(size)]
+                column = array(code, (column[j] for j in order)) if head or size < stored else column
+            ring.columns[i] = column
+            offset += length
+        ring.size = size
+        return ring
+
+
+class RollupTier:
+    """Один уровень агрегации: корзины по resolution секунд, хранятся retention секунд."""
+
+    def __init__(self, name, resolution, retention):
+        self.name = name
+        self.resolution = resolution
+        self.retention = retention
+        self.capacity = int(retention // resolution)
+        self.rings = {}  # ip -> BucketRing закрытых корзин
+        self.open = {}  # ip -> открытая Bucket
+
+    def add(self, ip, timestamp, status, response_time):
+        start = timestamp - timestamp % self.resolution
+        bucket = self.open.get(ip)
+        if bucket is not None and start > bucket.start:
+            # Начался новый интервал — закрываем текущую корзину
+            ring = self.rings.get(ip)
+            if ring is None:
+                ring = self.rings[ip] = BucketRing(self.capacity)
+            ring.append(bucket.row())
+            ring.trim(timestamp - self.retention)
+            bucket = None
+        if bucket is None:
+            bucket = self.open[ip] = Bucket(start)
+        bucket.add(status, response_time)
+
+    def select(self, ip, start, end):
+        """Корзины сервера, начавшиеся в [start, end), включая текущую открытую."""
+        rows = []
+        ring = self.rings.get(ip)
+        if ring is not None:
+            rows = ring.range(ring.bisect_left(start), ring.bisect_left(end))
+        bucket = self.open.get(ip)
+        if bucket is not None and start <= bucket.start < end:
+            rows.append(bucket.row())
+        return rows
+
+
+class RollupStore:
+    """
+    Многоуровневое хранилище агрегатов истории проверок (например, 1 мин / 1 ч / 1 день).
+
+    Каждая проверка сразу попадает во все уровни, у каждого уровня свой срок хранения.
+    Для запроса за период выбирается самый дешевый уровень, покрывающий период:
+    самый детальный, у которого и срок хранения достаточен, и корзин в окне не больше max_buckets.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = [RollupTier(name, resolution, retention) for name, resolution, retention in tiers]
+
+    def add(self, ip, timestamp, status, response_time=None):
+        for tier in self.tiers:
+            tier.add(ip, timestamp, status, response_time)
+
+    def remove(self, ip):
+        """Удаляет все агрегаты сервера."""
+        for tier in self.tiers:
+            tier.rings.pop(ip, None)
+            tier.open.pop(ip, None)
+
+    def pick_tier(self, start, now, max_buckets=2000):
+        window = now - start
+        for tier in self.tiers:
+            if tier.retention >= window and window / tier.resolution <= max_buckets:
+                return tier
+        return self.tiers[-1]
+
+    def select(self, ip, start, end, max_buckets=2000):
+        """Возвращает (уровень, список корзин) за период [start, end)."""
+        tier = self.pick_tier(start, end, max_buckets)
+        return tier, tier.select(ip, start, end)
+
+    def dump(self):
+        """
+        Сериализация: (заголовок для JSON, список буферов).
+        В заголовке — открытые корзины и размеры колец, кольца — бинарными буферами.
+        """
+        header = []
+        buffers = []
+        for tier in self.tiers:
+            rings = []
+            for ip, ring in tier.rings.items():
+                buffers.extend(ring.dump())
+                rings.append([ip, BucketRing.dump_size(len(ring))])
+            header.append({
+                "name": tier.name,
+                "rings": rings,
+                "open": {ip: bucket.to_json() for ip, bucket in tier.open.items()},
+            })
+        return header, buffers
+
+    def load(self, header, view):
+        """Восстанавливает уровни из dump(); view — memoryview бинарной части. Возвращает число прочитанных байт."""
+        tiers = {tier.name: tier for tier in self.tiers}
+        offset = 0
+        for tier_header in header:
+            tier = tiers.get(tier_header["name"])
+            for ip, size in tier_header["rings"]:
+                if tier is not None:
+                    ring = BucketRing.load(view[offset:offset + size])
+                    if ring.capacity != tier.capacity:
+                        resized = BucketRing(tier.capacity)
+                        for row in ring.range(0, len(ring)):
+                            resized.append(row)
+                        ring = resized
+                    tier.rings[ip] = ring
+                offset += size
+            if tier is not None:
+                tier.open = {ip: Bucket.from_json(data) for ip, data in tier_header["open"].items()}
+        return offset
+
+
+def summarize(rows):
+    """
+    Сводка по списку корзин: всего проверок, неудачных, доступность, средняя/максимальная
+    задержка и число корзин, в которых были неудачные проверки.
+    """
+    total = sum(row[1] for row in rows)
+    failed = sum(row[2] for row in rows)
+    weighted = [(row[4], row[1] - row[2]) for row in rows if not math.isnan(row[4])]
+    rtt_weight = sum(weight for _, weight in weighted)
+    maxima = [row[5] for row in rows if not math.isnan(row[5])]
+    return {
+        "total": total,
+        "successful": total - failed,
+        "failed": failed,
+        "availability": round((total - failed) / total * 100, 2) if total else None,
+        "rtt_avg": sum(avg * weight for avg, weight in weighted) / rtt_weight if rtt_weight else None,
+        "rtt_max": max(maxima) if maxima else None,
+        "failed_buckets": sum(1 for row in rows if row[2]),
+    }
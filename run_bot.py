@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+# Точка входа бота: python run_bot.py
+#
+# Воркеры проверок (shard.py) и рендера графиков (graph_render.py) запускаются методом spawn и
+# заново импортируют главный модуль процесса. Главный модуль — этот файл, а bot_port (бот, диспетчер,
+# очереди, журнал, метрики, matplotlib и aiogram) импортируется только в основном процессе.
+
+if __name__ == "__main__":
+    import bot_port
+    bot_port.main()
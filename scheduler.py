@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import heapq
+import logging
+import random
+from collections import deque
+
+
+class Job:
+    """Периодическая задача планировщика."""
+
+    def __init__(self, key, interval, func, phase):
+        self.key = key
+        self.interval = interval
+        self.func = func
+        self.phase = phase
+        self.due = None  # Следующий плановый запуск (время loop.time())
+        self.task = None  # Текущий запуск
+        self.runs = 0
+        self.overruns = 0  # Пропущенные запуски: предыдущий еще не закончился
+        self.missed = 0  # Пропущенные периоды: планировщик отстал больше чем на интервал
+
+
+class Scheduler:
+    """
+    Планировщик периодических проверок на монотонных часах event loop.
+
+    - Время следующего запуска считается от планового, а не от фактического, поэтому период не «плывет».
+    - У каждой задачи свой интервал и своя фаза (jitter) внутри интервала — проверки
+      разнесены по периоду, а не стартуют все в одну секунду.
+    - Если предыдущий запуск задачи еще идет, новый пропускается и учитывается как overrun,
+      запуски не накапливаются.
+    - Для каждого запуска измеряется задержка относительно плана (lag).
+    """
+
+    def __init__(self, jitter=True, lag_history=1000):
+        self.jitter = jitter
+        self.jobs = {}
+        self._heap = []
+        self._counter = 0
+        self._wakeup = None
+        self.lags = deque(maxlen=lag_history)  # Последние задержки запуска, секунды
+        self.max_lag = 0.0
+
+    def add(self, key, interval, func, phase=None):
+        """
+        Добавляет (или заменяет) задачу key: корутинная функция func без аргументов, запускаемая
+        каждые interval секунд. phase — смещение первого запуска; по умолчанию — стабильное
+        псевдослучайное значение в пределах интервала.
+        """
+        if phase is None:
+            phase = random.Random(str(key)).uniform(0, interval) if self.jitter else 0.0
+        old = self.jobs.get(key)
+        self.remove(key)
+        job = Job(key, interval, func, phase)
+        if old is not None:
+            # Идущий запуск заменяемой задачи: пока он не закончится, новый не стартует (overrun)
+            job.task = old.task
+        self.jobs[key] = job
+        if self._wakeup is not None:
+            self._schedule(job, asyncio.get_event_loop().time() + phase)
+        return job
+
+    def remove(self, key):
+        """Убирает задачу; уже идущий запуск доводится до конца."""
+        job = self.jobs.pop(key, None)
+        if job is not None:
+            job.due = None  # Запись в куче станет недействительной
+
+    def _schedule(self, job, due):
+        job.due = due
+        self._counter += 1
+        heapq.heappush(self._heap, (due, self._counter, job))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def lag_stats(self):
+        """Сводка задержек запуска: последняя, средняя, максимальная (секунды) и число пропусков."""
+        lags = list(self.lags)
+        return {
+            "last": lags[-1] if lags else 0.0,
+            "avg": sum(lags) / len(lags) if lags else 0.0,
+            "max": self.max_lag,
+            "overruns": sum(job.overruns for job in self.jobs.values()),
+            "missed": sum(job.missed for job in self.jobs.values()),
+        }
+
+    async def run(self):
+        """Основной цикл планировщика (запускается как фоновая задача)."""
+        loop = asyncio.get_event_loop()
+        self._wakeup = asyncio.Event()
+        start = loop.time()
+        for job in self.jobs.values():
+            self._schedule(job, start + job.phase)
+
+        while True:
+            self._wakeup.clear()
+            # Отбрасываем записи удаленных и перепланированных задач
+            while self._heap and self._heap[0][2].due != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            due, _, job = self._heap[0]
+            delay = due - loop.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    continue  # Набор задач изменился — пересчитываем ближайший запуск
+                except asyncio.TimeoutError:
+                    pass
+
+            heapq.heappop(self._heap)
+            if self.jobs.get(job.key) is not job or job.due != due:
+                continue
+
+            now = loop.time()
+            lag = now - due
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+            if job.task is not None and not job.task.done():
+                job.overruns += 1
+                logging.warning(f"Планировщик: проверка {job.key} еще выполняется, запуск пропущен")
+            else:
+                job.runs += 1
+                job.task = loop.create_task(self._run_job(job))
+
+            # Следующий запуск — от планового времени; пропущенные целиком периоды не догоняем
+            next_due = due + job.interval
+            if next_due <= now:
+                skipped = int((now - next_due) // job.interval) + 1
+                job.missed += skipped
+                next_due += skipped * job.interval
+            self._schedule(job, next_due)
+
+    async def _run_job(self, job):
+        try:
+            await job.func()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Планировщик: ошибка в задаче {job.key}: {e}")
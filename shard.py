@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import signal
+import struct
+import tempfile
+import time
+import zlib
+
+from inventory import Target
+from probes import ProbeRunner
+from scheduler import Scheduler
+from tcp_probe import RetryBudget
+
+# Кадр протокола: длина (4 байта, без учета самого поля), тип (1 байт), данные
+FRAME_HEADER = struct.Struct('!IB')
+JSON_FRAME = b'J'  # Команда или служебное сообщение в JSON
+RESULTS_FRAME = b'R'  # Пачка результатов проверок
+
+# Заголовок пачки результатов: число записей, попыток в работе сейчас, максимум попыток в работе
+BATCH_HEADER = struct.Struct('<III')
+# Результат одной проверки: слот цели, время проверки, время ответа (мс, NaN — нет ответа),
+# длительность проверки (с), код ошибки
+RECORD = struct.Struct('<IdffB')
+
+# Коды ошибок в записи результата и обратно
+ERROR_CODES = {None: 0, "probe": 1, "dns": 2}
+ERROR_NAMES = {code: name for name, code in ERROR_CODES.items()}
+
+# Воркер отправляет накопленные результаты раз в BATCH_INTERVAL секунд или как только их BATCH_SIZE
+BATCH_INTERVAL = 0.2
+BATCH_SIZE = 512
+
+# Как часто проверять процессы воркеров (секунды): завершившийся воркер перезапускается
+# не позже чем через WATCH_INTERVAL, не подключившийся за CONNECT_TIMEOUT — завершается и перезапускается
+WATCH_INTERVAL = 1.0
+CONNECT_TIMEOUT = 30
+
+
+def _frame(kind, payload):
+    return FRAME_HEADER.pack(len(payload) + 1, ord(kind)) + payload
+
+
+def json_frame(message):
+    return _frame(JSON_FRAME, json.dumps(message, separators=(",", ":")).encode())
+
+
+async def read_frame(reader, max_size=None):
+    """
+    Следующий кадр (тип, данные) или (None, None), если соединение закрыто
+    (или кадр длиннее max_size — для еще не аутентифицированных соединений).
+    """
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+        length, kind = FRAME_HEADER.unpack(header)
+        if length < 1 or (max_size is not None and length > max_size):
+            return None, None
+        return bytes([kind]), await reader.readexactly(length - 1)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None, None
+
+
+def decode_results(payload, slot_ids):
+    """
+    Разбор пачки результатов (кадр RESULTS_FRAME). slot_ids — слот -> id цели, результаты
+    неизвестных слотов (цель удалили, пока шла проверка) пропускаются.
+    Возвращает (попыток в работе, максимум попыток в работе, [результаты]).
+    """
+    count, active, peak = BATCH_HEADER.unpack_from(payload)
+    offset = BATCH_HEADER.size + count * RECORD.size
+    details = json.loads(payload[offset:]) if len(payload) > offset else {}
+    results = []
+    for index, (slot, timestamp, response_time, duration, code) in enumerate(RECORD.iter_unpack(payload[BATCH_HEADER.size:offset])):
+        target_id = slot_ids.get(slot)
+        if target_id is None:
+            continue
+        error = ERROR_NAMES.get(code, "probe")
+        results.append({
+            "id": target_id,
+            "status": error is None,
+            "response_time": None if math.isnan(response_time) else round(response_time, 2),
+            "error": error,
+            "timestamp": timestamp,
+            "duration": duration,
+            "detail": details.get(str(index)),  # [попыток, таймаут, текст ошибки] для неудачных
+        })
+    return active, peak, results
+
+
+class _Shard:
+    """Состояние одного воркера на стороне координатора."""
+
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.started = None  # Время запуска процесса (loop.time())
+        self.writer = None
+        self.active = 0  # Попыток проверки в работе (из последней пачки)
+        self.peak = 0
+        self.stats = {}  # Последний отчет воркера (op "stats")
+
+
+class ShardPool:
+    """
+    Шардированные проверки: цели распределяются по workers процессам (по хешу id — набор целей
+    шарда не меняется при перезагрузке остальных целей), у каждого процесса свой event loop,
+    планировщик и ProbeRunner. Результаты приходят пачками по Unix-сокету в компактном
+    бинарном виде (RECORD, 21 байт на проверку) и передаются в on_results списком словарей
+    {"id", "status", "response_time", "error", "timestamp", "duration", "detail"} —
+    обработка статусов, хранение и Telegram остаются в процессе бота.
+
+    assign()/remove()/set_timeouts()/set_budget() можно вызывать и до start(): состояние
+    запоминается и целиком передается каждому воркеру при подключении (и после перезапуска упавшего).
+    """
+
+    def __init__(self, workers, concurrency=100, retries=3, on_results=None):
+        self.workers = workers
+        self.concurrency = concurrency
+        self.retries = retries
+        self.on_results = on_results
+        self.shards = [_Shard(index) for index in range(workers)]
+        self.targets = {}  # id -> Target
+        self.slots = {}  # id -> слот (номер цели в протоколе)
+        self.slot_ids = {}  # слот -> id
+        self.timeouts = {}  # id -> таймаут попытки
+        self.budget = None  # Запас повторов на цикл (на все шарды)
+        self.received = 0  # Принято результатов
+        self.batches = 0
+        self.restarts = 0
+        self._next_slot = 0
+        self._server = None
+        self._watchdog = None
+        self._dir = None
+        self._closing = False
+
+    def shard_of(self, target_id):
+        return self.shards[zlib.crc32(target_id.encode()) % self.workers]
+
+    @property
+    def active(self):
+        return sum(shard.active for shard in self.shards)
+
+    @property
+    def peak(self):
+        return sum(shard.peak for shard in self.shards)
+
+    async def start(self):
+        """Запускает Unix-сервер координатора и процессы-воркеры."""
+        self._dir = tempfile.mkdtemp(prefix="netmon-shards-")
+        self.path = os.path.join(self._dir, "shards.sock")
+        self._server = await asyncio.start_unix_server(self._serve, self.path)
+        for shard in self.shards:
+            self._spawn(shard)
+        self._watchdog = asyncio.ensure_future(self._watch())
+
+    def _spawn(self, shard):
+        # spawn: воркер не наследует event loop, потоки и сокеты бота
+        context = multiprocessing.get_context('spawn')
+        shard.process = context.Process(
+            target=worker_main,
+            args=(self.path, shard.index, self.concurrency, self.retries),
+            name=f"probe-shard-{shard.index}",
+            daemon=True,
+        )
+        shard.process.start()
+        shard.started = asyncio.get_event_loop().time()
+
+    async def _watch(self):
+        """
+        Следит за процессами воркеров: завершившийся (в том числе до подключения к координатору)
+        перезапускается, запущенный, но не подключившийся за CONNECT_TIMEOUT — завершается.
+        """
+        loop = asyncio.get_event_loop()
+        while not self._closing:
+            await asyncio.sleep(WATCH_INTERVAL)
+            for shard in self.shards:
+                if self._closing:
+                    break
+                if shard.process.exitcode is not None:
+                    self.restarts += 1
+                    logging.error(f"Воркер проверок {shard.index} завершился (код выхода {shard.process.exitcode}), перезапуск")
+                    self._spawn(shard)
+                elif shard.writer is None and loop.time() - shard.started > CONNECT_TIMEOUT:
+                    logging.error(f"Воркер проверок {shard.index} не подключился за {CONNECT_TIMEOUT} с")
+                    shard.process.terminate()  # Перезапуск — на следующем проходе
+
+    async def _serve(self, reader, writer):
+        kind, payload = await read_frame(reader)
+        if kind != JSON_FRAME:
+            writer.close()
+            return
+        shard = self.shards[json.loads(payload)["shard"]]
+        shard.writer = writer
+        process = shard.process
+        self._send_state(shard)
+        logging.info(f"Воркер проверок {shard.index} подключен, целей: {sum(1 for i in self.targets if self.shard_of(i) is shard)}")
+
+        while True:
+            kind, payload = await read_frame(reader)
+            if kind is None:
+                break
+            if kind == RESULTS_FRAME:
+                self._receive(shard, payload)
+            elif kind == JSON_FRAME:
+                shard.stats = json.loads(payload)
+                if shard.stats.get("denied"):
+                    logging.info(f"Воркер проверок {shard.index}: запас повторных попыток исчерпан, не выполнено повторов: {shard.stats['denied']}")
+
+        if shard.writer is writer:
+            shard.writer = None
+        writer.close()
+        if not self._closing and process.is_alive():
+            # Соединение потеряно, а процесс жив — завершаем его, перезапустит _watch()
+            logging.error(f"Воркер проверок {shard.index} отключился")
+            process.terminate()
+
+    def _receive(self, shard, payload):
+        shard.active, shard.peak, results = decode_results(payload, self.slot_ids)
+        self.received += len(results)
+        self.batches += 1
+        if results and self.on_results is not None:
+            try:
+                self.on_results(results)
+            except Exception as e:
+                logging.error(f"Ошибка при обработке результатов воркера {shard.index}: {e}")
+
+    def _send(self, shard, message):
+        if shard.writer is not None and not shard.writer.is_closing():
+            shard.writer.write(json_frame(message))
+
+    def _shard_budget(self):
+        return math.ceil(self.budget / self.workers) if self.budget is not None else None
+
+    def _send_state(self, shard):
+        """Полное состояние шарда: запас повторов, цели, таймауты."""
+        if self.budget is not None:
+            self._send(shard, {"op": "budget", "per_cycle": self._shard_budget()})
+        targets = [[self.slots[i], target.spec] for i, target in self.targets.items() if self.shard_of(i) is shard]
+        self._send(shard, {"op": "assign", "targets": targets})
+        self._send(shard, {"op": "timeouts", "timeouts": {
+            self.slots[i]: timeout for i, timeout in self.timeouts.items() if i in self.slots and self.shard_of(i) is shard
+        }})
+
+    def assign(self, target):
+        """Добавляет цель или обновляет ее параметры (проверка переносится в ее шард)."""
+        slot = self.slots.get(target.id)
+        if slot is None:
+            slot = self.slots[target.id] = self._next_slot
+            self.slot_ids[slot] = target.id
+            self._next_slot += 1
+        self.targets[target.id] = target
+        self._send(self.shard_of(target.id), {"op": "assign", "targets": [[slot, target.spec]]})
+
+    def remove(self, target_id):
+        slot = self.slots.pop(target_id, None)
+        if slot is None:
+            return
+        del self.slot_ids[slot]
+        self.targets.pop(target_id, None)
+        self.timeouts.pop(target_id, None)
+        self._send(self.shard_of(target_id), {"op": "remove", "slots": [slot]})
+
+    def set_timeouts(self, timeouts):
+        """Таймауты попыток по целям (адаптивные таймауты считает координатор)."""
+        self.timeouts = {target_id: timeout for target_id, timeout in timeouts.items() if target_id in self.slots}
+        per_shard = {shard.index: {} for shard in self.shards}
+        for target_id, timeout in self.timeouts.items():
+            per_shard[self.shard_of(target_id).index][self.slots[target_id]] = timeout
+        for shard in self.shards:
+            self._send(shard, {"op": "timeouts", "timeouts": per_shard[shard.index]})
+
+    def set_budget(self, per_cycle):
+        """Запас повторов на цикл на все шарды (делится поровну)."""
+        if per_cycle == self.budget:
+            return
+        self.budget = per_cycle
+        for shard in self.shards:
+            self._send(shard, {"op": "budget", "per_cycle": self._shard_budget()})
+
+    def refill(self):
+        """Новый цикл: воркеры восстанавливают запас повторов и присылают отчет (op "stats")."""
+        for shard in self.shards:
+            self._send(shard, {"op": "refill"})
+
+    async def close(self, timeout=5):
+        """Останавливает воркеры и сервер координатора."""
+        self._closing = True
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+        for shard in self.shards:
+            self._send(shard, {"op": "stop"})
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        for shard in self.shards:
+            if shard.process is None:
+                continue
+            while shard.process.is_alive() and loop.time() < deadline:
+                await asyncio.sleep(0.05)
+            if shard.process.is_alive():
+                shard.process.terminate()
+        if self._server is not None:
+            self._server.close()
+        if self._dir is not None:
+            shutil.rmtree(self._dir, ignore_errors=True)
+
+
+def worker_main(path, index, concurrency, retries):
+    """Точка входа процесса-воркера."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Остановкой управляет координатор
+
+    async def run():
+        reader, writer = await asyncio.open_unix_connection(path)
+        writer.write(json_frame({"op": "hello", "shard": index}))
+        await ProbeWorker(concurrency, retries).run(reader, writer)
+
+    asyncio.run(run())
+
+
+class ProbeWorker:
+    """
+    Исполнитель проверок по командам координатора (процесс шарда или удаленный агент):
+    свои планировщик и ProbeRunner, результаты — пачками RESULTS_FRAME.
+    """
+
+    def __init__(self, concurrency, retries):
+        self.retries = retries
+        self.runner = ProbeRunner(concurrency=concurrency)
+        self.scheduler = Scheduler()
+        self.budget = None
+        self.targets = {}  # слот -> Target
+        self.timeouts = {}  # слот -> таймаут попытки
+        self.records = bytearray()
+        self.count = 0
+        # Номер записи в пачке -> [попыток, таймаут, текст ошибки]: у одной цели в пачке
+        # может быть несколько неудачных проверок
+        self.details = {}
+        self.writer = None
+
+    async def run(self, reader, writer):
+        """Выполняет команды до "stop" или закрытия соединения (приветствие уже отправлено)."""
+        self.writer = writer
+        tasks = [asyncio.ensure_future(self.scheduler.run()), asyncio.ensure_future(self._flush_loop())]
+        try:
+            while True:
+                kind, payload = await read_frame(reader)
+                if kind is None:
+                    break  # Координатор завершился
+                message = json.loads(payload)
+                if message["op"] == "stop":
+                    break
+                self._handle(message)
+            self._flush()
+            await self.writer.drain()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.writer.close()
+
+    def _handle(self, message):
+        op = message["op"]
+        if op == "assign":
+            for slot, spec in message["targets"]:
+                target = Target(spec, {})
+                self.targets[slot] = target
+                self.scheduler.add(slot, target.interval, lambda slot=slot: self._check(slot))
+        elif op == "remove":
+            for slot in message["slots"]:
+                self.targets.pop(slot, None)
+                self.timeouts.pop(slot, None)
+                self.scheduler.remove(slot)
+        elif op == "timeouts":
+            self.timeouts = {int(slot): timeout for slot, timeout in message["timeouts"].items()}
+        elif op == "budget":
+            if self.budget is None:
+                self.budget = RetryBudget(message["per_cycle"])
+            self.budget.per_cycle = message["per_cycle"]
+        elif op == "refill":
+            denied = self.budget.refill() if self.budget is not None else 0
+            lag = self.scheduler.lag_stats()
+            self.writer.write(json_frame({
+                "op": "stats", "denied": denied, "targets": len(self.targets),
+                "lag_max": lag["max"], "skipped": lag["overruns"] + lag["missed"],
+            }))
+
+    async def _check(self, slot):
+        target = self.targets.get(slot)
+        if target is None:
+            return
+        timeout = self.timeouts.get(slot) or self.runner.max_timeout(target)
+        start = time.perf_counter()
+        response_time, error, detail, attempts = await self.runner.check_target(target, timeout, self.retries, self.budget)
+        self.records += RECORD.pack(
+            slot, time.time(), response_time if response_time is not None else math.nan,
+            time.perf_counter() - start, ERROR_CODES[error],
+        )
+        if error is not None:
+            self.details[self.count] = [attempts, timeout, detail]
+        self.count += 1
+        if self.count >= BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if not self.count:
+            return
+        payload = BATCH_HEADER.pack(self.count, self.runner.active, self.runner.peak) + bytes(self.records)
+        if self.details:
+            payload += json.dumps(self.details, separators=(",", ":")).encode()
+        self.writer.write(_frame(RESULTS_FRAME, payload))
+        self.records = bytearray()
+        self.count = 0
+        self.details = {}
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(BATCH_INTERVAL)
+            self._flush()
+            await self.writer.drain()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import socket
+
+from dns_cache import open_connection
+
+
+async def tcp_probe(host, port, timeout=5, addresses=None):
+    """
+    Неблокирующая проверка TCP-подключения к host:port.
+    addresses — уже известные адреса хоста [(family, address)] (DnsCache.resolve): тогда имя
+    не резолвится, а адреса пробуются параллельно (Happy Eyeballs).
+
+    Возвращает кортеж (response_time, error):
+    - response_time: время установки соединения в миллисекундах или None, если подключиться не удалось
+    - error: текст ошибки или None при успехе
+    """
+    loop = asyncio.get_event_loop()
+    start_time = loop.time()  # Засекаем время начала проверки
+    try:
+        # Дедлайн распространяется на всю попытку (резолв + connect)
+        connect = open_connection(addresses, port) if addresses else asyncio.open_connection(host, port)
+        reader, writer = await asyncio.wait_for(connect, timeout=timeout)
+    except asyncio.TimeoutError:
+        return None, f"timed out ({timeout} с)"
+    except (OSError, socket.error) as e:
+        return None, str(e) or e.__class__.__name__
+
+    response_time = round((loop.time() - start_time) * 1000)  # Время в мс
+
+    # Закрываем соединение, ошибки при закрытии нас не интересуют
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except Exception:
+        pass
+    return response_time, None
+
+
+class RetryBudget:
+    """
+    Общий на цикл проверок запас повторных попыток. При массовой аварии повторы быстро
+    заканчиваются, и цикл не растягивается на retries × timeout для каждой упавшей цели.
+    """
+
+    def __init__(self, per_cycle):
+        self.per_cycle = per_cycle
+        self.tokens = per_cycle
+        self.denied = 0  # Сколько повторов не выполнено из-за исчерпания запаса
+
+    def acquire(self, count):
+        """Берет до count повторов из запаса, возвращает сколько удалось взять."""
+        taken = min(count, self.tokens)
+        self.tokens -= taken
+        self.denied += count - taken
+        return taken
+
+    def refill(self):
+        """Начало нового цикла. Возвращает число отклоненных за прошлый цикл повторов."""
+        denied, self.denied = self.denied, 0
+        self.tokens = self.per_cycle
+        return denied
+
+
+async def retry_parallel(attempt, retries=3, budget=None):
+    """
+    Попытка с повторами: attempt — функция без аргументов, возвращающая корутину с результатом
+    (response_time, error). Если первая попытка не удалась, повторы (не больше retries - 1 и
+    сколько позволяет budget) запускаются сразу и параллельно, засчитывается первый успех.
+    Возвращает (response_time, error, число попыток).
+    """
+    response_time, error = await attempt()
+    if response_time is not None or retries <= 1:
+        return response_time, error, 1
+    extra = budget.acquire(retries - 1) if budget is not None else retries - 1
+    if not extra:
+        return None, error, 1
+
+    tasks = [asyncio.ensure_future(attempt()) for _ in range(extra)]
+    try:
+        for future in asyncio.as_completed(tasks):
+            response_time, error = await future
+            if response_time is not None:
+                return response_time, None, 1 + extra
+    finally:
+        for task in tasks:
+            task.cancel()
+    return None, error, 1 + extra
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+from agent import SILENT_INTERVALS, Quorum
+from inventory import Target
+
+
+def make_target(vantage, quorum=None):
+    spec = {"id": "web", "host": "10.0.0.1", "port": 80, "interval": 10, "vantage": vantage}
+    if quorum:
+        spec["quorum"] = quorum
+    return Target(spec, {})
+
+
+def result(status, timestamp=1.0):
+    return {"id": "web", "status": status, "response_time": 5.0 if status else None, "error": None if status else "probe", "timestamp": timestamp}
+
+
+def test_single_down_vote_keeps_previous_decision():
+    target = make_target(["local", "fra"])
+    quorum = Quorum()
+    assert quorum.report(target, "local", result(True)) == []
+    assert [d["status"] for d in quorum.report(target, "fra", result(True))] == [True]
+    # fra молчит: раунды из одного голоса local не набирают кворум «недоступна»
+    quorum.report(target, "local", result(False))
+    decisions = quorum.report(target, "local", result(False))
+    assert [d["status"] for d in decisions] == [True]
+
+
+def test_silent_points():
+    target = make_target(["local", "fra"])
+    quorum = Quorum()
+    now = 1000.0
+    assert quorum.silent(target, now) == []
+    quorum.seen[target.id]["local"] = now + SILENT_INTERVALS * target.interval
+    later = now + SILENT_INTERVALS * target.interval + 1
+    assert quorum.silent(target, later) == ["fra"]
+    quorum.forget(target.id)
+    assert quorum.silent(target, later) == []
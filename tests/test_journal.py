@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import json
+
+from journal import StatusJournal
+
+
+def make_journal(tmp_path):
+    return StatusJournal(str(tmp_path / "status.snapshot"), str(tmp_path / "status.journal"))
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.load()
+    journal.append([["10.0.0.1", 1.0, True, 5.0], ["10.0.0.1", 2.0, False, None]])
+    journal.close()
+    # Падение посреди записи: последняя строка оборвана
+    with open(journal.journal_path, "ab") as file:
+        file.write(b'["10.0.0.1",3.0,tr')
+
+    journal = make_journal(tmp_path)
+    _, records = journal.load()
+    assert records == [["10.0.0.1", 1.0, True, 5.0], ["10.0.0.1", 2.0, False, None]]
+    # Новая запись не склеивается с обрывком
+    journal.append([["10.0.0.1", 4.0, True, 1.0]])
+    journal.close()
+    _, records = make_journal(tmp_path).load()
+    assert [record[1] for record in records] == [1.0, 2.0, 4.0]
+
+
+def test_tail_without_newline_is_truncated(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.load()
+    journal.append([["10.0.0.1", 1.0, True, 1.0]])
+    journal.close()
+    # Запись целая, но перевод строки записать не успели
+    with open(journal.journal_path, "ab") as file:
+        file.write(b'["10.0.0.1",2.0,true,2.0]')
+
+    journal = make_journal(tmp_path)
+    _, records = journal.load()
+    assert records == [["10.0.0.1", 1.0, True, 1.0]]
+    journal.append([["10.0.0.1", 3.0, True, 3.0]])
+    journal.close()
+    _, records = make_journal(tmp_path).load()
+    assert [record[1] for record in records] == [1.0, 3.0]
+
+
+def test_snapshot_switches_generation(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.load()
+    journal.append([["10.0.0.1", 1.0, True, 5.0]])
+    journal.snapshot(b"payload")
+    journal.append([["10.0.0.1", 2.0, True, 5.0]])
+    journal.close()
+
+    reloaded = make_journal(tmp_path)
+    payload, records = reloaded.load()
+    assert reloaded.generation == 1
+    assert payload == b"payload"
+    assert records == [["10.0.0.1", 2.0, True, 5.0]]
+
+
+def test_stale_journal_is_ignored(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.load()
+    journal.append([["10.0.0.1", 1.0, True, 5.0]])
+    journal.close()
+    # Падение между записью снимка и обнулением журнала: журнал остался от прошлого поколения
+    journal._write_snapshot(1, b"payload")
+
+    reloaded = make_journal(tmp_path)
+    payload, records = reloaded.load()
+    assert payload == b"payload" and records == []
+    with open(reloaded.journal_path, "rb") as file:
+        assert json.loads(file.readline()) == {"generation": 1}
+
+
+def test_records_during_async_snapshot_go_to_new_generation(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.load()
+
+    async def run():
+        task = asyncio.ensure_future(journal.snapshot_async(lambda: b"payload"))
+        await asyncio.sleep(0)
+        assert journal.snapshotting
+        journal.append([["10.0.0.1", 2.0, False, None]])
+        await task
+
+    asyncio.run(run())
+    journal.close()
+    reloaded = make_journal(tmp_path)
+    _, records = reloaded.load()
+    assert reloaded.generation == 1
+    assert records == [["10.0.0.1", 2.0, False, None]]
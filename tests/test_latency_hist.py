@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+
+import random
+
+from latency_hist import LatencyWindows
+
+
+def test_running_window_matches_merge():
+    random.seed(1)
+    windows = LatencyWindows()
+    base = 1700000000
+    for k in range(20000):
+        # Пропуск больше суток посередине: часть слотов остается со старыми часами
+        timestamp = base + k * 30 + (100000 if k > 10000 else 0)
+        windows.record(timestamp, random.expovariate(0.05))
+        if k % 997 == 0:
+            now = timestamp + 1
+            merged = windows.merged(now - 86400, now)
+            running = windows.since(now - 86400)
+            assert list(running.counts) == list(merged.counts)
+            assert running.total == merged.total
+
+
+def test_running_window_survives_load():
+    windows = LatencyWindows()
+    for k in range(500):
+        windows.record(1700000000 + k * 600, float(k % 40 + 1))
+    loaded = LatencyWindows().load_json(windows.to_json())
+    assert list(loaded.window.counts) == list(windows.window.counts)
+    assert loaded.window.total == windows.window.total
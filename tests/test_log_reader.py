@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import log_reader
+
+
+def write_log(path):
+    lines = []
+    for day in (1, 2):
+        for hour in range(24):
+            for minute in range(0, 60, 7):
+                lines.append(f"2024-05-{day:02} {hour:02}:{minute:02}:00 - INFO - проверка {day}/{hour}/{minute}")
+                if minute == 14:
+                    lines.append("Traceback без метки времени")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return lines
+
+
+def linear_scan(lines, day, hour):
+    """Строки часа, найденные простым проходом по файлу (строки без времени относятся к предыдущей)."""
+    result = []
+    current = None
+    for line in lines:
+        if log_reader.TIMESTAMP.match(line.encode()):
+            current = line[8:10], line[11:13]
+        if current == (f"{day:02}", f"{hour:02}"):
+            result.append(line)
+    return result
+
+
+def test_index_matches_linear_scan(tmp_path, monkeypatch):
+    # Маленькие блоки: границы часов попадают и внутрь блока, и на его края
+    monkeypatch.setattr(log_reader, "READ_CHUNK", 4096)
+    path = tmp_path / "bot.log"
+    lines = write_log(path)
+    for day, hour in ((1, 0), (1, 13), (2, 23), (3, 5)):
+        found, truncated = log_reader.read_hour(str(path), day, hour)
+        assert not truncated
+        assert found == linear_scan(lines, day, hour)
+
+
+def test_index_updates_incrementally(tmp_path):
+    path = tmp_path / "bot.log"
+    write_log(path)
+    index = log_reader.LogIndex(str(path))
+    index.update()
+    entries = len(index.entries)
+    with open(path, "a", encoding="utf-8") as file:
+        file.write("2024-05-03 00:00:00 - INFO - новая строка\n")
+    assert log_reader.read_hour(str(path), 3, 0)[0] == ["2024-05-03 00:00:00 - INFO - новая строка"]
+    index.update()
+    assert len(index.entries) == entries + 1
+    assert index.entries[-1][1] == path.stat().st_size - len("2024-05-03 00:00:00 - INFO - новая строка\n".encode())
+
+
+def test_read_lines_and_tail(tmp_path):
+    path = tmp_path / "bot.log"
+    lines = write_log(path)
+    result, offset = [], 0
+    while offset is not None:
+        block, offset = log_reader.read_lines(str(path), offset, max_bytes=1000)
+        result.extend(block)
+    assert result == lines
+    assert log_reader.tail(str(path), 10) == lines[-10:]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from outbox import GROUP_CHAT_INTERVAL, Outbox, chat_key
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+def test_chat_key():
+    assert chat_key("-1001234567890") == -1001234567890
+    assert chat_key("42") == 42
+    assert chat_key(42) == 42
+    assert chat_key("@channel") == "@channel"
+
+
+def test_string_group_id_gets_group_interval():
+    bot = FakeBot()
+    outbox = Outbox(bot, batch_delay=0)
+
+    async def run():
+        start = asyncio.get_event_loop().time()
+        group = outbox.send("-100123", "группа")
+        private = outbox.send("42", "личный чат")
+        assert set(outbox.queues) == {-100123, 42}
+        await asyncio.gather(group, private)
+        return start
+
+    start = asyncio.run(run())
+    assert sorted(chat_id for chat_id, _ in bot.sent) == [-100123, 42]
+    assert outbox.chat_ready[-100123] >= start + GROUP_CHAT_INTERVAL
+    assert outbox.chat_ready[42] < start + GROUP_CHAT_INTERVAL
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+from ringbuffer import SampleRing
+
+
+def filled(capacity, count):
+    ring = SampleRing(capacity)
+    for i in range(count):
+        ring.append(float(i), i % 3 != 0, None if i % 5 == 0 else float(i))
+    return ring
+
+
+def test_wrap_evicts_oldest():
+    ring = SampleRing(4)
+    evicted = [ring.append(float(i), i % 2 == 0, float(i)) for i in range(6)]
+    assert evicted[:4] == [None] * 4
+    assert evicted[4] == (0.0, True, 0.0)
+    assert [sample[0] for sample in ring] == [2.0, 3.0, 4.0, 5.0]
+    assert ring.ok_count == 2 and ring.fail_count == 2
+    assert ring.status_bytes(0, 4) == b'\x01\x00\x01\x00'
+
+
+def test_grows_lazily():
+    ring = filled(10000, 20)
+    assert ring.allocated < ring.capacity
+    assert len(ring) == 20
+
+
+def test_dump_load_round_trip():
+    for capacity, count in ((100, 0), (100, 37), (50, 137)):
+        ring = filled(capacity, count)
+        ring.trim(count - 30)
+        data = b''.join(ring.dump())
+        assert len(data) == SampleRing.dump_size(len(ring))
+        loaded = SampleRing.load(data)
+        assert loaded.capacity == capacity
+        assert list(loaded) == list(ring)
+        assert (loaded.ok_count, loaded.fail_count) == (ring.ok_count, ring.fail_count)
+        # После загрузки буфер продолжает работать как кольцо
+        loaded.append(1e9, True, 1.0)
+        assert loaded[-1] == (1e9, True, 1.0)
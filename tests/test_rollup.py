@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+from rollup import BucketRing, RollupStore
+
+TIERS = (("1m", 60, 3600), ("1h", 3600, 86400))
+
+
+def test_bucket_closes_on_next_interval():
+    store = RollupStore(TIERS)
+    store.add("10.0.0.1", 0, True, 10.0)
+    store.add("10.0.0.1", 30, False)
+    store.add("10.0.0.1", 61, True, 20.0)
+    minutes = store.tiers[0]
+    assert len(minutes.rings["10.0.0.1"]) == 1
+    start, count, failures, rtt_min, rtt_avg, rtt_max, _ = minutes.rings["10.0.0.1"][0]
+    assert (start, count, failures, rtt_min, rtt_avg, rtt_max) == (0, 2, 1, 10.0, 10.0, 10.0)
+    assert minutes.open["10.0.0.1"].start == 60
+    # Часовой уровень еще не закрыл ни одной корзины
+    assert "10.0.0.1" not in store.tiers[1].rings
+
+
+def test_tier_retention_rolls_over():
+    store = RollupStore(TIERS)
+    for minute in range(200):
+        store.add("10.0.0.1", minute * 60, True, 1.0)
+    ring = store.tiers[0].rings["10.0.0.1"]
+    assert len(ring) <= store.tiers[0].capacity
+    assert ring[0][0] >= 199 * 60 - 3600
+    assert ring[-1][0] == 198 * 60
+    assert len(store.tiers[1].rings["10.0.0.1"]) == 3
+
+
+def test_pick_tier():
+    store = RollupStore(TIERS)
+    assert store.pick_tier(0, 1800).name == "1m"
+    assert store.pick_tier(0, 7200).name == "1h"
+
+
+def test_ring_dump_load_round_trip():
+    ring = BucketRing(10)
+    for i in range(25):
+        ring.append((float(i), i, 0, 1.0, 2.0, 3.0, 4.0))
+    data = b''.join(ring.dump())
+    assert len(data) == BucketRing.dump_size(len(ring))
+    loaded = BucketRing.load(data)
+    assert loaded.range(0, len(loaded)) == ring.range(0, len(ring))
+
+    store = RollupStore(TIERS)
+    for minute in range(90):
+        store.add("10.0.0.1", minute * 60, minute % 7 != 0, float(minute))
+    header, buffers = store.dump()
+    restored = RollupStore(TIERS)
+    view = memoryview(b''.join(bytes(buffer) for buffer in buffers))
+    assert restored.load(header, view) == len(view)
+    assert restored.select("10.0.0.1", 0, 5400)[1] == store.select("10.0.0.1", 0, 5400)[1]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from scheduler import Scheduler
+
+
+def test_replaced_job_does_not_overlap_running_one():
+    running = []
+    overlaps = []
+
+    async def check():
+        if running:
+            overlaps.append(len(running))
+        running.append(1)
+        await asyncio.sleep(0.25)
+        running.pop()
+
+    async def run():
+        scheduler = Scheduler(jitter=False)
+        scheduler.add("target", 0.1, check)
+        task = asyncio.ensure_future(scheduler.run())
+        await asyncio.sleep(0.05)
+        assert running  # Первый запуск идет
+        job = scheduler.add("target", 0.1, check)  # Замена, как при перезагрузке измененной цели
+        await asyncio.sleep(0.15)
+        task.cancel()
+        return job
+
+    job = asyncio.run(run())
+    assert not overlaps
+    assert job.overruns >= 1
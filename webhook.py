@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import hmac
+import json
+import logging
+import time
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher, types
+
+# Заголовок с секретом, который Telegram присылает с каждым обновлением (secret_token в setWebhook)
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Очередь принятых обновлений и число обработчиков по умолчанию
+QUEUE_SIZE = 100
+WORKERS = 4
+
+# Через сколько секунд повторить доставку, если очередь заполнена (заголовок Retry-After)
+RETRY_AFTER = 1
+
+
+class WebhookServer:
+    """
+    Прием обновлений Telegram через webhook: HTTP-сервер aiohttp кладет обновления в ограниченную
+    очередь и сразу отвечает, workers задач обрабатывают их через dp.process_update — те же
+    обработчики, что и при long polling. Если очередь заполнена, сервер отвечает 429: Telegram
+    повторит доставку позже, а бот не копит необработанные обновления (обратное давление).
+    on_dequeued(секунды) получает время ожидания обновления в очереди.
+
+    secret обязателен: без него любой, кто достучится до порта, мог бы прислать поддельное
+    обновление от имени администратора.
+    """
+
+    def __init__(self, dp, path="/webhook", secret=None, queue_size=QUEUE_SIZE, workers=WORKERS, on_dequeued=None):
+        if not secret:
+            raise ValueError("не задан секрет webhook (secret_token)")
+        self.dp = dp
+        self.path = path
+        self.secret = secret
+        self.workers = workers
+        self.on_dequeued = on_dequeued
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.received = 0  # Принято в очередь
+        self.rejected = 0  # Отклонено из-за заполненной очереди
+        self.failed = 0  # Ошибок обработки
+        self.port = None
+        self._runner = None
+        self._tasks = []
+
+    def pending(self):
+        return self.queue.qsize()
+
+    async def start(self, host, port):
+        """Запускает HTTP-сервер и обработчики очереди; port=0 — любой свободный (итоговый — в self.port)."""
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def handle(self, request):
+        # Байты, а не str: compare_digest не принимает строки с не-ASCII символами
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, "").encode(), self.secret.encode()):
+            return web.Response(status=401)
+        if self.queue.full():
+            self.rejected += 1
+            return web.Response(status=429, headers={"Retry-After": str(RETRY_AFTER)})
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        self.queue.put_nowait((time.perf_counter(), data))
+        self.received += 1
+        return web.Response()
+
+    async def _worker(self):
+        # Обработчики обращаются к Bot.get_current() (message.answer и т. п.)
+        Bot.set_current(self.dp.bot)
+        Dispatcher.set_current(self.dp)
+        while True:
+            queued, data = await self.queue.get()
+            if self.on_dequeued is not None:
+                self.on_dequeued(time.perf_counter() - queued)
+            try:
+                await self.dp.process_update(types.Update(**data))
+            except Exception as e:
+                self.failed += 1
+                logging.error(f"Ошибка при обработке обновления {json.dumps(data)[:200]}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def close(self, timeout=10):
+        """Перестает принимать обновления, дожидается обработки очереди (не дольше timeout) и останавливает обработчики."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Не обработано обновлений при остановке: {self.queue.qsize()}")
+        for task in self._tasks:
+            task.cancel()